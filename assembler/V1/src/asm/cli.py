@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import argparse
+import json
 import sys
 from pathlib import Path
 
@@ -20,6 +21,7 @@ def main(argv: list[str] | None = None) -> int:
     p.add_argument("input", help="Input .asm file")
     p.add_argument("-o", "--output", required=True, help="Output .bin file")
     p.add_argument("--base", default="0x0000", help="Base load address (default 0x0000)")
+    p.add_argument("--symbols", default=None, help="Also write the symbol table as JSON {label: address}")
     args = p.parse_args(argv)
 
     in_path = Path(args.input)
@@ -31,6 +33,8 @@ def main(argv: list[str] | None = None) -> int:
         res = assemble_text(text, file=str(in_path), base=base)
         out_path.parent.mkdir(parents=True, exist_ok=True)
         out_path.write_bytes(res.binary)
+        if args.symbols is not None:
+            Path(args.symbols).write_text(json.dumps(res.symtab, indent=2) + "\n", encoding="utf-8")
     except AsmError as e:
         print(str(e), file=sys.stderr)
         return 2
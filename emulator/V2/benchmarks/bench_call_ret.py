@@ -0,0 +1,140 @@
+"""
+CALL_ABS / RET frame cost, before and after the bulk struct encoding.
+
+"before" swaps the original hex-string / power-loop frame helpers back into
+emu.executor_v2 for the duration of the run; "after" uses the current ones
+(executor_v2.FRAME). The helpers are only called by the reference step()
+path, so the program timing compares the two on the "step" engine by
+default; "interp" and "translate" inline FRAME and show no "before" cost.
+
+    python benchmarks/bench_call_ret.py [--calls N] [--engine step|interp|translate]
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import sys
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from emu import executor_v2  # noqa: E402
+from emu.cpu_state import CPUState, reset_state  # noqa: E402
+from emu.decoder import encode_instruction as _ins  # noqa: E402
+from emu.executor_v2 import (  # noqa: E402
+    OPC_CALL_ABS,
+    OPC_HALT,
+    OPC_JMP_ABS,
+    OPC_JZ_REL,
+    OPC_MOV_RI,
+    OPC_RET,
+    OPC_SUB,
+)
+from emu.memory import Memory  # noqa: E402
+from emu.runner import ENGINES, run  # noqa: E402
+
+
+# The frame helpers as they were before FRAME: one hex string per push, one
+# write_u8() per byte, and a 256**k loop per pop.
+def _legacy_push_frame(state: CPUState, mem: Memory, return_pc: int) -> None:
+    rpc = "0" * (18 - len(hex(return_pc))) + hex(return_pc)[2:]
+    rpc = rpc[::-1]
+    for i in range(8):
+        mem.write_u8(state.sp, int(rpc[2 * i:2 * i + 2][::-1], 16))
+        state.sp -= 1
+
+
+def _legacy_pop_frame(state: CPUState, mem: Memory) -> int:
+    new_pc = 0
+    pc_bytes = mem.read_slice(state.sp + 1, 8)
+    for i in range(len(pc_bytes)):
+        new_pc += (256 ** (7 - i)) * pc_bytes[i]
+    state.sp += 8
+    return new_pc
+
+
+@contextlib.contextmanager
+def _legacy_frames() -> Iterator[None]:
+    saved = executor_v2._push_frame, executor_v2._pop_frame
+    executor_v2._push_frame, executor_v2._pop_frame = _legacy_push_frame, _legacy_pop_frame
+    try:
+        yield
+    finally:
+        executor_v2._push_frame, executor_v2._pop_frame = saved
+
+
+def call_loop(calls: int) -> bytes:
+    """r1 counts down from `calls`; each iteration calls f, which calls g."""
+    return b"".join([
+        _ins(OPC_MOV_RI, 1, 0, 0, calls),   # 0x00
+        _ins(OPC_MOV_RI, 2, 0, 0, 1),       # 0x08
+        _ins(OPC_CALL_ABS, 0, 0, 0, 0x40),  # 0x10 CALL f
+        _ins(OPC_SUB, 1, 1, 2),             # 0x18
+        _ins(OPC_JZ_REL, 0, 0, 0, 16),      # 0x20 -> 0x30
+        _ins(OPC_JMP_ABS, 0, 0, 0, 0x10),   # 0x28
+        _ins(OPC_HALT),                     # 0x30
+        _ins(OPC_HALT),                     # 0x38 (pad)
+        _ins(OPC_CALL_ABS, 0, 0, 0, 0x50),  # 0x40 f: CALL g
+        _ins(OPC_RET),                      # 0x48
+        _ins(OPC_RET),                      # 0x50 g
+    ])
+
+
+def _time_program(prog: bytes, engine: str) -> tuple[float, int]:
+    mem = Memory.blank()
+    mem.load(0, prog)
+    st = reset_state()
+    t0 = time.perf_counter()
+    res = run(st, mem, 1 << 62, engine=engine)
+    return time.perf_counter() - t0, res.steps
+
+
+def _time_frames(n: int) -> float:
+    mem = Memory.blank()
+    st = reset_state()
+    push, pop = executor_v2._push_frame, executor_v2._pop_frame
+    t0 = time.perf_counter()
+    for _ in range(n):
+        st.sp = 0xFDFF
+        push(st, mem, 0x1234)
+        pop(st, mem)
+    return time.perf_counter() - t0
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=(__doc__ or "").strip().splitlines()[0])
+    ap.add_argument(
+        "--calls", type=int, default=20_000, help="outer loop iterations (2 calls each)"
+    )
+    ap.add_argument("--engine", choices=ENGINES, default="step")
+    args = ap.parse_args(argv)
+
+    prog = call_loop(args.calls)
+    pairs = 2 * args.calls
+    rows = []
+    frames: list[contextlib.AbstractContextManager[None]] = [
+        _legacy_frames(),
+        contextlib.nullcontext(),
+    ]
+    for label, ctx in zip(("before", "after"), frames, strict=True):
+        with ctx:
+            frame_s = _time_frames(pairs)
+            prog_s, steps = _time_program(prog, args.engine)
+        rows.append((label, frame_s, prog_s, steps))
+
+    print(f"{pairs} CALL/RET pairs, engine={args.engine}")
+    print(f"{'':8}{'push+pop ns':>14}{'program s':>12}{'MIPS':>8}")
+    for label, frame_s, prog_s, steps in rows:
+        print(f"{label:8}{frame_s / pairs * 1e9:>14.0f}{prog_s:>12.3f}{steps / prog_s / 1e6:>8.2f}")
+    before, after = rows
+    if before[3] != after[3]:
+        print(f"FAIL: before retired {before[3]} instructions, after {after[3]}", file=sys.stderr)
+        return 1
+    print(f"speedup: frames x{before[1] / after[1]:.1f}, program x{before[2] / after[2]:.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
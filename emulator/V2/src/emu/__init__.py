@@ -1,9 +1,19 @@
 """EMU package (CPU v1 starter)."""
 
 from .cpu_state import CPUState, FaultInfo, HaltReason, reset_state
-from .memory import Memory
-from .decoder import DecodedInstr, decode_instruction
+from .memory import Memory, PagedMemory
+from .decoder import DecodedInstr, decode_instruction, encode_instruction
 from .executor_v2 import step
+from .translator import run_translated
+from .hooks import Hooks
+from .runner import RunResult, run
+from .batch import BatchResult, run_batch
+from .snapshot import Snapshot, fork, restore, snapshot
+from .devices import BlockDevice, Console
+from .profile import Profile, run_profiled
+from .perfstat import CycleModel, PerfStat, perf_stat
+from .callstack import CallStackProfiler
+from .trace import TraceFile, TraceRing, read_trace, run_traced, run_window
 
 __all__ = [
     "CPUState",
@@ -11,7 +21,32 @@ __all__ = [
     "HaltReason",
     "reset_state",
     "Memory",
+    "PagedMemory",
     "DecodedInstr",
     "decode_instruction",
+    "encode_instruction",
     "step",
+    "run_translated",
+    "Hooks",
+    "RunResult",
+    "run",
+    "BatchResult",
+    "run_batch",
+    "Snapshot",
+    "snapshot",
+    "restore",
+    "fork",
+    "Console",
+    "BlockDevice",
+    "TraceFile",
+    "TraceRing",
+    "read_trace",
+    "run_traced",
+    "run_window",
+    "Profile",
+    "run_profiled",
+    "CycleModel",
+    "PerfStat",
+    "perf_stat",
+    "CallStackProfiler",
 ]
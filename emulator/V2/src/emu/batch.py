@@ -0,0 +1,123 @@
+# src/emu/batch.py
+"""
+Run many programs across a process pool.
+
+    for res in run_batch(paths, max_steps=100_000, workers=8):
+        print(res.to_json())
+
+Each worker process is started once and runs many programs, so a corpus of
+thousands of binaries costs one interpreter start per core, not per file.
+Results are yielded as jobs finish (not in submission order). A job that
+cannot run (unreadable file, an exception in the executor) yields a result
+with halt_reason "ERROR" instead of aborting the batch.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from .cpu_state import reset_state
+from .memory import MEM_SIZE, new_memory
+from .runner import run
+
+
+@dataclass(slots=True)
+class BatchJob:
+    path: str
+    start: int = 0x0000
+    max_steps: int = 100000
+    engine: str = "translate"
+    mem_size: int = MEM_SIZE
+
+
+@dataclass(slots=True)
+class BatchResult:
+    path: str
+    halt_reason: str  # HaltReason value, or "ERROR" if the job could not run
+    fault_code: str | None
+    steps: int
+    pc: int
+    reg_hash: str  # blake2b-64 of R0..R15 as little-endian u64, hex
+    error: str | None = None
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), separators=(",", ":"))
+
+
+def reg_hash(regs: list[int]) -> str:
+    blob = b"".join((r & 0xFFFFFFFFFFFFFFFF).to_bytes(8, "little") for r in regs)
+    return hashlib.blake2b(blob, digest_size=8).hexdigest()
+
+
+def run_job(job: BatchJob) -> BatchResult:
+    """Run one program to completion (or job.max_steps) in this process."""
+    st = reset_state()
+    try:
+        program = Path(job.path).read_bytes()
+        if not program:
+            raise ValueError(f"Program file is empty: {job.path}")
+        mem = new_memory(job.mem_size)
+        mem.load(job.start, program)
+        st.pc = job.start
+        res = run(st, mem, job.max_steps, engine=job.engine)
+    except Exception as exc:
+        return BatchResult(
+            path=job.path, halt_reason="ERROR", fault_code=None, steps=0, pc=st.pc,
+            reg_hash=reg_hash(st.regs), error=f"{type(exc).__name__}: {exc}",
+        )
+    return BatchResult(
+        path=job.path,
+        halt_reason=res.halt_reason.value,
+        fault_code=None if st.fault_code is None else st.fault_code.value,
+        steps=res.steps,
+        pc=st.pc,
+        reg_hash=reg_hash(st.regs),
+    )
+
+
+def run_batch(
+    paths: Iterable[str | Path],
+    *,
+    max_steps: int = 100000,
+    start: int = 0x0000,
+    engine: str = "translate",
+    workers: int | None = None,
+    mem_size: int = MEM_SIZE,
+) -> Iterator[BatchResult]:
+    """
+    Run every program in `paths` and yield results as they complete.
+    `workers` defaults to os.cpu_count(); workers=1 runs in this process.
+    """
+    jobs = [
+        BatchJob(str(p), start=start, max_steps=max_steps, engine=engine, mem_size=mem_size)
+        for p in paths
+    ]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for job in jobs:
+            yield run_job(job)
+        return
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures: list[Future[BatchResult]] = [pool.submit(run_job, job) for job in jobs]
+        for fut in as_completed(futures):
+            yield fut.result()
+    finally:
+        # Also reached when the caller stops iterating early.
+        pool.shutdown(cancel_futures=True)
+
+
+def collect_programs(paths: Iterable[str | Path], pattern: str = "*.bin") -> list[Path]:
+    """Expand directories to the files matching `pattern` below them (sorted)."""
+    out: list[Path] = []
+    for p in map(Path, paths):
+        if p.is_dir():
+            out.extend(sorted(q for q in p.rglob(pattern) if q.is_file()))
+        else:
+            out.append(p)
+    return out
@@ -0,0 +1,419 @@
+# src/emu/bench.py
+"""
+Emulator benchmark suite (`emu-bench`).
+
+    emu-bench                                   # every workload on every engine
+    emu-bench --out bench.json                  # save the results
+    emu-bench --baseline bench.json --threshold 0.05   # exit 1 on a >5% slowdown
+    emu-bench --no-baseline                     # skip the comparison
+
+Each workload is a small guest program that runs a canonical instruction
+mix for about `--steps` instructions:
+
+    alu         tight ADD/SUB/MOV_RR/CMP loop
+    countdown   SUB + JZ_REL countdown
+    memcopy     STORE8_ABS fill and LOAD8_ABS/STORE8_ABS copy of a buffer
+    recursion   deep recursive CALL_ABS/RET
+    stack       PUSH8/POP8 shuffle
+    console     a line of text printed one STORE8_ABS per byte to a Console
+                on the null device
+    mixed       a call whose body loads, stores, pushes and pops
+
+Besides the engines, `--engine` takes instrumented runs, which are only
+measured when asked for:
+
+    profile     emu.profile.run_profiled()
+    hooks       every emu.hooks callback set to a no-op
+    cachesim    the emu.cachesim hierarchy at its defaults (needs NumPy)
+
+Every (workload, engine) pair runs in a fresh interpreter process (unless
+`--in-process`), so its peak RSS is its own. The time is the best of
+`--repeat` runs. All engines must retire the same number of instructions
+and halt normally, otherwise the suite fails.
+
+A baseline is an earlier `--out` file. A pair regresses when its
+instructions per second fall more than `--threshold` (a fraction) below the
+baseline's. Without `--baseline`, runs are compared with the reference
+result committed at benchmarks/baseline.json (DEFAULT_BASELINE) when its
+`--steps` match; it was recorded on the machine named in the file, so
+regenerate it with `--out benchmarks/baseline.json` when the reference
+machine changes.
+"""
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import sys
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, fields
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any
+
+from .cpu_state import CPUState, reset_state
+from .decoder import encode_instruction as _ins
+from .devices import CONSOLE_BASE, Console
+from .executor_v2 import (
+    OPC_ADD,
+    OPC_CALL_ABS,
+    OPC_CMP,
+    OPC_HALT,
+    OPC_JMP_ABS,
+    OPC_JMP_REL,
+    OPC_JZ_ABS,
+    OPC_JZ_REL,
+    OPC_LOAD8_ABS,
+    OPC_MOV_RI,
+    OPC_MOV_RR,
+    OPC_POP8,
+    OPC_PUSH8,
+    OPC_RET,
+    OPC_STORE8_ABS,
+    OPC_SUB,
+)
+from .hooks import Hooks
+from .memory import Memory
+from .profile import Profile, run_profiled
+from .runner import ENGINES, run
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore[assignment]
+
+DEFAULT_STEPS = 1_000_000
+DEFAULT_THRESHOLD = 0.10
+RECURSION_DEPTH = 1000
+DEFAULT_BASELINE = Path(__file__).resolve().parents[2] / "benchmarks" / "baseline.json"
+CONSOLE_LINE = b"The quick brown fox jumps over the lazy dog. 0123456789 ABCDEFGHIJ\n"
+
+# Instrumented runs, selected with --engine next to ENGINES.
+INSTRUMENTED = ("profile", "hooks", "cachesim")
+
+
+def _loop(iters: int, body: list[bytes]) -> bytes:
+    """r1 = iters; r2 = 1; repeat `body` (at 0x10), decrementing r1, until r1 == 0."""
+    end = 0x10 + 8 * (len(body) + 3)
+    return b"".join([
+        _ins(OPC_MOV_RI, 1, 0, 0, iters),
+        _ins(OPC_MOV_RI, 2, 0, 0, 1),
+        *body,
+        _ins(OPC_SUB, 1, 1, 2),
+        _ins(OPC_JZ_ABS, 0, 0, 0, end),
+        _ins(OPC_JMP_ABS, 0, 0, 0, 0x10),
+        _ins(OPC_HALT),
+    ])
+
+
+def alu(steps: int) -> bytes:
+    body = [
+        _ins(OPC_ADD, 3, 3, 2),
+        _ins(OPC_ADD, 4, 4, 3),
+        _ins(OPC_SUB, 5, 4, 2),
+        _ins(OPC_MOV_RR, 6, 5),
+        _ins(OPC_CMP, 0, 6, 5),
+    ]
+    return _loop(max(1, steps // (len(body) + 3)), body)
+
+
+def countdown(steps: int) -> bytes:
+    return b"".join([
+        _ins(OPC_MOV_RI, 1, 0, 0, max(1, steps // 3)),  # 0x00
+        _ins(OPC_MOV_RI, 2, 0, 0, 1),                   # 0x08
+        _ins(OPC_SUB, 1, 1, 2),                         # 0x10
+        _ins(OPC_JZ_REL, 0, 0, 0, 16),                  # 0x18 -> HALT
+        _ins(OPC_JMP_REL, 0, 0, 0, -16),                # 0x20 -> 0x10
+        _ins(OPC_HALT),                                 # 0x28
+    ])
+
+
+def memcopy(steps: int) -> bytes:
+    fill = [_ins(OPC_STORE8_ABS, 0, 1, 0, 0x1000 + i) for i in range(8)]
+    copy = []
+    for i in range(8):
+        copy += [
+            _ins(OPC_LOAD8_ABS, 3, 0, 0, 0x1000 + i),
+            _ins(OPC_STORE8_ABS, 0, 3, 0, 0x2000 + i),
+        ]
+    body = fill + copy
+    return _loop(max(1, steps // (len(body) + 3)), body)
+
+
+def recursion(steps: int, depth: int = RECURSION_DEPTH) -> bytes:
+    # rec: r1 -= 1; if r1 == 0 return; call rec; return  (4 * depth + 5 per pass)
+    return b"".join([
+        _ins(OPC_MOV_RI, 7, 0, 0, max(1, steps // (4 * depth + 5))),  # 0x00
+        _ins(OPC_MOV_RI, 2, 0, 0, 1),                                 # 0x08
+        _ins(OPC_MOV_RI, 1, 0, 0, depth),                             # 0x10 outer
+        _ins(OPC_CALL_ABS, 0, 0, 0, 0x40),                            # 0x18
+        _ins(OPC_SUB, 7, 7, 2),                                       # 0x20
+        _ins(OPC_JZ_ABS, 0, 0, 0, 0x38),                              # 0x28
+        _ins(OPC_JMP_ABS, 0, 0, 0, 0x10),                             # 0x30
+        _ins(OPC_HALT),                                               # 0x38
+        _ins(OPC_SUB, 1, 1, 2),                                       # 0x40 rec
+        _ins(OPC_JZ_ABS, 0, 0, 0, 0x58),                              # 0x48
+        _ins(OPC_CALL_ABS, 0, 0, 0, 0x40),                            # 0x50
+        _ins(OPC_RET),                                                # 0x58
+    ])
+
+
+def stack(steps: int) -> bytes:
+    body = [_ins(OPC_PUSH8, 0, r) for r in (1, 2, 3, 4)] + [_ins(OPC_POP8, r) for r in (3, 4, 5, 6)]
+    return _loop(max(1, steps // (len(body) + 3)), body)
+
+
+def console(steps: int) -> bytes:
+    body = []
+    for ch in CONSOLE_LINE:
+        body += [_ins(OPC_MOV_RI, 3, 0, 0, ch), _ins(OPC_STORE8_ABS, 0, 3, 0, CONSOLE_BASE)]
+    return _loop(max(1, steps // (len(body) + 3)), body)
+
+
+def mixed(steps: int) -> bytes:
+    # f stores, loads, pushes and pops r1, then returns  (9 per pass)
+    return b"".join([
+        _ins(OPC_MOV_RI, 1, 0, 0, max(1, steps // 9)),  # 0x00
+        _ins(OPC_MOV_RI, 2, 0, 0, 1),                   # 0x08
+        _ins(OPC_CALL_ABS, 0, 0, 0, 0x40),              # 0x10 loop
+        _ins(OPC_SUB, 1, 1, 2),                         # 0x18
+        _ins(OPC_JZ_ABS, 0, 0, 0, 0x30),                # 0x20
+        _ins(OPC_JMP_ABS, 0, 0, 0, 0x10),               # 0x28
+        _ins(OPC_HALT),                                 # 0x30
+        _ins(OPC_HALT),                                 # 0x38
+        _ins(OPC_STORE8_ABS, 0, 1, 0, 0x1000),          # 0x40 f
+        _ins(OPC_LOAD8_ABS, 3, 0, 0, 0x1000),           # 0x48
+        _ins(OPC_PUSH8, 0, 3),                          # 0x50
+        _ins(OPC_POP8, 4),                              # 0x58
+        _ins(OPC_RET),                                  # 0x60
+    ])
+
+
+@dataclass(frozen=True, slots=True)
+class Workload:
+    build: Callable[[int], bytes]
+    console: bool = False  # map a Console writing to the null device
+
+
+WORKLOADS: dict[str, Workload] = {
+    "alu": Workload(alu),
+    "countdown": Workload(countdown),
+    "memcopy": Workload(memcopy),
+    "recursion": Workload(recursion),
+    "stack": Workload(stack),
+    "console": Workload(console, console=True),
+    "mixed": Workload(mixed),
+}
+
+
+@dataclass(slots=True)
+class BenchResult:
+    workload: str
+    engine: str
+    instructions: int
+    seconds: float  # best of the repeats
+    peak_rss_kib: int | None
+
+    @property
+    def ips(self) -> float:
+        return self.instructions / self.seconds if self.seconds else 0.0
+
+    @property
+    def ns_per_instr(self) -> float:
+        return 1e9 * self.seconds / self.instructions if self.instructions else 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        out = asdict(self)
+        out["ips"] = round(self.ips, 1)
+        out["ns_per_instr"] = round(self.ns_per_instr, 2)
+        return out
+
+
+def _peak_rss_kib() -> int | None:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss  # bytes on macOS, KiB elsewhere
+
+
+def _noop(*args: object) -> None:
+    pass
+
+
+def _execute(engine: str, st: CPUState, mem: Memory) -> int:
+    if engine == "profile":
+        return run_profiled(st, mem, 1 << 62, Profile.for_memory(mem))
+    if engine == "hooks":
+        return run(st, mem, 1 << 62, hooks=Hooks(**{f.name: _noop for f in fields(Hooks)})).steps
+    if engine == "cachesim":
+        from .cachesim import CacheSim
+
+        sim = CacheSim()
+        steps = run(st, mem, 1 << 62, hooks=sim.hooks()).steps
+        sim.flush()
+        return steps
+    return run(st, mem, 1 << 62, engine=engine).steps
+
+
+def measure(workload: str, engine: str, steps: int, repeat: int) -> BenchResult:
+    """Run one workload on one engine (or instrumented run) `repeat` times in this process."""
+    spec = WORKLOADS[workload]
+    prog = spec.build(steps)
+    best = float("inf")
+    retired = 0
+    for _ in range(repeat):
+        mem = Memory.blank()
+        mem.load(0, prog)
+        with open(os.devnull, "wb") as out:
+            if spec.console:
+                Console(out).attach(mem)
+            st = reset_state()
+            t0 = time.perf_counter()
+            retired = _execute(engine, st, mem)
+            best = min(best, time.perf_counter() - t0)
+        if not st.halted or st.fault_info is not None:
+            raise RuntimeError(f"{workload} on {engine} did not halt normally")
+    return BenchResult(workload, engine, retired, best, _peak_rss_kib())
+
+
+def run_suite(
+    workloads: list[str], engines: list[str], steps: int, repeat: int, isolate: bool = True
+) -> list[BenchResult]:
+    results: list[BenchResult] = []
+    for workload in workloads:
+        for engine in engines:
+            if isolate:
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                    res = pool.submit(measure, workload, engine, steps, repeat).result()
+            else:
+                res = measure(workload, engine, steps, repeat)
+            results.append(res)
+        counts = {r.instructions for r in results if r.workload == workload}
+        if len(counts) != 1:
+            raise RuntimeError(
+                f"{workload}: engines retired different instruction counts {sorted(counts)}"
+            )
+    return results
+
+
+def compare(
+    results: list[BenchResult], baseline: dict[str, Any], threshold: float
+) -> list[tuple[BenchResult, float, bool]]:
+    """(result, speed relative to the baseline, regressed) for pairs in both."""
+    base = {(r["workload"], r["engine"]): r["ips"] for r in baseline["results"]}
+    out = []
+    for res in results:
+        ips = base.get((res.workload, res.engine))
+        if ips:
+            ratio = res.ips / ips
+            out.append((res, ratio, ratio < 1.0 - threshold))
+    return out
+
+
+def format_results(results: list[BenchResult]) -> str:
+    lines = [
+        f"{'workload':<11}{'engine':<11}{'instrs':>10}{'seconds':>10}{'MIPS':>8}"
+        f"{'ns/instr':>10}{'peak RSS':>12}"
+    ]
+    for r in results:
+        rss = "-" if r.peak_rss_kib is None else f"{r.peak_rss_kib / 1024:.1f} MiB"
+        lines.append(
+            f"{r.workload:<11}{r.engine:<11}{r.instructions:>10}{r.seconds:>10.3f}"
+            f"{r.ips / 1e6:>8.2f}{r.ns_per_instr:>10.1f}{rss:>12}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(prog="emu-bench", description="Emulator benchmark suite.")
+    ap.add_argument(
+        "--workload", action="append", choices=list(WORKLOADS), help="Run only these (repeatable)."
+    )
+    ap.add_argument(
+        "--engine",
+        action="append",
+        choices=[*ENGINES, *INSTRUMENTED],
+        help="Use only these engines or instrumented runs (repeatable; default: every engine).",
+    )
+    ap.add_argument(
+        "--steps",
+        type=int,
+        default=DEFAULT_STEPS,
+        help=f"Instructions per workload (default {DEFAULT_STEPS}).",
+    )
+    ap.add_argument("--repeat", type=int, default=3, help="Best of N runs (default 3).")
+    ap.add_argument(
+        "--in-process", action="store_true", help="Measure in this process (RSS is then shared)."
+    )
+    ap.add_argument("--out", type=Path, default=None, help="Write the results as JSON here.")
+    ap.add_argument(
+        "--baseline",
+        type=Path,
+        default=None,
+        help=(
+            "Compare with an earlier --out file "
+            f"(default {DEFAULT_BASELINE.name} when --steps match)."
+        ),
+    )
+    ap.add_argument("--no-baseline", action="store_true", help="Do not compare with any baseline.")
+    ap.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help=f"Allowed slowdown against --baseline, as a fraction (default {DEFAULT_THRESHOLD}).",
+    )
+    args = ap.parse_args(argv)
+    if args.steps <= 0 or args.repeat <= 0:
+        ap.error("--steps and --repeat must be > 0")
+    if "cachesim" in (args.engine or ()) and importlib.util.find_spec("numpy") is None:
+        ap.error('--engine cachesim needs NumPy (pip install -e ".[vector]")')
+    baseline_path = args.baseline
+    if baseline_path is None and DEFAULT_BASELINE.is_file():
+        baseline_path = DEFAULT_BASELINE
+    baseline = None
+    if baseline_path is not None and not args.no_baseline:
+        # Read up front: --out may overwrite it.
+        baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+        if baseline.get("steps") != args.steps:
+            if args.baseline is not None:
+                ap.error(f"{baseline_path} was recorded with --steps {baseline.get('steps')}")
+            baseline = None
+
+    results = run_suite(
+        args.workload or list(WORKLOADS),
+        args.engine or list(ENGINES),
+        args.steps,
+        args.repeat,
+        not args.in_process,
+    )
+    print(format_results(results))
+    if args.out is not None:
+        doc = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "steps": args.steps,
+            "results": [r.to_dict() for r in results],
+        }
+        args.out.write_text(json.dumps(doc, indent=2) + "\n", encoding="utf-8")
+
+    if baseline is None:
+        return 0
+    rows = compare(results, baseline, args.threshold)
+    regressed = [res for res, _, bad in rows if bad]
+    print(f"\nagainst {baseline_path} (threshold {100 * args.threshold:.0f}%):")
+    for res, ratio, bad in rows:
+        flag = "  REGRESSION" if bad else ""
+        print(f"  {res.workload:<11}{res.engine:<11}{ratio:>7.2f}x{flag}")
+    if regressed:
+        print(f"[FAIL] {len(regressed)} regression(s)")
+        return 1
+    print("[OK] no regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,320 @@
+# src/emu/cachesim.py
+"""
+Cache-hierarchy simulator and memory access heatmap (optional, needs NumPy).
+
+    sim = CacheSim()                                  # default L1I/L1D/L2
+    run(st, mem, max_steps, hooks=sim.hooks())
+    sim.flush()
+    print(format_cache_report(sim.report()))
+
+Every instruction fetch goes to L1I; LOAD8_ABS, STORE8_ABS, PUSH8/POP8 and
+the CALL/RET frames go to L1D; misses of both go to a unified L2. Each
+cache is set-associative with LRU replacement, write-allocate, and no
+dirty-line modelling. Line sizes are at least 8 bytes, so one instruction
+or one (8-byte aligned) stack frame is a single line access.
+
+The hooks only append addresses to a buffer; every `batch` accesses the
+buffer is simulated with NumPy instead of one Python call per access. LRU
+is evaluated through stack distance: an access hits when fewer than `ways`
+distinct lines of its set were used since its previous use. Accesses are
+laid out set by set, the previous use of each comes from one sort, and the
+distinct-line counts come from a backward scan that advances all open
+accesses together, in blocks that double each round. The lines resident
+at the end of a batch are replayed at the start of the next.
+
+The heatmap counts fetches, reads and writes per PAGE_SIZE page.
+"""
+from __future__ import annotations
+
+from array import array
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+from .cpu_state import CPUState
+from .hooks import Hooks
+from .memory import PAGE_SHIFT, PAGE_SIZE
+
+FETCH, READ, WRITE = 0, 1, 2
+_KINDS = ("fetch", "read", "write")
+
+BATCH = 1 << 20
+_SCAN_BUDGET = 1 << 22  # positions examined per stack-distance round
+
+
+def parse_size(text: str) -> int:
+    """`32768`, `32K`, `4M` -> bytes."""
+    text = text.strip().upper()
+    scale = {"K": 1 << 10, "M": 1 << 20}.get(text[-1:], 1)
+    return int(text[:-1] if scale != 1 else text, 0) * scale
+
+
+@dataclass(frozen=True, slots=True)
+class CacheConfig:
+    name: str
+    size: int  # bytes
+    line: int = 64
+    ways: int = 8
+
+    @classmethod
+    def parse(cls, name: str, spec: str) -> CacheConfig:
+        """`SIZE[:LINE[:WAYS]]`, e.g. `32K:64:8`."""
+        parts = spec.split(":")
+        if not 1 <= len(parts) <= 3:
+            raise ValueError(f"{name}: expected SIZE[:LINE[:WAYS]], got {spec!r}")
+        cfg = cls(name, parse_size(parts[0]))
+        if len(parts) > 1:
+            cfg = cls(name, cfg.size, int(parts[1], 0))
+        if len(parts) > 2:
+            cfg = cls(name, cfg.size, cfg.line, int(parts[2], 0))
+        return cfg
+
+    @property
+    def sets(self) -> int:
+        return self.size // (self.line * self.ways)
+
+    def validate(self) -> None:
+        for what, v in (("line size", self.line), ("set count", self.sets)):
+            if v <= 0 or v & (v - 1):
+                raise ValueError(f"{self.name}: {what} must be a power of two, got {v}")
+        if self.line < 8:
+            raise ValueError(f"{self.name}: line size must be >= 8")
+        if self.ways <= 0 or self.sets * self.line * self.ways != self.size:
+            raise ValueError(f"{self.name}: size must be line * ways * a power of two")
+
+
+class Cache:
+    """One set-associative LRU cache level."""
+
+    def __init__(self, cfg: CacheConfig) -> None:
+        cfg.validate()
+        self.cfg = cfg
+        self.shift = cfg.line.bit_length() - 1
+        self.set_mask = cfg.sets - 1
+        # Resident lines per set, least recently used first; -1 = empty way.
+        self.lines = np.full((cfg.sets, cfg.ways), -1, dtype=np.int64)
+        self.accesses = 0
+        self.misses = 0
+
+    def access(self, addrs: np.ndarray) -> np.ndarray:
+        """Simulate `addrs` in order; returns the per-access miss mask."""
+        n = len(addrs)
+        miss = np.zeros(n, dtype=bool)
+        if n == 0:
+            return miss
+        ways = self.cfg.ways
+        lines = addrs >> self.shift
+        # A repeat of the previous line hits and leaves LRU order unchanged.
+        new = np.ones(n, dtype=bool)
+        new[1:] = lines[1:] != lines[:-1]
+        pos = np.flatnonzero(new)
+
+        # The resident lines, replayed oldest first, rebuild the LRU state
+        # in front of the batch. Then lay the stream out set by set.
+        resident = self.lines.ravel()
+        resident = resident[resident >= 0]
+        stream = np.concatenate([resident, lines[pos]])
+        sets = stream & self.set_mask
+        keys = sets.astype(np.uint32 if self.set_mask >> 16 else np.uint16)
+        order = np.argsort(keys, kind="stable")
+        seq = stream[order]
+        m = len(seq)
+        k = np.arange(m, dtype=np.int64)
+        # Previous / next occurrence of each line in its set's stream.
+        by_line = np.argsort(seq * m + k)
+        same = seq[by_line[1:]] == seq[by_line[:-1]]
+        prev = np.full(m, -1, dtype=np.int64)
+        nxt = np.full(m, m, dtype=np.int64)
+        prev[by_line[1:][same]] = by_line[:-1][same]
+        nxt[by_line[:-1][same]] = by_line[1:][same]
+
+        # LRU hit <=> fewer than `ways` distinct lines were used in the set
+        # since the previous use. Certain when the gap itself is that short;
+        # otherwise scan back from the access, counting the positions that
+        # are the last use of their line before it, until `ways` turn up.
+        # All open accesses advance together by a block that doubles each
+        # round (within an element budget).
+        smiss = prev < 0
+        q = np.flatnonzero(~smiss & (k - prev > ways))
+        p, hi = prev[q], q.copy()  # scan (p, hi) is still to do
+        found = np.zeros(len(q), dtype=np.int64)
+        width = ways
+        while len(q):
+            at = hi[:, None] - np.arange(1, width + 1)
+            last = (nxt[np.maximum(at, 0)] >= q[:, None]) & (at > p[:, None])
+            found += np.count_nonzero(last, axis=1)
+            hi -= width
+            full = found >= ways
+            smiss[q[full]] = True
+            more = ~full & (hi > p + 1)
+            q, p, hi, found = q[more], p[more], hi[more], found[more]
+            width = max(ways, min(2 * width, _SCAN_BUDGET // max(len(q), 1)))
+
+        # The new residents: per set, the `ways` most recently used lines.
+        last = np.flatnonzero(nxt == m)
+        lsets = sets[order[last]]
+        from_end = np.searchsorted(lsets, lsets, side="right") - 1 - np.arange(len(last))
+        keep = from_end < ways
+        self.lines.fill(-1)
+        self.lines[lsets[keep], ways - 1 - from_end[keep]] = seq[last[keep]]
+
+        batch = order >= len(resident)
+        umiss = np.empty(len(pos), dtype=bool)
+        umiss[order[batch] - len(resident)] = smiss[batch]
+        miss[pos] = umiss
+        self.accesses += n
+        self.misses += int(umiss.sum())
+        return miss
+
+    def stats(self) -> dict[str, Any]:
+        hits = self.accesses - self.misses
+        return {
+            "size": self.cfg.size,
+            "line": self.cfg.line,
+            "ways": self.cfg.ways,
+            "accesses": self.accesses,
+            "hits": hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / self.accesses, 6) if self.accesses else None,
+        }
+
+
+DEFAULT_L1I = CacheConfig("L1I", 32 << 10, 64, 8)
+DEFAULT_L1D = CacheConfig("L1D", 32 << 10, 64, 8)
+DEFAULT_L2 = CacheConfig("L2", 256 << 10, 64, 8)
+
+
+class CacheSim:
+    """L1I + L1D backed by a unified L2, fed from the instrumentation hooks."""
+
+    def __init__(
+        self,
+        l1i: CacheConfig = DEFAULT_L1I,
+        l1d: CacheConfig = DEFAULT_L1D,
+        l2: CacheConfig | None = DEFAULT_L2,
+        batch: int = BATCH,
+    ) -> None:
+        if batch <= 0:
+            raise ValueError("batch must be > 0")
+        self.l1i = Cache(l1i)
+        self.l1d = Cache(l1d)
+        self.l2 = None if l2 is None else Cache(l2)
+        self.batch = batch
+        self.pages: dict[int, list[int]] = {}  # page -> [fetches, reads, writes]
+        self._buf = array("q")  # address << 2 | kind
+
+    def hooks(self) -> Hooks:
+        buf, add, batch, flush = self._buf, self._buf.append, self.batch, self.flush
+
+        def on_step(state: CPUState, pc: int) -> None:
+            add(pc << 2)
+            if len(buf) >= batch:  # at most one data access follows a fetch
+                flush()
+
+        def on_read(pc: int, addr: int, size: int) -> None:
+            add(addr << 2 | READ)
+
+        def on_write(pc: int, addr: int, size: int) -> None:
+            add(addr << 2 | WRITE)
+
+        return Hooks(on_step=on_step, on_mem_read=on_read, on_mem_write=on_write)
+
+    def flush(self) -> None:
+        """Simulate the buffered accesses (call once more after the run)."""
+        if not self._buf:
+            return
+        packed = np.frombuffer(self._buf, dtype=np.int64).copy()
+        del self._buf[:]
+        self.record(packed >> 2, (packed & 3).astype(np.int8))
+
+    def record(self, addrs: np.ndarray, kinds: np.ndarray) -> None:
+        """Simulate one batch of accesses (addresses with FETCH/READ/WRITE kinds), in order."""
+        ok = addrs >= 0  # a fetch from a negative PC faults and touches nothing
+        addrs, kinds = addrs[ok], kinds[ok]
+        fetch = np.flatnonzero(kinds == FETCH)
+        data = np.flatnonzero(kinds != FETCH)
+        imiss = self.l1i.access(addrs[fetch])
+        dmiss = self.l1d.access(addrs[data])
+        if self.l2 is not None:
+            l2_in = np.sort(np.concatenate([fetch[imiss], data[dmiss]]))
+            self.l2.access(addrs[l2_in])
+
+        pages = addrs >> PAGE_SHIFT
+        for kind in (FETCH, READ, WRITE):
+            uniq, counts = np.unique(pages[kinds == kind], return_counts=True)
+            for page, count in zip(uniq.tolist(), counts.tolist(), strict=True):
+                self.pages.setdefault(page, [0, 0, 0])[kind] += count
+
+    def report(self, top: int = 10) -> dict[str, Any]:
+        """A JSON-serialisable summary: per-level stats and the page heatmap."""
+        levels = [self.l1i, self.l1d] + ([] if self.l2 is None else [self.l2])
+        hot = sorted(self.pages.items(), key=lambda kv: (-sum(kv[1]), kv[0]))[:top]
+        return {
+            "levels": {c.cfg.name: c.stats() for c in levels},
+            "page_size": PAGE_SIZE,
+            "pages": {
+                str(p): dict(zip(_KINDS, c, strict=True)) for p, c in sorted(self.pages.items())
+            },
+            "hot_pages": [
+                {"page": p, "addr": p << PAGE_SHIFT, **dict(zip(_KINDS, c, strict=True))}
+                for p, c in hot
+            ],
+        }
+
+
+_SHADES = " .:-=+*#%@"
+
+
+def heatmap(pages: dict[int, list[int]], width: int = 16) -> list[str]:
+    """Text heatmap: one row of `width` pages, shaded by accesses (log scale)."""
+    if not pages:
+        return []
+    peak = np.log1p(max(sum(c) for c in pages.values()))
+    rows: dict[int, list[str]] = {}
+    for page, counts in pages.items():
+        row = rows.setdefault(page // width, [" "] * width)
+        level = np.log1p(sum(counts)) / peak
+        row[page % width] = _SHADES[max(1, int(round(level * (len(_SHADES) - 1))))]
+    return [
+        f"    0x{r * width * PAGE_SIZE:08X} |{''.join(cells)}|" for r, cells in sorted(rows.items())
+    ]
+
+
+def _size(n: int) -> str:
+    for unit, shift in (("M", 20), ("K", 10)):
+        if n >= 1 << shift and n % (1 << shift) == 0:
+            return f"{n >> shift}{unit}"
+    return f"{n}B"
+
+
+def format_cache_report(report: dict[str, Any]) -> str:
+    """Human-readable form of CacheSim.report()."""
+    lines = ["[CACHE]"]
+    for name, s in report["levels"].items():
+        rate = "-" if s["hit_rate"] is None else f"{100 * s['hit_rate']:.2f}%"
+        lines.append(
+            f"  {name:<4} {_size(s['size'])}/{s['line']}B/{s['ways']}-way  "
+            f"accesses={s['accesses']} misses={s['misses']} hit rate={rate}"
+        )
+    lines.append("  hot pages (fetch / read / write):")
+    for h in report["hot_pages"]:
+        counts = f"{h['fetch']:>10} / {h['read']:>10} / {h['write']:>10}"
+        lines.append(f"    0x{h['addr']:08X}  {counts}")
+    pages = {int(p): [c[k] for k in _KINDS] for p, c in report["pages"].items()}
+    grid = heatmap(pages)
+    if grid:
+        lines.append(f"  heatmap ({PAGE_SIZE}-byte pages, 16 per row):")
+        lines.extend(grid)
+    return "\n".join(lines)
+
+
+def parse_levels(
+    l1i: str | None = None, l1d: str | None = None, l2: str | None = None
+) -> tuple[CacheConfig, CacheConfig, CacheConfig | None]:
+    """CLI specs -> (L1I, L1D, L2) configs; None keeps the default, L2 `none` drops the level."""
+    return (
+        DEFAULT_L1I if l1i is None else CacheConfig.parse("L1I", l1i),
+        DEFAULT_L1D if l1d is None else CacheConfig.parse("L1D", l1d),
+        DEFAULT_L2 if l2 is None else None if l2.lower() == "none" else CacheConfig.parse("L2", l2),
+    )
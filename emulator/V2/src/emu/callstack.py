@@ -0,0 +1,125 @@
+# src/emu/callstack.py
+"""
+Guest call-stack profiler.
+
+    prof = CallStackProfiler(entry=st.pc, symbols=load_symbols("prog.sym.json"))
+    run(st, mem, max_steps, hooks=prof.hooks())
+    prof.finish()
+    Path("prog.folded").write_text(prof.collapsed())   # flamegraph.pl prog.folded
+
+A shadow call stack follows CALL_ABS/RET (through emu.hooks). Retired
+instructions are charged to the stack that was current when they ran. An
+on_step callback counts every instruction (one Python call and an integer
+add each, on top of the step()-based hooked loop), and the count since the
+last event is added to the current stack at each CALL/RET, so the dict
+update happens once per call or return. CALL is charged to the caller and
+RET to the callee.
+
+The output is Brendan Gregg's collapsed-stack format, one line per distinct
+stack: frames from the outermost function in, separated by ';', then the
+instruction count. Frames are function entry addresses, printed as labels
+when a symbol table ({name: address}, e.g. AssembleResult.symtab) is given.
+
+A RET that does not return to the address its CALL pushed (the guest
+rewrote its frame, or unwound several frames at once) pops back to the
+frame whose return address it does match, or leaves the stack alone if
+there is none.
+"""
+from __future__ import annotations
+
+import bisect
+import json
+from collections.abc import Mapping
+from pathlib import Path
+
+from .cpu_state import CPUState
+from .hooks import Hooks
+
+
+def load_symbols(path: Path | str) -> dict[str, int]:
+    """Read a symbol table written by the assembler (`asm --symbols`): a JSON {name: address}."""
+    raw = json.loads(Path(path).read_text(encoding="utf-8"))
+    if not isinstance(raw, dict) or not all(isinstance(v, int) for v in raw.values()):
+        raise ValueError(f"{path}: expected a JSON object of name -> address")
+    return dict(raw)
+
+
+class SymbolTable:
+    """Resolves addresses to `label` or `label+0xN` (nearest label at or below)."""
+
+    def __init__(self, symbols: Mapping[str, int]) -> None:
+        by_addr: dict[int, str] = {}
+        for name, addr in sorted(symbols.items()):
+            by_addr.setdefault(addr, name)  # several labels on one address: first by name
+        self.addrs = sorted(by_addr)
+        self.names = [by_addr[a] for a in self.addrs]
+
+    def resolve(self, addr: int) -> str:
+        i = bisect.bisect_right(self.addrs, addr) - 1
+        if i < 0:
+            return f"0x{addr:04X}"
+        off = addr - self.addrs[i]
+        return self.names[i] if off == 0 else f"{self.names[i]}+0x{off:X}"
+
+
+class CallStackProfiler:
+    def __init__(self, entry: int = 0, symbols: Mapping[str, int] | None = None) -> None:
+        self.symbols = None if symbols is None else SymbolTable(symbols)
+        # Shadow stack of (function entry, return address); the root frame
+        # is the program entry and has no return address.
+        self.frames: list[tuple[int, int]] = [(entry, -1)]
+        self.counts: dict[tuple[int, ...], int] = {}
+        self.steps = 0
+        self._key: tuple[int, ...] = (entry,)
+        self._mark = 0  # self.steps when the current stack was last charged
+
+    def hooks(self) -> Hooks:
+        return Hooks(on_step=self._on_step, on_call=self._on_call, on_ret=self._on_ret)
+
+    def _on_step(self, state: CPUState, pc: int) -> None:
+        self.steps += 1
+
+    def _charge(self) -> None:
+        if self.steps != self._mark:
+            self.counts[self._key] = self.counts.get(self._key, 0) + self.steps - self._mark
+            self._mark = self.steps
+
+    def _on_call(self, pc: int, target: int) -> None:
+        self._charge()
+        self.frames.append((target, pc + 8))
+        self._key += (target,)
+
+    def _on_ret(self, pc: int, target: int) -> None:
+        self._charge()
+        frames = self.frames
+        for depth in range(len(frames) - 1, 0, -1):
+            if frames[depth][1] == target:
+                del frames[depth:]
+                self._key = self._key[:depth]
+                return
+
+    def finish(self) -> None:
+        """Charge the instructions since the last CALL/RET (call after the run)."""
+        self._charge()
+
+    def frame_name(self, addr: int) -> str:
+        return f"0x{addr:04X}" if self.symbols is None else self.symbols.resolve(addr)
+
+    def collapsed(self) -> str:
+        """The profile in collapsed-stack format, one `a;b;c count` line per stack."""
+        lines = sorted(
+            ";".join(self.frame_name(a) for a in key) + f" {count}"
+            for key, count in self.counts.items()
+        )
+        return "".join(line + "\n" for line in lines)
+
+    def functions(self) -> list[tuple[str, int, int]]:
+        """(function, self, total) instruction counts, highest total first."""
+        own: dict[int, int] = {}
+        total: dict[int, int] = {}
+        for key, count in self.counts.items():
+            own[key[-1]] = own.get(key[-1], 0) + count
+            for addr in set(key):  # recursion counts once per stack
+                total[addr] = total.get(addr, 0) + count
+        rows = [(self.frame_name(a), own.get(a, 0), t) for a, t in total.items()]
+        return sorted(rows, key=lambda r: (-r[2], -r[1], r[0]))
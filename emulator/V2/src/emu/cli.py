@@ -2,14 +2,36 @@
 from __future__ import annotations
 
 import argparse
-from dataclasses import asdict
+import json
+import os
+import sys
+import time
+from collections import deque
+from collections.abc import Iterable
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import BinaryIO
 
+from .batch import collect_programs, run_batch
+from .callstack import CallStackProfiler, load_symbols
 from .cpu_state import reset_state
-from .decoder import decode_instruction
-from .executor_v2 import step
-from .memory import MEM_SIZE, Memory
+from .devices import BLOCK_BASE, CONSOLE_BASE, BlockDevice, Console
+from .memory import MEM_SIZE, check_size, new_memory
+from .perfstat import CycleModel, format_perf, perf_stat
+from .profile import Profile, format_report, run_profiled
+from .runner import ENGINES, run
+from .snapshot import Snapshot, fork, snapshot
+from .trace import (
+    TraceFile,
+    TraceRecord,
+    TraceRing,
+    TraceSink,
+    TraceText,
+    format_record,
+    read_trace,
+    run_traced,
+    run_window,
+)
 
 
 def _parse_int(x: str) -> int:
@@ -21,6 +43,36 @@ def _parse_int(x: str) -> int:
     return int(x, 0)
 
 
+def _replay(
+    snap: Snapshot,
+    engine: str,
+    max_steps: int,
+    console_base: int | None,
+    disk: BlockDevice | None,
+    disk_base: int,
+    prof: Profile | None = None,
+) -> float:
+    """
+    Run the machine in `snap` again on a fork: on `engine`, or under the
+    profiler into `prof`. A console is re-attached at `console_base` with
+    its output discarded, and `disk` is moved to the fork. Returns the host
+    time of the run.
+    """
+    st, mem = fork(snap)
+    with open(os.devnull, "wb") as null:
+        if console_base is not None:
+            Console(null).attach(mem, console_base)
+        if disk is not None:
+            disk.attach(mem, disk_base)
+        t0 = time.perf_counter()
+        if prof is not None:
+            run_profiled(st, mem, max_steps, prof)
+        else:
+            run(st, mem, max_steps, engine=engine)
+        seconds = time.perf_counter() - t0
+    return seconds
+
+
 def _read_program_bytes(path: Path) -> bytes:
     data = path.read_bytes()
     if len(data) == 0:
@@ -45,7 +97,7 @@ def _hexdump(blob: bytes, start_addr: int = 0, width: int = 16) -> str:
         chunk = blob[i : i + width]
         hex_part = " ".join(f"{b:02X}" for b in chunk)
         ascii_part = "".join(chr(b) if 32 <= b <= 126 else "." for b in chunk)
-        lines.append(f"{start_addr + i:04X}  {hex_part:<{width*3}}  {ascii_part}")
+        lines.append(f"{start_addr + i:04X}  {hex_part:<{width * 3}}  {ascii_part}")
     return "\n".join(lines)
 
 
@@ -55,17 +107,73 @@ def _dump_regs(regs: list[int]) -> str:
     for i in range(0, len(regs), 4):
         chunk = regs[i : i + 4]
         out.append(
-            "  ".join(f"R{(i+j):02d}={chunk[j] & 0xFFFFFFFFFFFFFFFF:016X}" for j in range(len(chunk)))
+            "  ".join(
+                f"R{(i + j):02d}={chunk[j] & 0xFFFFFFFFFFFFFFFF:016X}" for j in range(len(chunk))
+            )
         )
     return "\n".join(out)
 
 
-def _decode_at(mem: Memory, pc: int) -> Tuple[bytes, str]:
-    instr = mem.read_slice(pc, 8)
-    ins = decode_instruction(instr)
-    # A compact decode string; you can expand this as your ISA grows.
-    s = f"opc=0x{ins.opcode:02X} rd={ins.rd} ra={ins.ra} rb={ins.rb} imm32={ins.imm32}"
-    return instr, s
+@dataclass(slots=True)
+class RunOptions:
+    """
+    How `run` executes a program beyond its start, budget and end-of-run dumps.
+
+    With `console_out`, a Console device at `console_base` writes guest
+    output there; `disk` is attached at `disk_base` (the caller closes it).
+
+    Tracing: `trace_out` receives a binary trace (emu.trace). With
+    `trace_ring`, only the last N steps are kept and written out (or
+    printed) at the end. The trace_from_*/until/pc_range triggers limit
+    tracing to a window (trace.run_window()); outside it the program runs
+    untraced on `engine`.
+
+    `profile` runs under the profiler (emu.profile) instead of `engine`,
+    prints its summary and, with `profile_out`, writes the JSON report.
+    `perf` prints a `perf stat`-style summary with cycles estimated by
+    `cycle_model` (emu.perfstat); `perf_out` gets JSON. Its host time and
+    MIPS are those of a plain run on `engine`, and its counters come from a
+    profiled run. The program runs once each way: the second run replays
+    it on a copy of the initial machine, with console output discarded, so
+    `perf` cannot be combined with a writable disk.
+    `callstack_out` receives a collapsed-stack profile (emu.callstack) with
+    frames named from `symbols` ({label: address}).
+    `cache` runs the cache simulator (emu.cachesim, needs NumPy) with
+    (L1I, L1D, L2) specs, None for the defaults; `cache_out` gets its JSON.
+    """
+
+    engine: str = "translate"
+    mem_size: int = MEM_SIZE
+    console_out: BinaryIO | None = None
+    console_base: int = CONSOLE_BASE
+    disk: BlockDevice | None = None
+    disk_base: int = BLOCK_BASE
+    trace_out: BinaryIO | None = None
+    trace_ring: int = 0
+    trace_regs: bool = False
+    trace_from_step: int = 0
+    trace_from_pc: int | None = None
+    trace_until_pc: int | None = None
+    trace_pc_range: tuple[int, int] | None = None
+    profile: bool = False
+    profile_out: Path | None = None
+    profile_top: int = 10
+    perf: bool = False
+    perf_out: Path | None = None
+    cycle_model: CycleModel | None = None
+    callstack_out: Path | None = None
+    symbols: dict[str, int] | None = None
+    cache: tuple[str | None, str | None, str | None] | None = None
+    cache_out: Path | None = None
+
+    def window(self) -> bool:
+        """Whether a trace trigger limits tracing to a window."""
+        return (
+            self.trace_from_step > 0
+            or self.trace_from_pc is not None
+            or self.trace_until_pc is not None
+            or self.trace_pc_range is not None
+        )
 
 
 def run_program(
@@ -74,32 +182,137 @@ def run_program(
     max_steps: int,
     trace: bool,
     dump_regs_end: bool,
-    dump_mem: Optional[Tuple[int, int]],
+    dump_mem: tuple[int, int] | None,
+    opts: RunOptions | None = None,
 ) -> int:
     """
     Returns exit code: 0 on normal halt, 1 on fault, 2 on max-steps exceeded.
+    `trace` prints every step as text; `opts` (RunOptions) selects the
+    engine, devices, trace sinks and analyses.
     """
-    if start < 0 or start >= MEM_SIZE:
+    if opts is None:
+        opts = RunOptions()
+    engine, mem_size, disk = opts.engine, opts.mem_size, opts.disk
+    if start < 0 or start >= mem_size:
         raise ValueError(f"--start out of range: {start:#x}")
 
-    mem = Memory.blank()
+    mem = new_memory(mem_size)
     mem.load(start, program)
+    console = None
+    if opts.console_out is not None:
+        console = Console(opts.console_out)
+        console.attach(mem, opts.console_base)
+        sys.stdout.flush()  # keep our own output ordered with the console's
+    if disk is not None:
+        disk.attach(mem, opts.disk_base)
 
     st = reset_state()
     st.pc = start
 
-    steps = 0
-    while not st.halted and steps < max_steps:
-        if trace:
-            try:
-                raw, decoded = _decode_at(mem, st.pc)
-                raw_hex = " ".join(f"{b:02X}" for b in raw)
-                print(f"{steps:06d} PC={st.pc:04X}  {raw_hex}   {decoded}  Z={int(st.z)}")
-            except Exception as e:
-                print(f"{steps:06d} PC={st.pc:04X}  <decode failed: {e}>")
-
-        step(st, mem)
-        steps += 1
+    window = opts.window()
+    sink: TraceSink | None = None
+    if opts.trace_ring:
+        sink = TraceRing(opts.trace_ring)
+    elif opts.trace_out is not None:
+        sink = TraceFile(opts.trace_out)
+    elif trace or window:
+        sink = TraceText(sys.stdout)
+    analyses = [
+        flag
+        for flag, on in (
+            ("--profile", opts.profile or opts.perf),
+            ("--callstack-out", opts.callstack_out is not None),
+            ("--cache-sim", opts.cache is not None),
+        )
+        if on
+    ]
+    if analyses and sink is not None:
+        raise ValueError("profiling cannot be combined with tracing")
+    if len(analyses) > 1:
+        raise ValueError(f"{analyses[0]} and {analyses[1]} cannot be combined")
+    if opts.perf and disk is not None and disk.writable:
+        raise ValueError(
+            "--perf runs the program twice and cannot be combined with --disk-writable"
+        )
+    snap = snapshot(st, mem) if opts.perf else None
+    seconds = 0.0
+    prof = None
+    calls = None
+    sim = None
+    if opts.cache is not None:
+        from .cachesim import CacheSim, parse_levels  # NumPy is only needed here
+
+        sim = CacheSim(*parse_levels(*opts.cache))
+        steps = run(st, mem, max_steps, engine=engine, hooks=sim.hooks()).steps
+        sim.flush()
+    elif opts.callstack_out is not None:
+        calls = CallStackProfiler(entry=start, symbols=opts.symbols)
+        steps = run(st, mem, max_steps, engine=engine, hooks=calls.hooks()).steps
+        calls.finish()
+    elif opts.profile:
+        prof = Profile.for_memory(mem)
+        steps = run_profiled(st, mem, max_steps, prof)
+    elif opts.perf:
+        t0 = time.perf_counter()
+        steps = run(st, mem, max_steps, engine=engine).steps
+        seconds = time.perf_counter() - t0
+    elif sink is not None:
+        # Text lines go out per step when a console shares stdout.
+        chunk = 1 if isinstance(sink, TraceText) and console is not None else 4096
+        if window:
+            steps = run_window(
+                st,
+                mem,
+                max_steps,
+                sink,
+                engine=engine,
+                from_step=opts.trace_from_step,
+                from_pc=opts.trace_from_pc,
+                until_pc=opts.trace_until_pc,
+                pc_range=opts.trace_pc_range,
+                regs=opts.trace_regs,
+                chunk=chunk,
+            )
+        else:
+            steps = run_traced(st, mem, max_steps, sink, regs=opts.trace_regs, chunk=chunk)
+        if isinstance(sink, TraceRing):
+            if opts.trace_out is not None:
+                sink.save(opts.trace_out)
+            else:
+                print("".join(format_record(r) + "\n" for r in sink.records()), end="")
+    else:
+        steps = run(st, mem, max_steps, engine=engine).steps
+    if console is not None:
+        console.flush()
+    if prof is not None and opts.profile:
+        report = prof.report(mem, top=opts.profile_top)
+        print(format_report(report))
+        if opts.profile_out is not None:
+            opts.profile_out.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    if snap is not None:
+        # The run above was either the profiled or the timed one; replay the other.
+        console_at = None if console is None else opts.console_base
+        if prof is None:
+            prof = Profile.for_memory(mem)
+            _replay(snap, engine, max_steps, console_at, disk, opts.disk_base, prof)
+        else:
+            seconds = _replay(snap, engine, max_steps, console_at, disk, opts.disk_base)
+        stat = perf_stat(prof, opts.cycle_model, seconds=seconds)
+        print(format_perf(stat))
+        if opts.perf_out is not None:
+            opts.perf_out.write_text(json.dumps(stat.report(), indent=2) + "\n", encoding="utf-8")
+    if calls is not None and opts.callstack_out is not None:
+        opts.callstack_out.write_text(calls.collapsed(), encoding="utf-8")
+        print(f"[CALLSTACK] {len(calls.counts)} stacks -> {opts.callstack_out}")
+        for name, own, total in calls.functions()[: opts.profile_top]:
+            print(f"  {name:<24} self={own:<12} total={total}")
+    if sim is not None:
+        from .cachesim import format_cache_report
+
+        report = sim.report(top=opts.profile_top)
+        print(format_cache_report(report))
+        if opts.cache_out is not None:
+            opts.cache_out.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
 
     if not st.halted:
         print(f"[STOP] Max steps exceeded ({max_steps}).")
@@ -120,7 +333,9 @@ def run_program(
         if dump_mem is not None:
             addr, size = dump_mem
             blob = mem.read_slice(addr, size)
-            print(f"\n[MEM 0x{addr:04X}..0x{addr+size-1:04X}]\n{_hexdump(blob, start_addr=addr)}")
+            print(
+                f"\n[MEM 0x{addr:04X}..0x{addr + size - 1:04X}]\n{_hexdump(blob, start_addr=addr)}"
+            )
         return 1
 
     print(f"[HALT] Normal. PC=0x{st.pc:04X} steps={steps} Z={int(st.z)}")
@@ -129,7 +344,74 @@ def run_program(
     if dump_mem is not None:
         addr, size = dump_mem
         blob = mem.read_slice(addr, size)
-        print(f"\n[MEM 0x{addr:04X}..0x{addr+size-1:04X}]\n{_hexdump(blob, start_addr=addr)}")
+        print(f"\n[MEM 0x{addr:04X}..0x{addr + size - 1:04X}]\n{_hexdump(blob, start_addr=addr)}")
+    return 0
+
+
+def run_batch_cmd(
+    paths: list[Path],
+    workers: int | None,
+    start: int,
+    max_steps: int,
+    engine: str,
+    output: Path | None,
+    mem_size: int = MEM_SIZE,
+) -> int:
+    """
+    Stream one JSON line per program as it finishes.
+    Returns exit code: 0 if every program halted normally, 1 otherwise.
+    """
+    if workers is not None and workers <= 0:
+        raise ValueError("--workers must be > 0")
+    check_size(mem_size)
+    programs = collect_programs(paths)
+    out = sys.stdout if output is None else output.open("w", encoding="utf-8")
+    all_ok = True
+    try:
+        for res in run_batch(
+            programs,
+            max_steps=max_steps,
+            start=start,
+            engine=engine,
+            workers=workers,
+            mem_size=mem_size,
+        ):
+            out.write(res.to_json() + "\n")
+            out.flush()
+            all_ok = all_ok and res.halt_reason == "NORMAL"
+    finally:
+        if output is not None:
+            out.close()
+    return 0 if all_ok else 1
+
+
+def trace_view(
+    path: Path,
+    pc_range: tuple[int, int] | None = None,
+    steps: tuple[int, int] | None = None,
+    opcodes: Iterable[int] | None = None,
+    last: int | None = None,
+    count: bool = False,
+) -> int:
+    """Print the records of a binary trace that pass every given filter."""
+    ops = None if opcodes is None else frozenset(opcodes)
+    with path.open("rb") as f:
+        records: Iterable[TraceRecord] = read_trace(f)
+        if pc_range is not None:
+            lo, hi = pc_range
+            records = (r for r in records if lo <= r.pc <= hi)
+        if steps is not None:
+            first, final = steps
+            records = (r for r in records if first <= r.step <= final)
+        if ops is not None:
+            records = (r for r in records if r.instr[0] in ops)
+        if last is not None:
+            records = deque(records, maxlen=max(last, 0))
+        if count:
+            print(sum(1 for _ in records))
+        else:
+            for r in records:
+                print(format_record(r))
     return 0
 
 
@@ -145,25 +427,230 @@ def build_arg_parser() -> argparse.ArgumentParser:
     run_src.add_argument("--bin", type=Path, help="Path to raw binary program.")
     run_src.add_argument("--hex", type=str, help="Program bytes as hex string (spaces allowed).")
 
-    run.add_argument("--start", type=_parse_int, default=0x0000, help="Load/PC start address (default 0x0000).")
-    run.add_argument("--max-steps", type=int, default=100000, help="Stop after N steps to avoid infinite loops.")
-    run.add_argument("--trace", action="store_true", help="Print trace line for each executed instruction.")
+    run.add_argument(
+        "--start", type=_parse_int, default=0x0000, help="Load/PC start address (default 0x0000)."
+    )
+    run.add_argument(
+        "--max-steps", type=int, default=100000, help="Stop after N steps to avoid infinite loops."
+    )
+    run.add_argument(
+        "--trace", action="store_true", help="Print trace line for each executed instruction."
+    )
+    run.add_argument(
+        "--trace-out", type=Path, default=None, help="Write a binary trace (see trace-view) here."
+    )
+    run.add_argument(
+        "--trace-ring",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Keep only the last N trace records; written to --trace-out (or printed) at the end.",
+    )
+    run.add_argument(
+        "--trace-regs", action="store_true", help="Record the register each instruction writes."
+    )
+    run.add_argument(
+        "--trace-from-step", type=int, default=0, metavar="N", help="Start tracing at step N."
+    )
+    run.add_argument(
+        "--trace-from-pc",
+        type=_parse_int,
+        default=None,
+        metavar="ADDR",
+        help="Start tracing when PC reaches ADDR.",
+    )
+    run.add_argument(
+        "--trace-until-pc",
+        type=_parse_int,
+        default=None,
+        metavar="ADDR",
+        help="Stop tracing when PC reaches ADDR.",
+    )
+    run.add_argument(
+        "--trace-pc-range",
+        nargs=2,
+        type=_parse_int,
+        default=None,
+        metavar=("LO", "HI"),
+        help="Only trace instructions with LO <= PC <= HI.",
+    )
+    run.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="translate",
+        help="Execution engine when not tracing (default: translate).",
+    )
+    run.add_argument(
+        "--mem-size",
+        type=_parse_int,
+        default=MEM_SIZE,
+        help="Address-space size in bytes, a power of two up to 0x80000000 (default 0x10000).",
+    )
+    run.add_argument(
+        "--console",
+        metavar="TARGET",
+        default=None,
+        help=(
+            "Attach a console device; guest output goes to TARGET ('-' for stdout, or a file path)."
+        ),
+    )
+    run.add_argument(
+        "--console-base",
+        type=_parse_int,
+        default=CONSOLE_BASE,
+        help=f"Console register address (default {CONSOLE_BASE:#06x}).",
+    )
+    run.add_argument(
+        "--disk", type=Path, default=None, help="Attach a block device backed by this disk image."
+    )
+    run.add_argument(
+        "--disk-writable", action="store_true", help="Allow guest writes to the --disk image."
+    )
+    run.add_argument(
+        "--disk-base",
+        type=_parse_int,
+        default=BLOCK_BASE,
+        help=f"Block device register address (default {BLOCK_BASE:#06x}).",
+    )
+    run.add_argument(
+        "--profile",
+        action="store_true",
+        help="Count executions per PC/opcode/branch and print the hot spots.",
+    )
+    run.add_argument(
+        "--profile-out", type=Path, default=None, help="Also write the profile as JSON here."
+    )
+    run.add_argument(
+        "--profile-top",
+        type=int,
+        default=10,
+        metavar="N",
+        help="Hot entries to report (default 10).",
+    )
+    run.add_argument(
+        "--perf",
+        action="store_true",
+        help=(
+            "Print a perf-stat style summary: instructions, estimated cycles, IPC, branches, "
+            "loads/stores, MIPS. Runs the program twice: a timed run on --engine, then a replay "
+            "from the initial state under the profiler for the counts (its console output is "
+            "discarded; not allowed with --disk-writable)."
+        ),
+    )
+    run.add_argument(
+        "--perf-out", type=Path, default=None, help="Also write the --perf counters as JSON here."
+    )
+    run.add_argument(
+        "--cycle-model",
+        type=Path,
+        default=None,
+        help='JSON cycle costs for --perf, e.g. {"opcodes": {"LOAD8_ABS": 3}, "taken_branch": 2}.',
+    )
+    run.add_argument(
+        "--callstack-out",
+        type=Path,
+        default=None,
+        help="Track guest CALL/RET and write collapsed stacks (flamegraph input) here.",
+    )
+    run.add_argument(
+        "--symbols",
+        type=Path,
+        default=None,
+        help="Symbol table JSON from the assembler (asm --symbols).",
+    )
+    run.add_argument(
+        "--cache-sim",
+        action="store_true",
+        help="Simulate L1I/L1D/L2 caches over the guest's memory traffic (needs NumPy).",
+    )
+    for level, default in (
+        ("l1i", "32K:64:8"),
+        ("l1d", "32K:64:8"),
+        ("l2", "256K:64:8, or 'none'"),
+    ):
+        run.add_argument(
+            f"--cache-{level}",
+            default=None,
+            metavar="SIZE:LINE:WAYS",
+            help=f"{level.upper()} geometry for --cache-sim (default {default}).",
+        )
+    run.add_argument(
+        "--cache-out", type=Path, default=None, help="Also write the cache report as JSON here."
+    )
     run.add_argument("--dump-regs", action="store_true", help="Print registers at the end.")
     run.add_argument(
         "--dump-mem",
         nargs=2,
         metavar=("ADDR", "SIZE"),
-        help="Dump memory range at the end (ADDR and SIZE in dec or hex). Example: --dump-mem 0x0100 64",
+        help=(
+            "Dump memory range at the end (ADDR and SIZE in dec or hex). "
+            "Example: --dump-mem 0x0100 64"
+        ),
+    )
+
+    batch = sub.add_parser(
+        "batch",
+        help="Run many binaries across worker processes, one NDJSON result line per program.",
+    )
+    batch.add_argument(
+        "paths", nargs="+", type=Path, help="Binary files or directories (searched for *.bin)."
+    )
+    batch.add_argument(
+        "--workers", type=int, default=None, help="Worker processes (default: all cores)."
+    )
+    batch.add_argument(
+        "--start", type=_parse_int, default=0x0000, help="Load/PC start address (default 0x0000)."
+    )
+    batch.add_argument("--max-steps", type=int, default=100000, help="Step budget per program.")
+    batch.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="translate",
+        help="Execution engine (default: translate).",
+    )
+    batch.add_argument(
+        "--mem-size",
+        type=_parse_int,
+        default=MEM_SIZE,
+        help="Address-space size (default 0x10000).",
+    )
+    batch.add_argument(
+        "--output", type=Path, default=None, help="Write NDJSON here instead of stdout."
+    )
+
+    tv = sub.add_parser(
+        "trace-view", help="Decode and filter a binary trace written by run --trace-out."
+    )
+    tv.add_argument("trace", type=Path, help="Trace file.")
+    tv.add_argument(
+        "--pc-range", nargs=2, type=_parse_int, metavar=("LO", "HI"), help="Only PCs in [LO, HI]."
+    )
+    tv.add_argument(
+        "--steps", nargs=2, type=int, metavar=("FROM", "TO"), help="Only steps in [FROM, TO]."
+    )
+    tv.add_argument(
+        "--opcode", type=_parse_int, action="append", help="Only this opcode (repeatable)."
+    )
+    tv.add_argument(
+        "--last", type=int, default=None, metavar="N", help="Only the last N matching records."
+    )
+    tv.add_argument(
+        "--count", action="store_true", help="Print the number of matching records only."
     )
 
     hd = sub.add_parser("hexdump", help="Hexdump a binary file (useful for debugging).")
     hd.add_argument("--bin", type=Path, required=True, help="Path to raw binary program.")
-    hd.add_argument("--start", type=_parse_int, default=0x0000, help="Address label for hexdump (default 0x0000).")
+    hd.add_argument(
+        "--start",
+        type=_parse_int,
+        default=0x0000,
+        help="Address label for hexdump (default 0x0000).",
+    )
 
     return p
 
 
-def main(argv: Optional[list[str]] = None) -> int:
+def main(argv: list[str] | None = None) -> int:
     parser = build_arg_parser()
     args = parser.parse_args(argv)
 
@@ -172,6 +659,27 @@ def main(argv: Optional[list[str]] = None) -> int:
         print(_hexdump(blob, start_addr=args.start))
         return 0
 
+    if args.cmd == "trace-view":
+        return trace_view(
+            args.trace,
+            pc_range=args.pc_range,
+            steps=args.steps,
+            opcodes=args.opcode,
+            last=args.last,
+            count=args.count,
+        )
+
+    if args.cmd == "batch":
+        return run_batch_cmd(
+            paths=args.paths,
+            workers=args.workers,
+            start=args.start,
+            max_steps=args.max_steps,
+            engine=args.engine,
+            output=args.output,
+            mem_size=args.mem_size,
+        )
+
     if args.cmd == "run":
         if args.bin is not None:
             program = _read_program_bytes(args.bin)
@@ -184,18 +692,66 @@ def main(argv: Optional[list[str]] = None) -> int:
             size = _parse_int(args.dump_mem[1])
             if size <= 0:
                 raise ValueError("SIZE must be > 0")
-            if addr < 0 or addr + size - 1 >= MEM_SIZE:
+            if addr < 0 or addr + size - 1 >= args.mem_size:
                 raise ValueError("dump range out of memory bounds")
             dump_mem = (addr, size)
 
-        return run_program(
-            program=program,
-            start=args.start,
-            max_steps=args.max_steps,
-            trace=args.trace,
-            dump_regs_end=args.dump_regs,
-            dump_mem=dump_mem,
-        )
+        console_file = None
+        console_out: BinaryIO | None = None
+        if args.console == "-":
+            console_out = sys.stdout.buffer
+        elif args.console is not None:
+            console_out = console_file = open(args.console, "wb")
+        if args.trace_ring < 0:
+            raise ValueError("--trace-ring must be >= 0")
+        disk = None if args.disk is None else BlockDevice(args.disk, writable=args.disk_writable)
+        trace_file = None if args.trace_out is None else open(args.trace_out, "wb")
+        try:
+            opts = RunOptions(
+                engine=args.engine,
+                mem_size=args.mem_size,
+                console_out=console_out,
+                console_base=args.console_base,
+                disk=disk,
+                disk_base=args.disk_base,
+                trace_out=trace_file,
+                trace_ring=args.trace_ring,
+                trace_regs=args.trace_regs,
+                trace_from_step=args.trace_from_step,
+                trace_from_pc=args.trace_from_pc,
+                trace_until_pc=args.trace_until_pc,
+                trace_pc_range=None if args.trace_pc_range is None else tuple(args.trace_pc_range),
+                profile=args.profile or args.profile_out is not None,
+                profile_out=args.profile_out,
+                profile_top=args.profile_top,
+                perf=args.perf or args.perf_out is not None or args.cycle_model is not None,
+                perf_out=args.perf_out,
+                cycle_model=None if args.cycle_model is None else CycleModel.load(args.cycle_model),
+                callstack_out=args.callstack_out,
+                symbols=None if args.symbols is None else load_symbols(args.symbols),
+                cache=(
+                    (args.cache_l1i, args.cache_l1d, args.cache_l2)
+                    if args.cache_sim or args.cache_out is not None
+                    else None
+                ),
+                cache_out=args.cache_out,
+            )
+            return run_program(
+                program=program,
+                start=args.start,
+                max_steps=args.max_steps,
+                trace=args.trace,
+                dump_regs_end=args.dump_regs,
+                dump_mem=dump_mem,
+                opts=opts,
+            )
+        finally:
+            if trace_file is not None:
+                trace_file.close()
+            if console_file is not None:
+                console_file.close()
+            if disk is not None:
+                disk.close()
 
     parser.error("Unknown command")
     return 2
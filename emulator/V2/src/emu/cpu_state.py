@@ -2,9 +2,10 @@ from __future__ import annotations
 
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import List, Optional
 
-from .faults import FaultInfo
+from .decoder import decode_at
+from .faults import FaultCode, FaultInfo
+from .memory import Memory
 
 
 class HaltReason(str, Enum):
@@ -16,7 +17,7 @@ class HaltReason(str, Enum):
 @dataclass(slots=True)
 class CPUState:
     # v1: 16 x 64-bit GPRs, PC, Z flag, halted state, fault info.
-    regs: List[int] = field(default_factory=lambda: [0] * 16)
+    regs: list[int] = field(default_factory=lambda: [0] * 16)
     pc: int = 0x0000
     sp: int = 0xFDFF
     fp: int = 0xFDFF
@@ -24,7 +25,55 @@ class CPUState:
 
     halted: bool = False
     halt_reason: HaltReason = HaltReason.NONE
-    fault_info: Optional[FaultInfo] = None
+    # The executor only records the fault code, the faulting PC and a
+    # message; the full FaultInfo is rebuilt on first read of `fault_info`.
+    fault_code: FaultCode | None = None
+    fault_pc: int = 0
+    fault_message: str = field(default="", repr=False)
+    # The faulting instruction's bytes, copied when the fault is raised so
+    # later writes (by the instruction itself or the host) cannot change
+    # what fault_info reports. None for fetch faults, which report all-zero
+    # operand fields.
+    _fault_instr: bytes | None = field(default=None, repr=False, compare=False)
+    _fault_info: FaultInfo | None = field(default=None, repr=False, compare=False)
+
+    def set_fault(
+        self, code: FaultCode, message: str, mem: Memory | None, instr: bytes | None = None
+    ) -> None:
+        """Halt with `code` at the current PC. FaultInfo is built lazily.
+
+        The operands are decoded from `instr` if given, else from the 8 bytes
+        at the PC in `mem` (copied now), else reported as zero.
+        """
+        self.halted = True
+        self.halt_reason = HaltReason.FAULT
+        self.fault_code = code
+        self.fault_pc = self.pc
+        self.fault_message = message
+        if instr is None and mem is not None:
+            instr = bytes(mem.data[self.pc:self.pc + 8])
+        self._fault_instr = instr
+        self._fault_info = None
+
+    @property
+    def fault_info(self) -> FaultInfo | None:
+        if self._fault_info is None and self.fault_code is not None:
+            fields = (0, 0, 0, 0, 0)
+            if self._fault_instr is not None:
+                fields = decode_at(self._fault_instr)
+            self._fault_info = FaultInfo(
+                self.fault_code, self.fault_pc, *fields, self.fault_message
+            )
+        return self._fault_info
+
+    @fault_info.setter
+    def fault_info(self, info: FaultInfo | None) -> None:
+        self._fault_info = info
+        self._fault_instr = None
+        if info is None:
+            self.fault_code, self.fault_pc, self.fault_message = None, 0, ""
+        else:
+            self.fault_code, self.fault_pc, self.fault_message = info.code, info.pc, info.message
 
 
 def reset_state() -> CPUState:
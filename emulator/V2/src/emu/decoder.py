@@ -1,7 +1,15 @@
 from __future__ import annotations
 
+import struct
 from dataclasses import dataclass
 
+# [opc u8, rd u8, ra u8, rb u8, imm32 s32 little-endian]
+INSTR_FORMAT = struct.Struct("<BBBBi")
+
+# decode_at(buf, offset) -> (opcode, rd, ra, rb, imm32). Reads straight out of
+# a bytearray/memoryview (e.g. Memory.data) without slicing or copying.
+decode_at = INSTR_FORMAT.unpack_from
+
 
 @dataclass(frozen=True, slots=True)
 class DecodedInstr:
@@ -12,13 +20,13 @@ class DecodedInstr:
     imm32: int  # signed 32-bit sign-extended to Python int
 
 
+def encode_instruction(opcode: int, rd: int = 0, ra: int = 0, rb: int = 0, imm32: int = 0) -> bytes:
+    """Encode one instruction; imm32 may be signed or already masked to 32 bits."""
+    return INSTR_FORMAT.pack(opcode, rd, ra, rb, ((imm32 & 0xFFFFFFFF) ^ 0x80000000) - 0x80000000)
+
+
 def decode_instruction(instr8: bytes) -> DecodedInstr:
     """Decode 8-byte instruction: [opc, rd, ra, rb, imm32(le)]."""
     if len(instr8) != 8:
         raise ValueError("expected exactly 8 bytes")
-    opcode = instr8[0]
-    rd = instr8[1]
-    ra = instr8[2]
-    rb = instr8[3]
-    imm32 = int.from_bytes(instr8[4:8], byteorder="little", signed=True)
-    return DecodedInstr(opcode=opcode, rd=rd, ra=ra, rb=rb, imm32=imm32)
+    return DecodedInstr(*decode_at(instr8))
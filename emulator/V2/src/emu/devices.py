@@ -0,0 +1,183 @@
+# src/emu/devices.py
+"""
+Memory-mapped devices (see Memory.map_device()).
+
+Console: guest output through a byte register, buffered on the host.
+
+    console = Console(sys.stdout.buffer)
+    console.attach(mem)                 # registers at CONSOLE_BASE
+    run(st, mem, max_steps)             # output is flushed on HALT/fault
+
+Register map (offsets from the base address, all registers read as zero):
+    +0  DATA   write a byte to the output buffer
+    +1  FLUSH  any write flushes the buffer
+
+The buffer is written to the host stream on newline, when it holds
+`bufsize` bytes, on a write to FLUSH, and when the machine halts, so a
+guest printing a byte per STORE8_ABS costs one host write per line instead
+of one per byte.
+
+BlockDevice: sector storage backed by a host disk image.
+
+    disk = BlockDevice("disk.img", writable=True)
+    disk.attach(mem)                    # registers at BLOCK_BASE
+
+Register map (little-endian multi-byte registers):
+    +0   SECTOR    u32  first sector of the transfer
+    +4   ADDR      u32  guest memory address
+    +8   COUNT     u8   sectors to transfer
+    +9   CMD       u8   write CMD_READ (disk -> memory) or CMD_WRITE to start
+    +10  STATUS    u8   STATUS_OK or STATUS_ERROR for the last command (read-only)
+    +12  CAPACITY  u32  image size in sectors (read-only)
+
+The image is mmap'ed, so attaching a large image reads nothing up front and
+the OS pages it in as sectors are used. One store to CMD moves all COUNT
+sectors as a single slice copy between the mapping and Memory.data.
+"""
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+from typing import BinaryIO
+
+from .memory import PAGE_SHIFT, PF_MMIO, Memory, MMIORegion
+
+CONSOLE_BASE = 0xFF00  # above the default stack (SP starts at 0xFDFF)
+BLOCK_BASE = 0xFF10
+SECTOR_SIZE = 512
+
+
+class Console:
+    DATA = 0
+    FLUSH = 1
+    SIZE = 2
+
+    def __init__(self, out: BinaryIO, bufsize: int = 4096) -> None:
+        if bufsize <= 0:
+            raise ValueError("bufsize must be > 0")
+        self.out = out
+        self.bufsize = bufsize
+        self.buffer = bytearray()
+        self.region: MMIORegion | None = None
+
+    def attach(self, mem: Memory, base: int = CONSOLE_BASE) -> MMIORegion:
+        self.region = mem.map_device(
+            base, self.SIZE, read=self._read, write=self._write, name="console", flush=self.flush
+        )
+        return self.region
+
+    def flush(self) -> None:
+        if self.buffer:
+            self.out.write(self.buffer)
+            self.buffer.clear()
+            self.out.flush()
+
+    def _read(self, off: int) -> int:
+        return 0
+
+    def _write(self, off: int, val: int) -> None:
+        if off == self.DATA:
+            buf = self.buffer
+            buf.append(val)
+            if val == 0x0A or len(buf) >= self.bufsize:
+                self.flush()
+        else:
+            self.flush()
+
+
+class BlockDevice:
+    SECTOR = 0
+    ADDR = 4
+    COUNT = 8
+    CMD = 9
+    STATUS = 10
+    CAPACITY = 12
+    SIZE = 16
+
+    CMD_READ = 1
+    CMD_WRITE = 2
+    STATUS_OK = 0
+    STATUS_ERROR = 1
+
+    _U32 = struct.Struct("<I")
+
+    def __init__(self, path: str | os.PathLike[str], writable: bool = False) -> None:
+        self.writable = writable
+        with open(path, "r+b" if writable else "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < SECTOR_SIZE:
+                raise ValueError(f"disk image smaller than one sector: {path}")
+            # The mapping stays valid after the file is closed.
+            access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+            self.image = mmap.mmap(f.fileno(), 0, access=access)
+        self.sectors = size // SECTOR_SIZE  # a trailing partial sector is ignored
+        self.regs = bytearray(self.SIZE)
+        self._U32.pack_into(self.regs, self.CAPACITY, min(self.sectors, 0xFFFFFFFF))
+        self.mem: Memory | None = None
+        self.region: MMIORegion | None = None
+
+    def attach(self, mem: Memory, base: int = BLOCK_BASE) -> MMIORegion:
+        self.mem = mem
+        self.region = mem.map_device(
+            base,
+            self.SIZE,
+            read=self.regs.__getitem__,
+            write=self._write,
+            name="block",
+            flush=self.flush,
+        )
+        return self.region
+
+    def flush(self) -> None:
+        if self.writable:
+            self.image.flush()
+
+    def close(self) -> None:
+        if self.mem is not None and self.region is not None:
+            self.mem.unmap_device(self.region)
+            self.mem = self.region = None
+        self.flush()
+        self.image.close()
+
+    def transfer(self, cmd: int, sector: int, addr: int, count: int) -> bool:
+        """Run one command; returns False (and moves nothing) if it is invalid.
+
+        A transfer is invalid if it runs past the image or memory, or if any
+        page of [addr, addr + count * SECTOR_SIZE) holds a device region.
+        """
+        mem = self.mem
+        if mem is None or count == 0 or sector + count > self.sectors:
+            return False
+        n = count * SECTOR_SIZE
+        if addr + n > mem.size:
+            return False
+        # DMA never targets device registers: a READ over CMD would start
+        # another transfer from inside this one.
+        pages = mem.page_flags[addr >> PAGE_SHIFT : ((addr + n - 1) >> PAGE_SHIFT) + 1]
+        if any(f & PF_MMIO for f in pages):
+            return False
+        off = sector * SECTOR_SIZE
+        if cmd == self.CMD_READ:
+            # One slice copy; Memory.load() also runs the write barrier, so
+            # code caches and dirty-page tracking see the DMA.
+            mem.load(addr, memoryview(self.image)[off:off + n])
+            return True
+        if cmd == self.CMD_WRITE and self.writable:
+            self.image[off:off + n] = memoryview(mem.data)[addr:addr + n]
+            return True
+        return False
+
+    def _write(self, off: int, val: int) -> bool:
+        if off >= self.STATUS:  # STATUS and CAPACITY are read-only
+            return False
+        self.regs[off] = val
+        if off != self.CMD:
+            return False
+        regs, u32 = self.regs, self._U32
+        sector = u32.unpack_from(regs, self.SECTOR)[0]
+        addr = u32.unpack_from(regs, self.ADDR)[0]
+        ok = self.transfer(val, sector, addr, regs[self.COUNT])
+        regs[self.STATUS] = self.STATUS_OK if ok else self.STATUS_ERROR
+        # Memory may have changed under the running code.
+        return val == self.CMD_READ and ok
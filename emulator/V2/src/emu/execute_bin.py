@@ -1,6 +1,6 @@
 from .cpu_state import reset_state
 from .memory import Memory
-from .executor_v1 import step
+from .runner import run
 
 
 def make_mem(program: bytes, start: int = 0x0000) -> Memory:
@@ -28,6 +28,5 @@ mem = make_mem(bytes.fromhex(prog_str))
 st = reset_state()
 st.pc = 0x0000
 
-for _ in range(len(prog_str)//16):
-    step(st, mem)
+run(st, mem, len(prog_str)//16)
 print(st)
\ No newline at end of file
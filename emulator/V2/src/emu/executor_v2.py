@@ -1,10 +1,12 @@
 from __future__ import annotations
 
-from .cpu_state import CPUState, HaltReason
-from .decoder import decode_instruction
-from .faults import FaultCode, FaultInfo
-from .memory import Memory, MEM_SIZE 
+import struct
+from collections.abc import Callable
 
+from .cpu_state import CPUState, HaltReason
+from .decoder import decode_at, encode_instruction
+from .faults import FaultCode
+from .memory import PAGE_SHIFT, PF_MMIO, Memory
 
 # v2 opcode map (subset for starter)
 OPC_HALT = 0x00
@@ -24,408 +26,802 @@ OPC_POP8 = 0x41
 OPC_CALL_ABS = 0x42
 OPC_RET = 0x43
 
-
-
-def _fault(state: CPUState, info: FaultInfo) -> None:
-    state.halted = True
-    state.halt_reason = HaltReason.FAULT
-    state.fault_info = info
-
-
-def _pc_oob_or_misaligned(state: CPUState, opcode: int = 0, rd: int = 0, ra: int = 0, rb: int = 0, imm32: int = 0) -> None:
+OPCODE_NAMES = {
+    OPC_HALT: "HALT",
+    OPC_MOV_RI: "MOV_RI",
+    OPC_MOV_RR: "MOV_RR",
+    OPC_ADD: "ADD",
+    OPC_SUB: "SUB",
+    OPC_CMP: "CMP",
+    OPC_LOAD8_ABS: "LOAD8_ABS",
+    OPC_STORE8_ABS: "STORE8_ABS",
+    OPC_JMP_ABS: "JMP_ABS",
+    OPC_JMP_REL: "JMP_REL",
+    OPC_JZ_ABS: "JZ_ABS",
+    OPC_JZ_REL: "JZ_REL",
+    OPC_PUSH8: "PUSH8",
+    OPC_POP8: "POP8",
+    OPC_CALL_ABS: "CALL_ABS",
+    OPC_RET: "RET",
+}
+
+Handler = Callable[[CPUState, Memory, int, int, int, int, int], None]
+
+
+def _fault(state: CPUState, mem: Memory | None, code: FaultCode, message: str) -> None:
+    # Only the code, PC, message and the 8 instruction bytes at the PC are
+    # recorded here; the operand fields of state.fault_info are decoded from
+    # that copy when read. Fetch faults pass mem=None and report all-zero
+    # operands.
+    state.set_fault(code, message, mem)
+
+
+def _pc_oob_or_misaligned(state: CPUState, mem: Memory) -> None:
     # Fetch rules:
-    # - PC+7 must be <= 0xFFFF
+    # - PC+7 must be <= mem.top
     # - PC must be 8-byte aligned
-    if state.pc < 0 or state.pc + 7 >= MEM_SIZE:
-        _fault(state, FaultInfo(FaultCode.PC_OOB, state.pc, opcode, rd, ra, rb, imm32, "PC fetch out of range"))
+    if state.pc < 0 or state.pc + 7 >= mem.size:
+        _fault(state, None, FaultCode.PC_OOB, "PC fetch out of range")
         return
     if state.pc % 8 != 0:
-        _fault(state, FaultInfo(FaultCode.MISALIGNED, state.pc, opcode, rd, ra, rb, imm32, "PC not 8-byte aligned"))
+        _fault(state, None, FaultCode.MISALIGNED, "PC not 8-byte aligned")
         return
 
 
-def _default_pc_increment(state: CPUState, opcode: int, rd: int, ra: int, rb: int, imm32: int) -> None:
+def _default_pc_increment(state: CPUState, mem: Memory) -> None:
     next_pc = state.pc + 8
-    if next_pc < 0 or next_pc + 7 >= MEM_SIZE:
-        _fault(state, FaultInfo(FaultCode.PC_OOB, state.pc, opcode, rd, ra, rb, imm32, "next PC out of range"))
+    if next_pc < 0 or next_pc + 7 >= mem.size:
+        _fault(state, mem, FaultCode.PC_OOB, "next PC out of range")
         return
     state.pc = next_pc
 
 
+def _pc_increment_after_write(
+    state: CPUState, mem: Memory, opcode: int, rd: int, ra: int, rb: int, imm32: int
+) -> None:
+    # As _default_pc_increment(), for handlers that have just written memory:
+    # the write may have replaced the instruction at PC, so a fault reports
+    # the fields that were executed instead of the bytes now in memory.
+    next_pc = state.pc + 8
+    if next_pc < 0 or next_pc + 7 >= mem.size:
+        instr = encode_instruction(opcode, rd, ra, rb, imm32)
+        state.set_fault(FaultCode.PC_OOB, "next PC out of range", mem, instr)
+        return
+    state.pc = next_pc
 
 
-def step(state: CPUState, mem: Memory) -> None:
-    """Execute exactly one v2 instruction (HALT + MOV_RI implemented)."""
-    if state.halted:
-        return
+# Call frame: the 8-byte return PC occupies SP-7..SP with its least
+# significant byte at SP, i.e. big-endian starting at the (8-aligned) base.
+FRAME = struct.Struct(">Q")
 
-    _pc_oob_or_misaligned(state)
-    if state.halted:
-        return
 
-    try:
-        instr_bytes = mem.read_slice(state.pc, 8)
-    except IndexError:
-        _fault(state, FaultInfo(FaultCode.PC_OOB, state.pc, 0, 0, 0, 0, 0, "fetch failed"))
+def _push_frame(state: CPUState, mem: Memory, return_pc: int) -> None:
+    # Callers have checked that SP-7 is 8-aligned and in range, so the frame
+    # lies inside a single page.
+    base = state.sp - 7
+    FRAME.pack_into(mem.data, base, return_pc & 0xFFFFFFFFFFFFFFFF)
+    if mem.page_flags[base >> PAGE_SHIFT]:
+        mem.write_barrier(base, 8)
+    state.sp = base - 1
+
+
+def _pop_frame(state: CPUState, mem: Memory) -> int:
+    base = state.sp + 1
+    if mem.page_flags[base >> PAGE_SHIFT] & PF_MMIO:
+        new_pc = int.from_bytes(bytes(mem.read_u8(base + i) for i in range(8)), "big")
+    else:
+        new_pc = FRAME.unpack_from(mem.data, base)[0]
+    state.sp += 8
+    return new_pc
+
+
+def _op_halt(
+    state: CPUState, mem: Memory, opcode: int, rd: int, ra: int, rb: int, imm32: int
+) -> None:
+    # Must satisfy rd=ra=rb=0 and imm32=0 else ILLEGAL_ENCODING
+    if rd != 0 or ra != 0 or rb != 0 or imm32 != 0:
+        _fault(state, mem, FaultCode.ILLEGAL_ENCODING, "HALT encoding requires all fields zero")
         return
+    state.halted = True
+    state.halt_reason = HaltReason.NORMAL
+    # PC update: none
 
-    ins = decode_instruction(instr_bytes)
 
-    # Dispatch
-    if ins.opcode == OPC_HALT:
-        # Must satisfy rd=ra=rb=0 and imm32=0 else ILLEGAL_ENCODING
-        if ins.rd != 0 or ins.ra != 0 or ins.rb != 0 or ins.imm32 != 0:
-            _fault(state, FaultInfo(FaultCode.ILLEGAL_ENCODING, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "HALT encoding requires all fields zero"))
-            return
-        state.halted = True
-        state.halt_reason = HaltReason.NORMAL
-        # PC update: none
+def _op_mov_ri(
+    state: CPUState, mem: Memory, opcode: int, rd: int, ra: int, rb: int, imm32: int
+) -> None:
+    # Must satisfy ra=0, rb=0 else ILLEGAL_ENCODING
+    if ra != 0 or rb != 0:
+        _fault(state, mem, FaultCode.ILLEGAL_ENCODING, "MOV_RI requires ra=0, rb=0")
         return
+    # Sign-extend imm32 to 64-bit (Python int already signed; mask to 64-bit on write)
+    val = imm32 & 0xFFFFFFFFFFFFFFFF
+    if rd ==16 :
+        if not (0<=state.sp<=mem.top):
+            _fault(state, mem, FaultCode.MEM_OOB, "SP out of memory range")
+            return
+        state.sp = val
+    elif rd ==17 :
+        if not (0<=state.fp<=mem.top):
+            _fault(state, mem, FaultCode.MEM_OOB, "FP out of memory range")
+            return
+        state.fp = val
+    # v2 register indices are 0..15
+    elif not (0 <= rd <= 15):
+        _fault(state, mem, FaultCode.REG_OOB, "rd out of range for v2")
+        return
+    else:
+        state.regs[rd] = val
+    _default_pc_increment(state, mem)
 
-    if ins.opcode == OPC_MOV_RI:
-        # Must satisfy ra=0, rb=0 else ILLEGAL_ENCODING
-        if ins.ra != 0 or ins.rb != 0:
-            _fault(state, FaultInfo(FaultCode.ILLEGAL_ENCODING, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "MOV_RI requires ra=0, rb=0"))
-            return
-        # Sign-extend imm32 to 64-bit (Python int already signed; mask to 64-bit on write)
-        val = ins.imm32 & 0xFFFFFFFFFFFFFFFF
-        if ins.rd ==16 :
-            if not (0<=state.sp<=0xFFFF):
-                _fault(state, FaultInfo(FaultCode.MEM_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "SP out of memory range"))
-                return
-            state.sp = val
-        elif ins.rd ==17 :
-            if not (0<=state.fp<=0xFFFF):
-                _fault(state, FaultInfo(FaultCode.MEM_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "FP out of memory range"))
-                return
-            state.fp = val
-        # v2 register indices are 0..15
-        elif not (0 <= ins.rd <= 15):
-            _fault(state, FaultInfo(FaultCode.REG_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "rd out of range for v2"))
-            return
-        else:
-            state.regs[ins.rd] = val
-        _default_pc_increment(state, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32)
-        return
-    
-    if ins.opcode == OPC_MOV_RR:
-        # Must satisfy rb=0, imm32=0 or fault ILLEGAL_ENCODING.
-        if ins.rb != 0 or ins.imm32 != 0:
-            _fault(state, FaultInfo(FaultCode.ILLEGAL_ENCODING, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "MOV_RR requires rb=0, imm32=0"))
-            return
-        # v2 register indices are 0..15
-        if ins.rd ==16 :
-            if not (0<=state.sp<=0xFFFF):
-                _fault(state, FaultInfo(FaultCode.MEM_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "SP out of memory range"))
-                return
-        elif ins.rd ==17 :
-            if not (0<=state.fp<=0xFFFF):
-                _fault(state, FaultInfo(FaultCode.MEM_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "FP out of memory range"))
-                return
-        elif not (0 <= ins.rd <= 15):
-            _fault(state, FaultInfo(FaultCode.REG_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "rd out of range for v2"))
-            return
-        if ins.ra ==16 :
-            if not (0<=state.sp<=0xFFFF):
-                _fault(state, FaultInfo(FaultCode.MEM_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "SP out of memory range"))
-                return
-        elif ins.ra ==17 :
-            if not (0<=state.fp<=0xFFFF):
-                _fault(state, FaultInfo(FaultCode.MEM_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "FP out of memory range"))
-                return
-        elif not (0 <= ins.ra <= 15):
-            _fault(state, FaultInfo(FaultCode.REG_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "ra out of range for v2"))
-            return
-        
-        if ins.rd == 17:
-            if ins.ra == 17:
-                state.fp = state.fp
-            elif ins.ra == 16:
-                state.fp = state.sp
-            else :
-                state.fp = state.regs[ins.ra]
-        elif ins.rd == 16 :
-            if ins.ra == 17:
-                state.sp = state.fp
-            elif ins.ra == 16:
-                state.sp = state.sp
-            else :
-                state.sp = state.regs[ins.ra]
-        else:
-            if ins.ra == 17:
-                state.regs[ins.rd] = state.fp
-            elif ins.ra == 16:
-                state.regs[ins.rd] = state.sp
-            else :
-                state.regs[ins.rd] = state.regs[ins.ra]
-
-        _default_pc_increment(state, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32)
-        return
-    if ins.opcode == OPC_ADD:
-        # Must satisfy imm32=0 or fault ILLEGAL_ENCODING.
-        if ins.imm32 != 0:
-            _fault(state, FaultInfo(FaultCode.ILLEGAL_ENCODING, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "ADD requires imm32=0"))
-            return
-        # v2 register indices are 0..15
-        if not (0 <= ins.rd <= 15):
-            _fault(state, FaultInfo(FaultCode.REG_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "rd out of range for v2"))
-            return
-        if not (0 <= ins.ra <= 15):
-            _fault(state, FaultInfo(FaultCode.REG_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "ra out of range for v2"))
-            return
-        if not (0 <= ins.rb <= 15):
-            _fault(state, FaultInfo(FaultCode.REG_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "rd out of range for v2"))
-            return
-        temp = (state.regs[ins.ra] + state.regs[ins.rb])%(2**64)
-        state.regs[ins.rd] = temp
-        state.z = temp == 0
-        _default_pc_increment(state, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32)
-        return
-    if ins.opcode == OPC_SUB:
-        # Must satisfy imm32=0 or fault ILLEGAL_ENCODING.
-        if ins.imm32 != 0:
-            _fault(state, FaultInfo(FaultCode.ILLEGAL_ENCODING, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "SUB requires imm32=0"))
-            return
-        # v2 register indices are 0..15
-        if not (0 <= ins.rd <= 15):
-            _fault(state, FaultInfo(FaultCode.REG_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "rd out of range for v2"))
-            return
-        if not (0 <= ins.ra <= 15):
-            _fault(state, FaultInfo(FaultCode.REG_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "ra out of range for v2"))
-            return
-        if not (0 <= ins.rb <= 15):
-            _fault(state, FaultInfo(FaultCode.REG_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "rd out of range for v2"))
-            return
-        temp = (state.regs[ins.ra] - state.regs[ins.rb])%(2**64)
-        state.regs[ins.rd] = temp
-        state.z = temp == 0
-        _default_pc_increment(state, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32)
-        return
-    if ins.opcode == OPC_CMP:
-        # Must satisfy rd=0, imm32=0 or ILLEGAL_ENCODING.
-        if ins.imm32 != 0 or ins.rd !=0 :
-            _fault(state, FaultInfo(FaultCode.ILLEGAL_ENCODING, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "CMP requires rd=0, imm32=0"))
-            return
-        # v2 register indices are 0..15
-        if not (0 <= ins.ra <= 15):
-            _fault(state, FaultInfo(FaultCode.REG_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "ra out of range for v2"))
-            return
-        if not (0 <= ins.rb <= 15):
-            _fault(state, FaultInfo(FaultCode.REG_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "rd out of range for v2"))
+
+def _op_mov_rr(
+    state: CPUState, mem: Memory, opcode: int, rd: int, ra: int, rb: int, imm32: int
+) -> None:
+    # Must satisfy rb=0, imm32=0 or fault ILLEGAL_ENCODING.
+    if rb != 0 or imm32 != 0:
+        _fault(state, mem, FaultCode.ILLEGAL_ENCODING, "MOV_RR requires rb=0, imm32=0")
+        return
+    # v2 register indices are 0..15
+    if rd ==16 :
+        if not (0<=state.sp<=mem.top):
+            _fault(state, mem, FaultCode.MEM_OOB, "SP out of memory range")
             return
-        temp = (state.regs[ins.ra] - state.regs[ins.rb])%(2**64)
-        state.z = temp == 0
-        _default_pc_increment(state, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32)
-        return
-        
-    if ins.opcode == OPC_LOAD8_ABS:
-        # Must satisfy ra=0, rb=0 or fault ILLEGAL_ENCODING.
-        if ins.ra != 0 or ins.rb != 0:
-            _fault(state, FaultInfo(FaultCode.ILLEGAL_ENCODING, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "LOAD8_ABS requires ra=0, rb=0"))
+    elif rd ==17 :
+        if not (0<=state.fp<=mem.top):
+            _fault(state, mem, FaultCode.MEM_OOB, "FP out of memory range")
             return
-        # v2 register indices are 0..15
-        if not (0 <= ins.rd <= 15):
-            _fault(state, FaultInfo(FaultCode.REG_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "rd out of range for v2"))
+    elif not (0 <= rd <= 15):
+        _fault(state, mem, FaultCode.REG_OOB, "rd out of range for v2")
+        return
+    if ra ==16 :
+        if not (0<=state.sp<=mem.top):
+            _fault(state, mem, FaultCode.MEM_OOB, "SP out of memory range")
             return
-        if not (0<= ins.imm32 < MEM_SIZE) :
-            _fault(state, FaultInfo(FaultCode.MEM_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "Address is out of memory range"))
+    elif ra ==17 :
+        if not (0<=state.fp<=mem.top):
+            _fault(state, mem, FaultCode.MEM_OOB, "FP out of memory range")
             return
-        
-        addr = ins.imm32 
+    elif not (0 <= ra <= 15):
+        _fault(state, mem, FaultCode.REG_OOB, "ra out of range for v2")
+        return
+
+    if rd == 17:
+        if ra == 17:
+            state.fp = state.fp
+        elif ra == 16:
+            state.fp = state.sp
+        else :
+            state.fp = state.regs[ra]
+    elif rd == 16 :
+        if ra == 17:
+            state.sp = state.fp
+        elif ra == 16:
+            state.sp = state.sp
+        else :
+            state.sp = state.regs[ra]
+    else:
+        if ra == 17:
+            state.regs[rd] = state.fp
+        elif ra == 16:
+            state.regs[rd] = state.sp
+        else :
+            state.regs[rd] = state.regs[ra]
+
+    _default_pc_increment(state, mem)
+
+
+def _op_add(
+    state: CPUState, mem: Memory, opcode: int, rd: int, ra: int, rb: int, imm32: int
+) -> None:
+    # Must satisfy imm32=0 or fault ILLEGAL_ENCODING.
+    if imm32 != 0:
+        _fault(state, mem, FaultCode.ILLEGAL_ENCODING, "ADD requires imm32=0")
+        return
+    # v2 register indices are 0..15
+    if not (0 <= rd <= 15):
+        _fault(state, mem, FaultCode.REG_OOB, "rd out of range for v2")
+        return
+    if not (0 <= ra <= 15):
+        _fault(state, mem, FaultCode.REG_OOB, "ra out of range for v2")
+        return
+    if not (0 <= rb <= 15):
+        _fault(state, mem, FaultCode.REG_OOB, "rd out of range for v2")
+        return
+    temp = (state.regs[ra] + state.regs[rb])%(2**64)
+    state.regs[rd] = temp
+    state.z = temp == 0
+    _default_pc_increment(state, mem)
+
+
+def _op_sub(
+    state: CPUState, mem: Memory, opcode: int, rd: int, ra: int, rb: int, imm32: int
+) -> None:
+    # Must satisfy imm32=0 or fault ILLEGAL_ENCODING.
+    if imm32 != 0:
+        _fault(state, mem, FaultCode.ILLEGAL_ENCODING, "SUB requires imm32=0")
+        return
+    # v2 register indices are 0..15
+    if not (0 <= rd <= 15):
+        _fault(state, mem, FaultCode.REG_OOB, "rd out of range for v2")
+        return
+    if not (0 <= ra <= 15):
+        _fault(state, mem, FaultCode.REG_OOB, "ra out of range for v2")
+        return
+    if not (0 <= rb <= 15):
+        _fault(state, mem, FaultCode.REG_OOB, "rd out of range for v2")
+        return
+    temp = (state.regs[ra] - state.regs[rb])%(2**64)
+    state.regs[rd] = temp
+    state.z = temp == 0
+    _default_pc_increment(state, mem)
+
+
+def _op_cmp(
+    state: CPUState, mem: Memory, opcode: int, rd: int, ra: int, rb: int, imm32: int
+) -> None:
+    # Must satisfy rd=0, imm32=0 or ILLEGAL_ENCODING.
+    if imm32 != 0 or rd !=0 :
+        _fault(state, mem, FaultCode.ILLEGAL_ENCODING, "CMP requires rd=0, imm32=0")
+        return
+    # v2 register indices are 0..15
+    if not (0 <= ra <= 15):
+        _fault(state, mem, FaultCode.REG_OOB, "ra out of range for v2")
+        return
+    if not (0 <= rb <= 15):
+        _fault(state, mem, FaultCode.REG_OOB, "rd out of range for v2")
+        return
+    temp = (state.regs[ra] - state.regs[rb])%(2**64)
+    state.z = temp == 0
+    _default_pc_increment(state, mem)
 
-        b = mem.read_u8(addr)
 
-        #sign extention !!
-        state.regs[ins.rd] = b & 0xFFFFFFFFFFFFFFFF
+def _op_load8_abs(
+    state: CPUState, mem: Memory, opcode: int, rd: int, ra: int, rb: int, imm32: int
+) -> None:
+    # Must satisfy ra=0, rb=0 or fault ILLEGAL_ENCODING.
+    if ra != 0 or rb != 0:
+        _fault(state, mem, FaultCode.ILLEGAL_ENCODING, "LOAD8_ABS requires ra=0, rb=0")
+        return
+    # v2 register indices are 0..15
+    if not (0 <= rd <= 15):
+        _fault(state, mem, FaultCode.REG_OOB, "rd out of range for v2")
+        return
+    if not (0<= imm32 < mem.size) :
+        _fault(state, mem, FaultCode.MEM_OOB, "Address is out of memory range")
+        return
 
-        _default_pc_increment(state, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32)
+    addr = imm32 
+
+    b = mem.read_u8(addr)
+
+    #sign extention !!
+    state.regs[rd] = b & 0xFFFFFFFFFFFFFFFF
+
+    _default_pc_increment(state, mem)
+
+
+def _op_store8_abs(
+    state: CPUState, mem: Memory, opcode: int, rd: int, ra: int, rb: int, imm32: int
+) -> None:
+    # Must satisfy ra=0, rb=0 or fault ILLEGAL_ENCODING.
+    if rd != 0 or rb != 0:
+        _fault(state, mem, FaultCode.ILLEGAL_ENCODING, "STORE8_ABS requires rd=0, rb=0")
         return
-    if ins.opcode == OPC_STORE8_ABS:
-        # Must satisfy ra=0, rb=0 or fault ILLEGAL_ENCODING.
-        if ins.rd != 0 or ins.rb != 0:
-            _fault(state, FaultInfo(FaultCode.ILLEGAL_ENCODING, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "STORE8_ABS requires rd=0, rb=0"))
-            return
-        # v2 register indices are 0..15
-        if not (0 <= ins.ra <= 15):
-            _fault(state, FaultInfo(FaultCode.REG_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "ra out of range for v2"))
-            return
-        if not (0<= ins.imm32 < MEM_SIZE) :
-            _fault(state, FaultInfo(FaultCode.MEM_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "Address is out of memory range"))
-            return
-        addr = ins.imm32 
+    # v2 register indices are 0..15
+    if not (0 <= ra <= 15):
+        _fault(state, mem, FaultCode.REG_OOB, "ra out of range for v2")
+        return
+    if not (0<= imm32 < mem.size) :
+        _fault(state, mem, FaultCode.MEM_OOB, "Address is out of memory range")
+        return
+    addr = imm32 
+
+    mem.write_u8(addr , state.regs[ra] & 0xFF)
+
+    _pc_increment_after_write(state, mem, opcode, rd, ra, rb, imm32)
 
-        mem.write_u8(addr , state.regs[ins.ra] & 0xFF)
-        
-        _default_pc_increment(state, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32)
+
+def _op_jmp_abs(
+    state: CPUState, mem: Memory, opcode: int, rd: int, ra: int, rb: int, imm32: int
+) -> None:
+    # Must satisfy rd=0, ra=0, rb=0 or fault ILLEGAL_ENCODING.
+    if rd != 0 or ra != 0 or rb != 0:
+        _fault(state, mem, FaultCode.ILLEGAL_ENCODING, "JMP_ABS requires rd=0, ra=0, rb=0")
+        return
+    #Faults PC_OOB
+    if not (0<= imm32 < mem.top) :
+        _fault(state, mem, FaultCode.PC_OOB, "Out of PC range")
         return
-    if ins.opcode == OPC_JMP_ABS:
-        # Must satisfy rd=0, ra=0, rb=0 or fault ILLEGAL_ENCODING.
-        if ins.rd != 0 or ins.ra != 0 or ins.rb != 0:
-            _fault(state, FaultInfo(FaultCode.ILLEGAL_ENCODING, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "JMP_ABS requires rd=0, ra=0, rb=0"))
-            return
-        #Faults PC_OOB
-        if not (0<= ins.imm32 < 0xFFFF) :
-            _fault(state, FaultInfo(FaultCode.PC_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "Out of PC range"))
-            return
-        
-        target = ins.imm32 
 
-        if target%8 !=0:
-            _fault(state,FaultInfo(FaultCode.MISALIGNED, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "Target is misaligned"))
-            return
-        if target+7 > 0xFFFF :
-            _fault(state, FaultInfo(FaultCode.PC_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "Target out of range"))
-            return
+    target = imm32 
+
+    if target%8 !=0:
+        _fault(state, mem, FaultCode.MISALIGNED, "Target is misaligned")
+        return
+    if target+7 > mem.top :
+        _fault(state, mem, FaultCode.PC_OOB, "Target out of range")
+        return
+    state.pc = target
+
+
+def _op_jmp_rel(
+    state: CPUState, mem: Memory, opcode: int, rd: int, ra: int, rb: int, imm32: int
+) -> None:
+    # Must satisfy rd=0, ra=0, rb=0 or fault ILLEGAL_ENCODING.
+    if rd != 0 or ra != 0 or rb != 0:
+        _fault(state, mem, FaultCode.ILLEGAL_ENCODING, "JMP_REL requires rd=0, ra=0, rb=0")
+        return
+
+    target = state.pc + imm32
+
+    if target+7 > mem.top :
+        _fault(state, mem, FaultCode.PC_OOB, "Target out of range")
+        return
+    if not (0 <= target <= mem.top) :
+        _fault(state, mem, FaultCode.PC_OOB, "Target out of range")
+        return
+    if target%8 !=0:
+        _fault(state, mem, FaultCode.MISALIGNED, "Target is misaligned")
+        return
+    state.pc = target
+
+
+def _op_jz_abs(
+    state: CPUState, mem: Memory, opcode: int, rd: int, ra: int, rb: int, imm32: int
+) -> None:
+    # Must satisfy rd=0, ra=0, rb=0 or fault ILLEGAL_ENCODING.
+    if rd != 0 or ra != 0 or rb != 0:
+        _fault(state, mem, FaultCode.ILLEGAL_ENCODING, "JZ_ABS requires rd=0, ra=0, rb=0")
+        return
+    if not (0<= imm32 < mem.top) :
+        _fault(state, mem, FaultCode.PC_OOB, "Out of PC range")
+        return
+
+    target = imm32 
+
+    if target+7 > mem.top :
+        _fault(state, mem, FaultCode.PC_OOB, "Target out of range")
+        return
+    if state.z :
         state.pc = target
+    else:
+        _default_pc_increment(state, mem)
+
+
+def _op_jz_rel(
+    state: CPUState, mem: Memory, opcode: int, rd: int, ra: int, rb: int, imm32: int
+) -> None:
+    # Must satisfy rd=0, ra=0, rb=0 or fault ILLEGAL_ENCODING.
+    if rd != 0 or ra != 0 or rb != 0:
+        _fault(state, mem, FaultCode.ILLEGAL_ENCODING, "JZ_REL requires rd=0, ra=0, rb=0")
         return
-    
-    if ins.opcode == OPC_JMP_REL:
-        # Must satisfy rd=0, ra=0, rb=0 or fault ILLEGAL_ENCODING.
-        if ins.rd != 0 or ins.ra != 0 or ins.rb != 0:
-            _fault(state, FaultInfo(FaultCode.ILLEGAL_ENCODING, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "JMP_REL requires rd=0, ra=0, rb=0"))
-            return
-        
-        target = state.pc + ins.imm32
-        
-        if target+7 > 0xFFFF :
-            _fault(state, FaultInfo(FaultCode.PC_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "Target out of range"))
-            return
-        if not (0 <= target <= 0xFFFF) :
-            _fault(state, FaultInfo(FaultCode.PC_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "Target out of range"))
-            return
-        if target%8 !=0:
-            _fault(state,FaultInfo(FaultCode.MISALIGNED, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "Target is misaligned"))
-            return
+
+    target = state.pc + imm32
+    if target+7 > mem.top :
+        _fault(state, mem, FaultCode.PC_OOB, "Target out of range")
+        return
+    if not (0 <= target <= mem.top) :
+        _fault(state, mem, FaultCode.PC_OOB, "Target out of range")
+        return
+    if state.z :
         state.pc = target
+    else:
+        _default_pc_increment(state, mem)
+
+
+def _op_push8(
+    state: CPUState, mem: Memory, opcode: int, rd: int, ra: int, rb: int, imm32: int
+) -> None:
+    #Must satisfy rd=0, rb=0, imm32=0 or ILLEGAL_ENCODING.
+    if rd != 0 or rb != 0 or imm32 !=0:
+        _fault(state, mem, FaultCode.ILLEGAL_ENCODING, "PUSH8 requires rd=0, rb=0, imm32=0")
         return
-    if ins.opcode == OPC_JZ_ABS:
-        # Must satisfy rd=0, ra=0, rb=0 or fault ILLEGAL_ENCODING.
-        if ins.rd != 0 or ins.ra != 0 or ins.rb != 0:
-            _fault(state, FaultInfo(FaultCode.ILLEGAL_ENCODING, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "JZ_ABS requires rd=0, ra=0, rb=0"))
-            return
-        if not (0<= ins.imm32 < 0xFFFF) :
-            _fault(state, FaultInfo(FaultCode.PC_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "Out of PC range"))
-            return
-        
-        target = ins.imm32 
 
-        if target+7 > 0xFFFF :
-            _fault(state, FaultInfo(FaultCode.PC_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "Target out of range"))
-            return
-        if state.z :
-            state.pc = target
-        else:
-            _default_pc_increment(state, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32)
-        return
-    if ins.opcode == OPC_JZ_REL:
-        # Must satisfy rd=0, ra=0, rb=0 or fault ILLEGAL_ENCODING.
-        if ins.rd != 0 or ins.ra != 0 or ins.rb != 0:
-            _fault(state, FaultInfo(FaultCode.ILLEGAL_ENCODING, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "JZ_REL requires rd=0, ra=0, rb=0"))
-            return
-        
-        target = state.pc + ins.imm32
-        if target+7 > 0xFFFF :
-            _fault(state, FaultInfo(FaultCode.PC_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "Target out of range"))
-            return
-        if not (0 <= target <= 0xFFFF) :
-            _fault(state, FaultInfo(FaultCode.PC_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "Target out of range"))
-            return
-        if state.z :
-            state.pc = target
-        else:
-            _default_pc_increment(state, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32)
-        return
-    if ins.opcode == OPC_PUSH8:
-        #Must satisfy rd=0, rb=0, imm32=0 or ILLEGAL_ENCODING.
-        if ins.rd != 0 or ins.rb != 0 or ins.imm32 !=0:
-            _fault(state, FaultInfo(FaultCode.ILLEGAL_ENCODING, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "PUSH8 requires rd=0, rb=0, imm32=0"))
-            return
-        
-        if not (0 <= ins.ra <= 15):
-            _fault(state, FaultInfo(FaultCode.REG_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "ra out of range for v2"))
-            return
-        
-        if not (0 <= state.sp <= 0xFFFF):
-            _fault(state, FaultInfo(FaultCode.MEM_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "SP out of memory range"))
-            return
-        if state.sp == 0:
-            _fault(state, FaultInfo(FaultCode.MEM_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "SP underflow"))
-            return
-        mem.write_u8(state.sp,state.regs[ins.ra] & 0xFF)
-        state.sp -=1
+    if not (0 <= ra <= 15):
+        _fault(state, mem, FaultCode.REG_OOB, "ra out of range for v2")
+        return
+
+    if not (0 <= state.sp <= mem.top):
+        _fault(state, mem, FaultCode.MEM_OOB, "SP out of memory range")
+        return
+    if state.sp == 0:
+        _fault(state, mem, FaultCode.MEM_OOB, "SP underflow")
+        return
+    mem.write_u8(state.sp,state.regs[ra] & 0xFF)
+    state.sp -=1
+
 
+    _pc_increment_after_write(state, mem, opcode, rd, ra, rb, imm32)
 
-        _default_pc_increment(state, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32)
+
+def _op_pop8(
+    state: CPUState, mem: Memory, opcode: int, rd: int, ra: int, rb: int, imm32: int
+) -> None:
+    #Must satisfy ra=0, rb=0, imm32=0 or ILLEGAL_ENCODING.
+    if ra != 0 or rb != 0 or imm32 !=0:
+        _fault(state, mem, FaultCode.ILLEGAL_ENCODING, "POP8 requires ra=0, rb=0, imm32=0")
+        return
+
+    if not (0 <= rd <= 15):
+        _fault(state, mem, FaultCode.REG_OOB, "rd out of range for v2")
         return
-    if ins.opcode == OPC_POP8:
-        #Must satisfy ra=0, rb=0, imm32=0 or ILLEGAL_ENCODING.
-        if ins.ra != 0 or ins.rb != 0 or ins.imm32 !=0:
-            _fault(state, FaultInfo(FaultCode.ILLEGAL_ENCODING, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "POP8 requires ra=0, rb=0, imm32=0"))
-            return
-        
-        if not (0 <= ins.rd <= 15):
-            _fault(state, FaultInfo(FaultCode.REG_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "rd out of range for v2"))
-            return
-        
-        if state.sp == 0xFFFF:
-            _fault(state, FaultInfo(FaultCode.MEM_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "SP overflow"))
-            return
-        state.sp +=1
-        b = mem.read_u8(state.sp)
 
-        #sign extention !!
-        state.regs[ins.rd] = b & 0xFFFFFFFFFFFFFFFF
+    if state.sp == mem.top:
+        _fault(state, mem, FaultCode.MEM_OOB, "SP overflow")
+        return
+    state.sp +=1
+    b = mem.read_u8(state.sp)
+
+    #sign extention !!
+    state.regs[rd] = b & 0xFFFFFFFFFFFFFFFF
+
+
+    _default_pc_increment(state, mem)
 
 
-        _default_pc_increment(state, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32)
+def _op_call_abs(
+    state: CPUState, mem: Memory, opcode: int, rd: int, ra: int, rb: int, imm32: int
+) -> None:
+    #Must satisfy rd=ra=rb=0 or ILLEGAL_ENCODING.
+    if ra != 0 or rb != 0 or rd !=0:
+        _fault(state, mem, FaultCode.ILLEGAL_ENCODING, "CALL_ABS requires rd=0, ra=0, rb=0")
         return
-    if ins.opcode == OPC_CALL_ABS:
-        #Must satisfy rd=ra=rb=0 or ILLEGAL_ENCODING.
-        if ins.ra != 0 or ins.rb != 0 or ins.rd !=0:
-            _fault(state, FaultInfo(FaultCode.ILLEGAL_ENCODING, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "CALL_ABS requires rd=0, ra=0, rb=0"))
-            return
-        if state.pc + 15 > 0xFFFF:
-            _fault(state, FaultInfo(FaultCode.PC_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "PC is our of pc range"))
-            return
-        base = state.sp -7
-        if (base) %8 !=0:
-            _fault(state, FaultInfo(FaultCode.MISALIGNED, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "SP is not aligned"))
-            return
-        if base <0 or base+7 >0xFFFF:
-            _fault(state, FaultInfo(FaultCode.MEM_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "SP is not in range"))
-            return
-        return_pc = state.pc+8
-        rpc = '0'*(18-len(hex(return_pc))) + hex(return_pc)[2:]
-        rpc = rpc[::-1]
-        for i in range(8):
-            mem.write_u8(state.sp, int(rpc[2*i:2*i+2][::-1],16))
-            state.sp -=1
-
-        state.pc = ins.imm32 & 0xFFFF
-        return
-    if ins.opcode == OPC_RET:
-        #Must satisfy rd=ra=rb=0, imm32=0 or ILLEGAL_ENCODING.
-        if ins.ra != 0 or ins.rb != 0 or ins.rd !=0 or ins.imm32 !=0 :
-            _fault(state, FaultInfo(FaultCode.ILLEGAL_ENCODING, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "RET requires rd=0, ra=0, rb=0, imm32=0"))
+    if state.pc + 15 > mem.top:
+        _fault(state, mem, FaultCode.PC_OOB, "PC is our of pc range")
+        return
+    base = state.sp -7
+    if (base) %8 !=0:
+        _fault(state, mem, FaultCode.MISALIGNED, "SP is not aligned")
+        return
+    if base <0 or base+7 >mem.top:
+        _fault(state, mem, FaultCode.MEM_OOB, "SP is not in range")
+        return
+    _push_frame(state, mem, state.pc+8)
+
+    state.pc = imm32 & mem.top
+
+
+def _op_ret(
+    state: CPUState, mem: Memory, opcode: int, rd: int, ra: int, rb: int, imm32: int
+) -> None:
+    #Must satisfy rd=ra=rb=0, imm32=0 or ILLEGAL_ENCODING.
+    if ra != 0 or rb != 0 or rd !=0 or imm32 !=0 :
+        _fault(state, mem, FaultCode.ILLEGAL_ENCODING, "RET requires rd=0, ra=0, rb=0, imm32=0")
+        return
+    if state.pc + 15 > mem.top:
+        _fault(state, mem, FaultCode.PC_OOB, "PC is our of pc range")
+        return
+    base = state.sp +1
+    if (base) %8 !=0:
+        _fault(state, mem, FaultCode.MISALIGNED, "SP is not aligned")
+        return
+    if base <0 or base+7 >mem.top:
+        _fault(state, mem, FaultCode.MEM_OOB, "SP is not in range")
+        return
+    state.pc = _pop_frame(state, mem)
+
+
+def _op_illegal(
+    state: CPUState, mem: Memory, opcode: int, rd: int, ra: int, rb: int, imm32: int
+) -> None:
+    # Any other opcode is reserved in v2
+    _fault(state, mem, FaultCode.ILLEGAL_OPCODE, "opcode not defined in v2")
+
+
+# 256-entry opcode table: the opcode byte indexes its handler directly, so
+# dispatch costs the same for every opcode (reserved ones included).
+_DISPATCH: list[Handler] = [_op_illegal] * 256
+_DISPATCH[OPC_HALT] = _op_halt
+_DISPATCH[OPC_MOV_RI] = _op_mov_ri
+_DISPATCH[OPC_MOV_RR] = _op_mov_rr
+_DISPATCH[OPC_ADD] = _op_add
+_DISPATCH[OPC_SUB] = _op_sub
+_DISPATCH[OPC_CMP] = _op_cmp
+_DISPATCH[OPC_LOAD8_ABS] = _op_load8_abs
+_DISPATCH[OPC_STORE8_ABS] = _op_store8_abs
+_DISPATCH[OPC_JMP_ABS] = _op_jmp_abs
+_DISPATCH[OPC_JMP_REL] = _op_jmp_rel
+_DISPATCH[OPC_JZ_ABS] = _op_jz_abs
+_DISPATCH[OPC_JZ_REL] = _op_jz_rel
+_DISPATCH[OPC_PUSH8] = _op_push8
+_DISPATCH[OPC_POP8] = _op_pop8
+_DISPATCH[OPC_CALL_ABS] = _op_call_abs
+_DISPATCH[OPC_RET] = _op_ret
+
+
+# ---------------------------------------------------------------------------
+# Predecoded fast path
+#
+# The first time step() executes the instruction at a PC it checks whether
+# every fault that depends only on the encoding (and on the PC itself, e.g.
+# the next-PC range check) is ruled out. If so, it stores an
+# (opcode, rd, ra, rb, imm32, fast_handler) tuple in mem.icache. Later visits
+# skip the fetch check and decode and call the fast handler, which only
+# performs the checks that depend on run-time state (SP/FP and the Z flag).
+# Instructions that would fault statically are never cached and keep going
+# through the full handlers above.
+# ---------------------------------------------------------------------------
+
+FastHandler = Callable[[CPUState, Memory, int, int, int, int], None]
+# (opcode, rd, ra, rb, imm32, fx) or, for a fused pair, (FUSE_*, rd, ra, rb,
+# imm32, fx, jz_target). step() only ever uses fields 1..5.
+CacheEntry = (
+    tuple[int, int, int, int, int, FastHandler] | tuple[int, int, int, int, int, FastHandler, int]
+)
+
+MASK64 = 0xFFFFFFFFFFFFFFFF
+
+
+def _fx_halt(state: CPUState, mem: Memory, rd: int, ra: int, rb: int, imm32: int) -> None:
+    state.halted = True
+    state.halt_reason = HaltReason.NORMAL
+
+
+def _fx_mov_ri(state: CPUState, mem: Memory, rd: int, ra: int, rb: int, imm32: int) -> None:
+    val = imm32 & MASK64
+    if rd == 16:
+        if not (0 <= state.sp <= mem.top):
+            _fault(state, mem, FaultCode.MEM_OOB, "SP out of memory range")
             return
-        if state.pc + 15 > 0xFFFF:
-            _fault(state, FaultInfo(FaultCode.PC_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "PC is our of pc range"))
+        state.sp = val
+    elif rd == 17:
+        if not (0 <= state.fp <= mem.top):
+            _fault(state, mem, FaultCode.MEM_OOB, "FP out of memory range")
             return
-        base = state.sp +1
-        if (base) %8 !=0:
-            _fault(state, FaultInfo(FaultCode.MISALIGNED, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "SP is not aligned"))
+        state.fp = val
+    else:
+        state.regs[rd] = val
+    state.pc += 8
+
+
+def _fx_mov_rr(state: CPUState, mem: Memory, rd: int, ra: int, rb: int, imm32: int) -> None:
+    if rd < 16 and ra < 16:
+        state.regs[rd] = state.regs[ra]
+        state.pc += 8
+        return
+    # SP/FP selectors: range checks in the same order as _op_mov_rr.
+    for sel in (rd, ra):
+        if sel == 16 and not (0 <= state.sp <= mem.top):
+            _fault(state, mem, FaultCode.MEM_OOB, "SP out of memory range")
             return
-        if base <0 or base+7 >0xFFFF:
-            _fault(state, FaultInfo(FaultCode.MEM_OOB, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "SP is not in range"))
+        if sel == 17 and not (0 <= state.fp <= mem.top):
+            _fault(state, mem, FaultCode.MEM_OOB, "FP out of memory range")
             return
-        new_pc =0
-        pc_bytes = mem.read_slice(state.sp+1,8)
-        for i in range(len(pc_bytes)):
-            new_pc += (256**(7-i))*pc_bytes[i]
-        state.sp +=8
+    if ra == 16:
+        val = state.sp
+    elif ra == 17:
+        val = state.fp
+    else:
+        val = state.regs[ra]
+    if rd == 16:
+        state.sp = val
+    elif rd == 17:
+        state.fp = val
+    else:
+        state.regs[rd] = val
+    state.pc += 8
+
+
+def _fx_add(state: CPUState, mem: Memory, rd: int, ra: int, rb: int, imm32: int) -> None:
+    regs = state.regs
+    temp = (regs[ra] + regs[rb]) & MASK64
+    regs[rd] = temp
+    state.z = temp == 0
+    state.pc += 8
+
+
+def _fx_sub(state: CPUState, mem: Memory, rd: int, ra: int, rb: int, imm32: int) -> None:
+    regs = state.regs
+    temp = (regs[ra] - regs[rb]) & MASK64
+    regs[rd] = temp
+    state.z = temp == 0
+    state.pc += 8
+
+
+def _fx_cmp(state: CPUState, mem: Memory, rd: int, ra: int, rb: int, imm32: int) -> None:
+    regs = state.regs
+    state.z = (regs[ra] - regs[rb]) & MASK64 == 0
+    state.pc += 8
+
+
+def _fx_load8_abs(state: CPUState, mem: Memory, rd: int, ra: int, rb: int, imm32: int) -> None:
+    state.regs[rd] = mem.data[imm32]
+    state.pc += 8
+
+
+def _fx_store8_abs(state: CPUState, mem: Memory, rd: int, ra: int, rb: int, imm32: int) -> None:
+    mem.write_u8(imm32, state.regs[ra] & 0xFF)
+    state.pc += 8
+
 
-        state.pc = new_pc
+def _fx_jmp_abs(state: CPUState, mem: Memory, rd: int, ra: int, rb: int, imm32: int) -> None:
+    state.pc = imm32
+
+
+def _fx_jmp_rel(state: CPUState, mem: Memory, rd: int, ra: int, rb: int, imm32: int) -> None:
+    state.pc += imm32
+
+
+def _fx_jz_abs(state: CPUState, mem: Memory, rd: int, ra: int, rb: int, imm32: int) -> None:
+    if state.z:
+        state.pc = imm32
+    else:
+        state.pc += 8
+
+
+def _fx_jz_rel(state: CPUState, mem: Memory, rd: int, ra: int, rb: int, imm32: int) -> None:
+    if state.z:
+        state.pc += imm32
+    else:
+        state.pc += 8
+
+
+def _fx_push8(state: CPUState, mem: Memory, rd: int, ra: int, rb: int, imm32: int) -> None:
+    if not (0 <= state.sp <= mem.top):
+        _fault(state, mem, FaultCode.MEM_OOB, "SP out of memory range")
         return
-        
-    # Any other opcode is reserved in v2
-    _fault(state, FaultInfo(FaultCode.ILLEGAL_OPCODE, state.pc, ins.opcode, ins.rd, ins.ra, ins.rb, ins.imm32, "opcode not defined in v2"))
+    if state.sp == 0:
+        _fault(state, mem, FaultCode.MEM_OOB, "SP underflow")
+        return
+    mem.write_u8(state.sp, state.regs[ra] & 0xFF)
+    state.sp -= 1
+    state.pc += 8
+
+
+def _fx_pop8(state: CPUState, mem: Memory, rd: int, ra: int, rb: int, imm32: int) -> None:
+    if state.sp == mem.top:
+        _fault(state, mem, FaultCode.MEM_OOB, "SP overflow")
+        return
+    state.sp += 1
+    state.regs[rd] = mem.read_u8(state.sp)
+    state.pc += 8
+
+
+def _fx_call_abs(state: CPUState, mem: Memory, rd: int, ra: int, rb: int, imm32: int) -> None:
+    base = state.sp - 7
+    if base % 8 != 0:
+        _fault(state, mem, FaultCode.MISALIGNED, "SP is not aligned")
+        return
+    if base < 0 or base + 7 > mem.top:
+        _fault(state, mem, FaultCode.MEM_OOB, "SP is not in range")
+        return
+    _push_frame(state, mem, state.pc + 8)
+    state.pc = imm32 & mem.top
+
+
+def _fx_ret(state: CPUState, mem: Memory, rd: int, ra: int, rb: int, imm32: int) -> None:
+    base = state.sp + 1
+    if base % 8 != 0:
+        _fault(state, mem, FaultCode.MISALIGNED, "SP is not aligned")
+        return
+    if base < 0 or base + 7 > mem.top:
+        _fault(state, mem, FaultCode.MEM_OOB, "SP is not in range")
+        return
+    state.pc = _pop_frame(state, mem)
+
+
+def _next_pc_ok(pc: int, top: int) -> bool:
+    # Static form of _default_pc_increment's range check.
+    return pc + 8 + 7 <= top
+
+
+def predecode(
+    mem: Memory, pc: int, op: int, rd: int, ra: int, rb: int, imm32: int
+) -> CacheEntry | None:
+    """
+    Return a cache entry for the instruction at `pc` in `mem`, or None if it
+    may fault statically (or is a LOAD8_ABS from a device page, or a
+    breakpoint).
+    """
+    if pc in mem.breakpoints:
+        return None
+    top = mem.top
+    fx: FastHandler | None = None
+    if op == OPC_HALT:
+        if rd == 0 and ra == 0 and rb == 0 and imm32 == 0:
+            fx = _fx_halt
+    elif op == OPC_MOV_RI:
+        if ra == 0 and rb == 0 and rd <= 17 and _next_pc_ok(pc, top):
+            fx = _fx_mov_ri
+    elif op == OPC_MOV_RR:
+        if rb == 0 and imm32 == 0 and rd <= 17 and ra <= 17 and _next_pc_ok(pc, top):
+            fx = _fx_mov_rr
+    elif op in (OPC_ADD, OPC_SUB):
+        if imm32 == 0 and rd <= 15 and ra <= 15 and rb <= 15 and _next_pc_ok(pc, top):
+            fx = _fx_add if op == OPC_ADD else _fx_sub
+    elif op == OPC_CMP:
+        if imm32 == 0 and rd == 0 and ra <= 15 and rb <= 15 and _next_pc_ok(pc, top):
+            fx = _fx_cmp
+    elif op == OPC_LOAD8_ABS:
+        if ra == 0 and rb == 0 and rd <= 15 and 0 <= imm32 <= top and _next_pc_ok(pc, top):
+            # Device reads go through read_u8(); RAM reads stay a plain index.
+            if not mem.page_flags[imm32 >> PAGE_SHIFT] & PF_MMIO:
+                fx = _fx_load8_abs
+    elif op == OPC_STORE8_ABS:
+        if rd == 0 and rb == 0 and ra <= 15 and 0 <= imm32 <= top and _next_pc_ok(pc, top):
+            fx = _fx_store8_abs
+    elif op == OPC_JMP_ABS:
+        if rd == ra == rb == 0 and 0 <= imm32 < top and imm32 % 8 == 0 and imm32 + 7 <= top:
+            fx = _fx_jmp_abs
+    elif op == OPC_JMP_REL:
+        target = pc + imm32
+        if rd == ra == rb == 0 and 0 <= target and target + 7 <= top and target % 8 == 0:
+            fx = _fx_jmp_rel
+    elif op == OPC_JZ_ABS:
+        if rd == ra == rb == 0 and 0 <= imm32 < top and imm32 + 7 <= top and _next_pc_ok(pc, top):
+            fx = _fx_jz_abs
+    elif op == OPC_JZ_REL:
+        target = pc + imm32
+        if rd == ra == rb == 0 and 0 <= target and target + 7 <= top and _next_pc_ok(pc, top):
+            fx = _fx_jz_rel
+    elif op == OPC_PUSH8:
+        if rd == 0 and rb == 0 and imm32 == 0 and ra <= 15 and _next_pc_ok(pc, top):
+            fx = _fx_push8
+    elif op == OPC_POP8:
+        if ra == 0 and rb == 0 and imm32 == 0 and rd <= 15 and _next_pc_ok(pc, top):
+            fx = _fx_pop8
+    elif op == OPC_CALL_ABS:
+        if rd == 0 and ra == 0 and rb == 0 and pc + 15 <= top:
+            fx = _fx_call_abs
+    elif op == OPC_RET:
+        if rd == 0 and ra == 0 and rb == 0 and imm32 == 0 and pc + 15 <= top:
+            fx = _fx_ret
+    if fx is None:
+        return None
+    return (op, rd, ra, rb, imm32, fx)
+
+
+# Superinstructions. A flag-setting ADD/SUB/CMP directly followed by a
+# cacheable JZ_ABS/JZ_REL is cached under a FUSE_* pseudo-opcode carrying
+# the absolute JZ target, so the batched interpreter (emu.runner) can run
+# both in one dispatch. Neither half can fault once predecoded. step()
+# still executes the first instruction alone through `fx`; a jump that
+# lands on the JZ uses the JZ's own entry.
+FUSE_ADD_JZ = 0x100 | OPC_ADD
+FUSE_SUB_JZ = 0x100 | OPC_SUB
+FUSE_CMP_JZ = 0x100 | OPC_CMP
+FUSED_PAIRS = {FUSE_ADD_JZ: "ADD+JZ", FUSE_SUB_JZ: "SUB+JZ", FUSE_CMP_JZ: "CMP+JZ"}
+
+
+def _fuse(mem: Memory, pc: int, entry: CacheEntry) -> CacheEntry:
+    """Return `entry` upgraded to a fused pair if a cacheable JZ follows it."""
+    nxt = pc + 8
+    op, rd, ra, rb, imm32 = decode_at(mem.data, nxt)
+    if op not in (OPC_JZ_ABS, OPC_JZ_REL) or predecode(mem, nxt, op, rd, ra, rb, imm32) is None:
+        return entry
+    # The fused entry depends on both slots; a write to either drops it
+    # (Memory.invalidate_code also clears the slot before the one written).
+    mem.mark_code(nxt)
+    target = imm32 if op == OPC_JZ_ABS else nxt + imm32
+    return (0x100 | entry[0], entry[1], entry[2], entry[3], entry[4], entry[5], target)
+
+
+def step(state: CPUState, mem: Memory) -> None:
+    """Execute exactly one v2 instruction via the opcode dispatch table."""
+    if state.halted:
+        return
+
+    entry = mem.icache.get(state.pc)
+    if entry is not None:
+        entry[5](state, mem, entry[1], entry[2], entry[3], entry[4])
+        return
+
+    _pc_oob_or_misaligned(state, mem)
+    if state.halted:
+        return
+
+    try:
+        op, rd, ra, rb, imm32 = decode_at(mem.data, state.pc)
+    except struct.error:
+        _fault(state, None, FaultCode.PC_OOB, "fetch failed")
+        return
+
+    entry = predecode(mem, state.pc, op, rd, ra, rb, imm32)
+    if entry is not None:
+        if op in (OPC_ADD, OPC_SUB, OPC_CMP):
+            entry = _fuse(mem, state.pc, entry)
+        mem.icache[state.pc] = entry
+        mem.mark_code(state.pc)
+
+    _DISPATCH[op](state, mem, op, rd, ra, rb, imm32)
@@ -0,0 +1,195 @@
+# src/emu/hooks.py
+"""
+Instrumentation hooks.
+
+    hooks = Hooks(on_branch=lambda pc, target: taken.append((pc, target)))
+    run(st, mem, max_steps, hooks=hooks)
+
+Callbacks (all optional; `pc` is the address of the instruction that
+caused the event):
+
+    on_step(state, pc)              after every instruction, including HALT
+                                    and a faulting one (as counted in steps)
+    on_mem_read(pc, addr, size)     LOAD8_ABS, POP8 and the RET frame
+    on_mem_write(pc, addr, size)    STORE8_ABS, PUSH8 and the CALL frame
+    on_branch(pc, target)           taken JZ, and every JMP
+    on_call(pc, target)             CALL_ABS
+    on_ret(pc, target)              RET
+    on_fault(state)                 the instruction faulted (state.fault_info)
+
+Instruction fetches are not reported. Memory events fire after the
+instruction retired, with the addresses it touched.
+
+run() with no callbacks set uses the selected engine untouched, so
+uninstrumented runs pay nothing. Otherwise it runs a step()-based loop
+generated for exactly the set of callbacks registered: a run with only
+on_call compiles no memory, branch or per-step code. Generated loops are
+cached per callback set.
+"""
+from __future__ import annotations
+
+from collections.abc import Callable
+from dataclasses import dataclass, fields
+from typing import Any
+
+from .cpu_state import CPUState
+from .decoder import decode_at
+from .executor_v2 import (
+    OPC_CALL_ABS,
+    OPC_JMP_ABS,
+    OPC_JMP_REL,
+    OPC_JZ_ABS,
+    OPC_JZ_REL,
+    OPC_LOAD8_ABS,
+    OPC_POP8,
+    OPC_PUSH8,
+    OPC_RET,
+    OPC_STORE8_ABS,
+    step,
+)
+from .memory import Memory
+
+StepHook = Callable[[CPUState, int], None]
+MemHook = Callable[[int, int, int], None]  # (pc, addr, size)
+FlowHook = Callable[[int, int], None]  # (pc, target)
+FaultHook = Callable[[CPUState], None]
+
+
+@dataclass(slots=True)
+class Hooks:
+    on_step: StepHook | None = None
+    on_mem_read: MemHook | None = None
+    on_mem_write: MemHook | None = None
+    on_branch: FlowHook | None = None
+    on_call: FlowHook | None = None
+    on_ret: FlowHook | None = None
+    on_fault: FaultHook | None = None
+
+    def active(self) -> tuple[str, ...]:
+        """Names of the callbacks that are set."""
+        return tuple(f.name for f in fields(self) if getattr(self, f.name) is not None)
+
+
+HookedLoop = Callable[[CPUState, Memory, int, Hooks], int]
+
+# Event code emitted after a retired, non-faulting instruction, per hook.
+# `op` is the opcode, `imm` its imm32, `state` already holds the result.
+_EVENTS = {
+    "on_mem_read": (
+        "if op == OPC_LOAD8_ABS:\n"
+        "    on_mem_read(pc, imm, 1)\n"
+        "elif op == OPC_POP8:\n"
+        "    on_mem_read(pc, state.sp, 1)\n"
+        "elif op == OPC_RET:\n"
+        "    on_mem_read(pc, state.sp - 7, 8)\n"
+    ),
+    "on_mem_write": (
+        "if op == OPC_STORE8_ABS:\n"
+        "    on_mem_write(pc, imm, 1)\n"
+        "elif op == OPC_PUSH8:\n"
+        "    on_mem_write(pc, state.sp + 1, 1)\n"
+        "elif op == OPC_CALL_ABS:\n"
+        "    on_mem_write(pc, state.sp + 1, 8)\n"
+    ),
+    "on_branch": (
+        "if op == OPC_JMP_ABS or op == OPC_JMP_REL or (\n"
+        "    (op == OPC_JZ_ABS or op == OPC_JZ_REL) and state.z\n"
+        "):\n"
+        "    on_branch(pc, state.pc)\n"
+    ),
+    "on_call": "if op == OPC_CALL_ABS:\n    on_call(pc, state.pc)\n",
+    "on_ret": "if op == OPC_RET:\n    on_ret(pc, state.pc)\n",
+}
+
+_LOOPS: dict[tuple[tuple[str, ...], bool], HookedLoop] = {}
+
+
+def _indent(text: str, prefix: str) -> str:
+    return "".join(prefix + line + "\n" for line in text.splitlines())
+
+
+def _build(active: tuple[str, ...], breakpoints: bool) -> HookedLoop:
+    events = "".join(_EVENTS[name] for name in active if name in _EVENTS)
+    lines: list[str] = [f"{name} = hooks.{name}" for name in active]
+    lines += [
+        "icache = mem.icache",
+        "data = mem.data",
+        "last = mem.top - 7",
+        "bps = mem.breakpoints",
+        "n = 0",
+        "while n < max_steps and not state.halted:",
+        "    pc = state.pc",
+    ]
+    if breakpoints:
+        lines.append("    if n and pc in bps:\n        break")
+    if events:
+        # Events need the opcode (and imm32) of the instruction; a fused
+        # pair executes, and reports, its first half only.
+        lines += [
+            "    e = icache.get(pc)",
+            "    if e is not None:",
+            "        op = e[0] & 0xFF",
+            "        imm = e[4]",
+            "        e[5](state, mem, e[1], e[2], e[3], imm)",
+            "    else:",
+            "        if 0 <= pc <= last:",
+            "            fields = decode_at(data, pc)",
+            "            op, imm = fields[0], fields[4]",
+            "        else:",
+            "            op = imm = -1  # faults on fetch",
+            "        step(state, mem)",
+        ]
+    else:
+        lines += [
+            "    e = icache.get(pc)",
+            "    if e is not None:",
+            "        e[5](state, mem, e[1], e[2], e[3], e[4])",
+            "    else:",
+            "        step(state, mem)",
+        ]
+    lines.append("    n += 1")
+    if "on_step" in active:
+        lines.append("    on_step(state, pc)")
+    if "on_fault" in active:
+        lines.append(
+            "    if state.halted and state.fault_code is not None:\n        on_fault(state)"
+        )
+    if events:
+        lines.append("    if state.halted:\n        break")
+        lines.append(_indent(events, "    ").rstrip("\n"))
+    lines.append("return n")
+    source = "def _hooked(state, mem, max_steps, hooks):\n" + _indent("\n".join(lines), "    ")
+    namespace: dict[str, Any] = {
+        "decode_at": decode_at,
+        "step": step,
+        "OPC_CALL_ABS": OPC_CALL_ABS,
+        "OPC_JMP_ABS": OPC_JMP_ABS,
+        "OPC_JMP_REL": OPC_JMP_REL,
+        "OPC_JZ_ABS": OPC_JZ_ABS,
+        "OPC_JZ_REL": OPC_JZ_REL,
+        "OPC_LOAD8_ABS": OPC_LOAD8_ABS,
+        "OPC_POP8": OPC_POP8,
+        "OPC_PUSH8": OPC_PUSH8,
+        "OPC_RET": OPC_RET,
+        "OPC_STORE8_ABS": OPC_STORE8_ABS,
+    }
+    exec(compile(source, f"<hooked loop {','.join(active)}>", "exec"), namespace)
+    fn: HookedLoop = namespace["_hooked"]
+    return fn
+
+
+def hooked_loop(hooks: Hooks, mem: Memory) -> HookedLoop:
+    """The (cached) loop specialised for the callbacks set in `hooks`."""
+    key = (hooks.active(), bool(mem.breakpoints))
+    fn = _LOOPS.get(key)
+    if fn is None:
+        fn = _LOOPS[key] = _build(*key)
+    return fn
+
+
+def run_hooked(state: CPUState, mem: Memory, max_steps: int, hooks: Hooks) -> int:
+    """
+    Execute up to `max_steps` instructions with step() semantics, calling
+    the callbacks set in `hooks`. Returns the number of instructions retired.
+    """
+    return hooked_loop(hooks, mem)(state, mem, max_steps, hooks)
@@ -0,0 +1,413 @@
+# src/emu/lockstep.py
+"""
+Lockstep multi-machine engine (optional, needs NumPy).
+
+LockstepBatch holds N independent machines as arrays: an (N, 16) uint64
+register matrix, PC/SP/FP/Z vectors and an (N, MEM_SIZE) uint8 memory
+matrix. step() executes one instruction on every running machine: it
+fetches and decodes all PCs at once, groups the machines by opcode and runs
+each group as a handful of vector operations. Halted and faulted lanes are
+masked out.
+
+Only lanes whose instruction passes every fault check run vectorised. The
+rest (faults, HALT with a bad encoding, out-of-range SP/FP, ...) are
+executed by the reference executor_v2.step(), so fault reporting is
+identical to scalar runs. That step gets a CPUState copy and a Memory over
+the lane's own row of the memory matrix, so no memory is copied. A lane
+whose PC, SP or FP leaves the int64 range this way is detached: it keeps
+running in lockstep through step() on its own CPUState/Memory.
+
+    batch = LockstepBatch(1000)
+    batch.load(0, program)
+    batch.regs[:, 1] = seeds
+    batch.run(10_000)
+    batch.state(7), batch.memory(7)  # scalar views of one machine
+"""
+from __future__ import annotations
+
+from collections.abc import Callable, Sequence
+
+import numpy as np
+import numpy.typing as npt
+
+from .cpu_state import CPUState, HaltReason
+from .executor_v2 import (
+    OPC_ADD,
+    OPC_CALL_ABS,
+    OPC_CMP,
+    OPC_HALT,
+    OPC_JMP_ABS,
+    OPC_JMP_REL,
+    OPC_JZ_ABS,
+    OPC_JZ_REL,
+    OPC_LOAD8_ABS,
+    OPC_MOV_RI,
+    OPC_MOV_RR,
+    OPC_POP8,
+    OPC_PUSH8,
+    OPC_RET,
+    OPC_STORE8_ABS,
+    OPC_SUB,
+    step,
+)
+from .faults import FaultInfo
+from .memory import MEM_SIZE, Memory
+
+# halt_reason codes stored per lane.
+_REASONS = (HaltReason.NONE, HaltReason.NORMAL, HaltReason.FAULT)
+_REASON_CODE = {r: i for i, r in enumerate(_REASONS)}
+
+_I64_MIN = -(1 << 63)
+_I64_MAX = (1 << 63) - 1
+_BYTES8 = np.arange(8, dtype=np.int64)
+
+# Batches only hold MEM_SIZE-byte memories; every bound check uses this.
+_TOP = MEM_SIZE - 1
+
+Lanes = npt.NDArray[np.intp]  # lane indices
+Field = npt.NDArray[np.intp]  # rd/ra/rb per lane
+Imm = npt.NDArray[np.int64]  # sign-extended imm32 per lane
+Mask = npt.NDArray[np.bool_]
+
+# lanes, rd, ra, rb, imm32 -> lanes that must go through step() instead
+VectorOp = Callable[["LockstepBatch", Lanes, Field, Field, Field, Imm], Lanes]
+
+
+class LockstepBatch:
+    """N machines stepped together; see the module docstring."""
+
+    def __init__(self, n: int) -> None:
+        if n <= 0:
+            raise ValueError("need at least one machine")
+        self.n = n
+        # Same reset convention as cpu_state.reset_state().
+        self.regs = np.zeros((n, 16), dtype=np.uint64)
+        self.pc = np.zeros(n, dtype=np.int64)
+        self.sp = np.full(n, 0xFDFF, dtype=np.int64)
+        self.fp = np.full(n, 0xFDFF, dtype=np.int64)
+        self.z = np.zeros(n, dtype=bool)
+        self.halted = np.zeros(n, dtype=bool)
+        self.halt_reason = np.zeros(n, dtype=np.uint8)  # index into _REASONS
+        self.retired = np.zeros(n, dtype=np.int64)  # instructions retired per lane
+        self.mem = np.zeros((n, MEM_SIZE), dtype=np.uint8)
+        self._words = self.mem.view("<u8")  # same buffer, one row of 8-byte words per lane
+        self.fault_info: dict[int, FaultInfo] = {}
+        # Lanes on which step() raised (e.g. IndexError from POP8 past the
+        # top of memory). They are halted so the rest of the batch continues.
+        self.errors: dict[int, Exception] = {}
+        self._detached: dict[int, tuple[CPUState, Memory]] = {}
+
+    @classmethod
+    def from_machines(cls, machines: Sequence[tuple[CPUState, Memory]]) -> LockstepBatch:
+        """Build a batch from scalar (CPUState, Memory) pairs (copied)."""
+        if any(mem.size != MEM_SIZE for _, mem in machines):
+            raise ValueError(f"lockstep batches only support {MEM_SIZE:#x}-byte memories")
+        if any(mem.devices for _, mem in machines):
+            raise ValueError("lockstep batches do not support memory-mapped devices")
+        batch = cls(len(machines))
+        for lane, (st, mem) in enumerate(machines):
+            batch._store(lane, st, mem)
+        return batch
+
+    def load(self, addr: int, blob: bytes) -> None:
+        """Write `blob` at `addr` into every machine's memory."""
+        if addr < 0 or addr + len(blob) > MEM_SIZE:
+            raise ValueError("blob does not fit in memory")
+        self.mem[:, addr:addr + len(blob)] = np.frombuffer(blob, dtype=np.uint8)
+
+    # -- scalar views ------------------------------------------------------
+
+    def state(self, lane: int) -> CPUState:
+        """CPUState of one machine (a copy)."""
+        if lane in self._detached:
+            src = self._detached[lane][0]
+            st = CPUState(
+                regs=list(src.regs), pc=src.pc, sp=src.sp, fp=src.fp, z=src.z,
+                halted=src.halted, halt_reason=src.halt_reason,
+            )
+            st.fault_info = src.fault_info
+            return st
+        st = CPUState(
+            regs=[int(v) for v in self.regs[lane]],
+            pc=int(self.pc[lane]),
+            sp=int(self.sp[lane]),
+            fp=int(self.fp[lane]),
+            z=bool(self.z[lane]),
+            halted=bool(self.halted[lane]) and lane not in self.errors,
+            halt_reason=_REASONS[self.halt_reason[lane]],
+        )
+        st.fault_info = self.fault_info.get(lane)
+        return st
+
+    def memory(self, lane: int) -> Memory:
+        """Memory of one machine (a copy)."""
+        if lane in self._detached:
+            return Memory(bytearray(self._detached[lane][1].data))
+        return Memory(bytearray(self.mem[lane].tobytes()))
+
+    # -- execution ---------------------------------------------------------
+
+    def run(self, max_steps: int) -> int:
+        """Step until every machine has stopped or `max_steps` cycles ran."""
+        cycles = 0
+        while cycles < max_steps and self.step():
+            cycles += 1
+        return cycles
+
+    def step(self) -> int:
+        """Execute one instruction on every running machine; returns how many ran."""
+        running = ~self.halted
+        ran = int(running.sum())
+        if not ran:
+            return 0
+        self.retired[running] += 1
+
+        for lane, (st, mem) in self._detached.items():
+            if not self.halted[lane]:
+                self._scalar_step(lane, st, mem)
+
+        lanes = np.flatnonzero(running)
+        if self._detached:
+            lanes = lanes[[lane not in self._detached for lane in lanes]]
+        pc = self.pc[lanes]
+        fetch_ok = (pc >= 0) & (pc + 7 <= _TOP) & (pc % 8 == 0)
+        slow: list[np.ndarray] = [lanes[~fetch_ok]]
+        lanes, pc = lanes[fetch_ok], pc[fetch_ok]
+
+        # PCs are 8-aligned here, so each instruction is one little-endian
+        # word: a single gather per lane instead of eight.
+        word = self._words[lanes, pc >> 3]
+        op = (word & 0xFF).astype(np.uint8)
+        rd = ((word >> 8) & 0xFF).astype(np.intp)
+        ra = ((word >> 16) & 0xFF).astype(np.intp)
+        rb = ((word >> 24) & 0xFF).astype(np.intp)
+        imm = (word >> 32).astype(np.uint32).view(np.int32).astype(np.int64)
+
+        for opc in np.flatnonzero(np.bincount(op, minlength=256)).tolist():
+            sel = op == opc
+            vop = _VECTOR_OPS.get(opc)
+            if vop is None:
+                slow.append(lanes[sel])  # reserved opcode: step() faults it
+            else:
+                slow.append(vop(self, lanes[sel], rd[sel], ra[sel], rb[sel], imm[sel]))
+
+        for lane in np.concatenate(slow).tolist():
+            self._scalar_step(lane, self.state(lane), self._lane_memory(lane))
+        return ran
+
+    def _lane_memory(self, lane: int) -> Memory:
+        # A view of the lane's row, not a copy: step() works on it in place.
+        return Memory(memoryview(self.mem[lane]))  # type: ignore[arg-type]
+
+    def _scalar_step(self, lane: int, st: CPUState, mem: Memory) -> None:
+        # Reference path for one lane.
+        try:
+            step(st, mem)
+        except Exception as exc:  # the scalar executor would raise to its caller
+            self.errors[lane] = exc
+            self.halted[lane] = True
+        if lane in self._detached:
+            self.halted[lane] = self.halted[lane] or st.halted
+            return
+        if all(_I64_MIN <= v <= _I64_MAX for v in (st.pc, st.sp, st.fp)):
+            self._store(lane, st)  # `mem` already is the lane's row
+        else:
+            self._detached[lane] = (st, mem)
+            self.halted[lane] = self.halted[lane] or st.halted
+
+    def _store(self, lane: int, st: CPUState, mem: Memory | None = None) -> None:
+        self.regs[lane] = st.regs
+        self.pc[lane], self.sp[lane], self.fp[lane] = st.pc, st.sp, st.fp
+        self.z[lane] = st.z
+        self.halted[lane] = st.halted or lane in self.errors
+        self.halt_reason[lane] = _REASON_CODE[st.halt_reason]
+        if st.fault_info is not None:
+            self.fault_info[lane] = st.fault_info
+        if mem is not None:
+            self.mem[lane] = np.frombuffer(mem.data, dtype=np.uint8)
+
+    # -- vector handlers ----------------------------------------------------
+    # Each takes the lanes executing one opcode plus their decoded fields,
+    # applies the instruction to the lanes whose checks all pass (the same
+    # static checks as executor_v2.predecode plus the run-time SP checks)
+    # and returns the remaining lanes for the scalar path.
+
+    def _next_pc_ok(self, lanes: Lanes) -> Mask:
+        return self.pc[lanes] + 15 <= _TOP
+
+    def _v_halt(self, lanes: Lanes, rd: Field, ra: Field, rb: Field, imm: Imm) -> Lanes:
+        ok: Mask = (rd == 0) & (ra == 0) & (rb == 0) & (imm == 0)
+        done = lanes[ok]
+        self.halted[done] = True
+        self.halt_reason[done] = _REASON_CODE[HaltReason.NORMAL]
+        return lanes[~ok]
+
+    def _v_mov_ri(self, lanes: Lanes, rd: Field, ra: Field, rb: Field, imm: Imm) -> Lanes:
+        enc = (ra == 0) & (rb == 0) & self._next_pc_ok(lanes)
+        ok: Mask = enc & (rd < 16)
+        live = lanes[ok]
+        self.regs[live, rd[ok]] = imm[ok].astype(np.uint64)
+        self.pc[live] += 8
+        # SP/FP only when the target is in range and the value fits int64.
+        for sel, vec in ((16, self.sp), (17, self.fp)):
+            ok_sel = enc & (rd == sel) & (imm >= 0)
+            ok_sel[ok_sel] = (vec[lanes[ok_sel]] >= 0) & (vec[lanes[ok_sel]] <= _TOP)
+            live = lanes[ok_sel]
+            vec[live] = imm[ok_sel]
+            self.pc[live] += 8
+            ok |= ok_sel
+        return lanes[~ok]
+
+    def _v_mov_rr(self, lanes: Lanes, rd: Field, ra: Field, rb: Field, imm: Imm) -> Lanes:
+        ok: Mask = (rb == 0) & (imm == 0) & (rd <= 17) & (ra <= 17) & self._next_pc_ok(lanes)
+        val = self.regs[lanes, np.minimum(ra, 15)]
+        for sel, vec in ((16, self.sp), (17, self.fp)):
+            # SP/FP as source or target must be in range, as in executor_v2.
+            uses = (rd == sel) | (ra == sel)
+            if uses.any():
+                cur = vec[lanes]
+                ok &= ~uses | ((cur >= 0) & (cur <= _TOP))
+                val = np.where(ra == sel, cur.astype(np.uint64), val)
+        # A register moved into SP/FP must fit int64.
+        ok &= (rd < 16) | (val <= np.uint64(_I64_MAX))
+        gpr = ok & (rd < 16)
+        self.regs[lanes[gpr], rd[gpr]] = val[gpr]
+        for sel, vec in ((16, self.sp), (17, self.fp)):
+            to_sel = ok & (rd == sel)
+            vec[lanes[to_sel]] = val[to_sel].astype(np.int64)
+        self.pc[lanes[ok]] += 8
+        return lanes[~ok]
+
+    def _v_alu(
+        self, lanes: Lanes, rd: Field, ra: Field, rb: Field, imm: Imm, sub: bool, write: bool
+    ) -> Lanes:
+        ok: Mask = (imm == 0) & (ra < 16) & (rb < 16) & self._next_pc_ok(lanes)
+        ok &= (rd < 16) if write else (rd == 0)
+        live = lanes[ok]
+        a, b = self.regs[live, ra[ok]], self.regs[live, rb[ok]]
+        t = a - b if sub else a + b  # uint64 arithmetic wraps like `& MASK64`
+        if write:
+            self.regs[live, rd[ok]] = t
+        self.z[live] = t == 0
+        self.pc[live] += 8
+        return lanes[~ok]
+
+    def _v_add(self, lanes: Lanes, rd: Field, ra: Field, rb: Field, imm: Imm) -> Lanes:
+        return self._v_alu(lanes, rd, ra, rb, imm, sub=False, write=True)
+
+    def _v_sub(self, lanes: Lanes, rd: Field, ra: Field, rb: Field, imm: Imm) -> Lanes:
+        return self._v_alu(lanes, rd, ra, rb, imm, sub=True, write=True)
+
+    def _v_cmp(self, lanes: Lanes, rd: Field, ra: Field, rb: Field, imm: Imm) -> Lanes:
+        return self._v_alu(lanes, rd, ra, rb, imm, sub=True, write=False)
+
+    def _v_load8_abs(self, lanes: Lanes, rd: Field, ra: Field, rb: Field, imm: Imm) -> Lanes:
+        ok: Mask = (ra == 0) & (rb == 0) & (rd < 16) & (imm >= 0) & (imm <= _TOP)
+        ok &= self._next_pc_ok(lanes)
+        live = lanes[ok]
+        self.regs[live, rd[ok]] = self.mem[live, imm[ok]]
+        self.pc[live] += 8
+        return lanes[~ok]
+
+    def _v_store8_abs(self, lanes: Lanes, rd: Field, ra: Field, rb: Field, imm: Imm) -> Lanes:
+        ok: Mask = (rd == 0) & (rb == 0) & (ra < 16) & (imm >= 0) & (imm <= _TOP)
+        ok &= self._next_pc_ok(lanes)
+        live = lanes[ok]
+        self.mem[live, imm[ok]] = (self.regs[live, ra[ok]] & 0xFF).astype(np.uint8)
+        self.pc[live] += 8
+        return lanes[~ok]
+
+    def _v_jump(
+        self, lanes: Lanes, rd: Field, ra: Field, rb: Field, imm: Imm, rel: bool, cond: bool
+    ) -> Lanes:
+        pc = self.pc[lanes]
+        target = pc + imm if rel else imm
+        ok: Mask = (rd == 0) & (ra == 0) & (rb == 0) & (target >= 0) & (target + 7 <= _TOP)
+        if not rel:
+            ok &= target < _TOP
+        if cond:
+            ok &= pc + 15 <= _TOP  # JZ does not check target alignment
+            live = lanes[ok]
+            self.pc[live] = np.where(self.z[live], target[ok], pc[ok] + 8)
+        else:
+            ok &= target % 8 == 0
+            self.pc[lanes[ok]] = target[ok]
+        return lanes[~ok]
+
+    def _v_jmp_abs(self, lanes: Lanes, rd: Field, ra: Field, rb: Field, imm: Imm) -> Lanes:
+        return self._v_jump(lanes, rd, ra, rb, imm, rel=False, cond=False)
+
+    def _v_jmp_rel(self, lanes: Lanes, rd: Field, ra: Field, rb: Field, imm: Imm) -> Lanes:
+        return self._v_jump(lanes, rd, ra, rb, imm, rel=True, cond=False)
+
+    def _v_jz_abs(self, lanes: Lanes, rd: Field, ra: Field, rb: Field, imm: Imm) -> Lanes:
+        return self._v_jump(lanes, rd, ra, rb, imm, rel=False, cond=True)
+
+    def _v_jz_rel(self, lanes: Lanes, rd: Field, ra: Field, rb: Field, imm: Imm) -> Lanes:
+        return self._v_jump(lanes, rd, ra, rb, imm, rel=True, cond=True)
+
+    def _v_push8(self, lanes: Lanes, rd: Field, ra: Field, rb: Field, imm: Imm) -> Lanes:
+        sp = self.sp[lanes]
+        ok: Mask = (rd == 0) & (rb == 0) & (imm == 0) & (ra < 16) & self._next_pc_ok(lanes)
+        ok &= (sp > 0) & (sp <= _TOP)
+        live = lanes[ok]
+        self.mem[live, sp[ok]] = (self.regs[live, ra[ok]] & 0xFF).astype(np.uint8)
+        self.sp[live] -= 1
+        self.pc[live] += 8
+        return lanes[~ok]
+
+    def _v_pop8(self, lanes: Lanes, rd: Field, ra: Field, rb: Field, imm: Imm) -> Lanes:
+        sp = self.sp[lanes]
+        ok: Mask = (ra == 0) & (rb == 0) & (imm == 0) & (rd < 16) & self._next_pc_ok(lanes)
+        ok &= (sp >= -1) & (sp < _TOP)
+        live = lanes[ok]
+        self.regs[live, rd[ok]] = self.mem[live, sp[ok] + 1]
+        self.sp[live] += 1
+        self.pc[live] += 8
+        return lanes[~ok]
+
+    def _v_call_abs(self, lanes: Lanes, rd: Field, ra: Field, rb: Field, imm: Imm) -> Lanes:
+        sp = self.sp[lanes]
+        ok: Mask = (rd == 0) & (ra == 0) & (rb == 0) & (self.pc[lanes] + 15 <= _TOP)
+        ok &= ((sp - 7) % 8 == 0) & (sp >= 7) & (sp <= _TOP)
+        live = lanes[ok]
+        # Return PC big-endian at SP-7..SP, least significant byte at SP.
+        frame = (self.pc[live] + 8).astype(">u8").view(np.uint8).reshape(-1, 8)
+        self.mem[live[:, None], (sp[ok] - 7)[:, None] + _BYTES8] = frame
+        self.sp[live] -= 8
+        self.pc[live] = imm[ok] & _TOP
+        return lanes[~ok]
+
+    def _v_ret(self, lanes: Lanes, rd: Field, ra: Field, rb: Field, imm: Imm) -> Lanes:
+        sp = self.sp[lanes]
+        ok: Mask = (rd == 0) & (ra == 0) & (rb == 0) & (imm == 0) & (self.pc[lanes] + 15 <= _TOP)
+        ok &= ((sp + 1) % 8 == 0) & (sp >= -1) & (sp <= _TOP - 8)
+        frame = self.mem[lanes[ok][:, None], (sp[ok] + 1)[:, None] + _BYTES8]
+        ret = frame.copy().view(">u8")[:, 0]
+        # A return PC that does not fit int64 goes through step() (and detaches).
+        fits = ret <= _I64_MAX
+        ok[ok] = fits
+        live = lanes[ok]
+        self.pc[live] = ret[fits].astype(np.int64)
+        self.sp[live] += 8
+        return lanes[~ok]
+
+
+_VECTOR_OPS: dict[int, VectorOp] = {
+    OPC_HALT: LockstepBatch._v_halt,
+    OPC_MOV_RI: LockstepBatch._v_mov_ri,
+    OPC_MOV_RR: LockstepBatch._v_mov_rr,
+    OPC_ADD: LockstepBatch._v_add,
+    OPC_SUB: LockstepBatch._v_sub,
+    OPC_CMP: LockstepBatch._v_cmp,
+    OPC_LOAD8_ABS: LockstepBatch._v_load8_abs,
+    OPC_STORE8_ABS: LockstepBatch._v_store8_abs,
+    OPC_JMP_ABS: LockstepBatch._v_jmp_abs,
+    OPC_JMP_REL: LockstepBatch._v_jmp_rel,
+    OPC_JZ_ABS: LockstepBatch._v_jz_abs,
+    OPC_JZ_REL: LockstepBatch._v_jz_rel,
+    OPC_PUSH8: LockstepBatch._v_push8,
+    OPC_POP8: LockstepBatch._v_pop8,
+    OPC_CALL_ABS: LockstepBatch._v_call_abs,
+    OPC_RET: LockstepBatch._v_ret,
+}
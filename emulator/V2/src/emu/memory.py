@@ -1,39 +1,454 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import hashlib
+import mmap
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
 
-MEM_SIZE = 65536  # 0x0000..0xFFFF
+MEM_SIZE = 65536  # default address space, 0x0000..0xFFFF
+# Largest address space (use PagedMemory for large ones). imm32 is signed,
+# so LOAD8_ABS/STORE8_ABS/JMP_ABS/JZ_ABS/CALL_ABS reach at most 0x7FFFFFFF
+# and the upper half of a larger space could not be addressed directly.
+MAX_MEM_SIZE = 1 << 31
+
+# Memory is tracked in pages. A non-zero page flag means a write to that
+# page has bookkeeping to do (see write_barrier()); RAM writes to unflagged
+# pages are a plain bytearray store.
+PAGE_SHIFT = 8
+PAGE_SIZE = 1 << PAGE_SHIFT
+NUM_PAGES = MEM_SIZE >> PAGE_SHIFT  # pages in the default address space
+PF_CODE = 0x01  # page holds predecoded instructions or translated blocks
+PF_TRACK = 0x02  # page is unchanged since the last capture_pages(); clear on first write
+PF_ZERO = 0x04  # PagedMemory page never written (reads as zero); clear on first write
+PF_MMIO = 0x08  # page overlaps a device region (map_device()); fixed until unmapped
+
+Pages = tuple[bytes, ...]  # immutable page images, one PAGE_SIZE entry per page
+ZERO_PAGE = bytes(PAGE_SIZE)  # shared image of every all-zero page
+_SET_TRACK = bytes(f | PF_TRACK for f in range(256))  # bytes.translate() table
+
+
+def check_size(size: int) -> int:
+    """Validate an address-space size: a power of two in [MEM_SIZE, MAX_MEM_SIZE]."""
+    if size < MEM_SIZE or size > MAX_MEM_SIZE or size & (size - 1):
+        raise ValueError(
+            f"memory size must be a power of two between {MEM_SIZE:#x} and {MAX_MEM_SIZE:#x}, "
+            f"got {size:#x}"
+        )
+    return size
+
+
+DeviceRead = Callable[[int], int]  # offset into the region -> byte
+# (offset into the region, byte) -> truthy if the device may have changed
+# memory or machine state (e.g. DMA), which ends the current translated block.
+DeviceWrite = Callable[[int, int], bool | None]
+
+
+@dataclass(slots=True)
+class MMIORegion:
+    start: int
+    end: int  # exclusive
+    read: DeviceRead | None = None  # None: reads return the last byte written
+    write: DeviceWrite | None = None  # None: writes are only stored
+    name: str = ""
+    flush: Callable[[], None] | None = None  # called by flush_devices()
 
 
 @dataclass(slots=True)
 class Memory:
+    # The address space is [0, len(data)); every bounds check in the engines
+    # is derived from `size`/`top`, which are fixed at construction.
     data: bytearray
+    # Predecoded instructions keyed by (8-byte aligned) PC, filled by the
+    # executor. Every write through write_u8()/load() drops the entry of the
+    # slot it touches; writing to `data` directly bypasses that invalidation.
+    icache: dict[int, tuple[Any, ...]] = field(default_factory=dict, repr=False, compare=False)
+    # Translated basic blocks (emu.translator) keyed by entry PC.
+    blocks: dict[int, Any] = field(default_factory=dict, repr=False, compare=False)
+    page_flags: bytearray = field(default_factory=bytearray, repr=False, compare=False)
+    _page_blocks: dict[int, list[tuple[int, int, int]]] = field(
+        default_factory=dict, repr=False, compare=False
+    )
+    # Page images this memory last matched (capture_pages()/restore_pages())
+    # and the pages written since then.
+    _base: Pages | None = field(default=None, repr=False, compare=False)
+    _dirty: set[int] = field(default_factory=set, repr=False, compare=False)
+    # Mapped device regions, and the regions overlapping each PF_MMIO page.
+    devices: list[MMIORegion] = field(default_factory=list, repr=False, compare=False)
+    _page_devices: dict[int, list[MMIORegion]] = field(
+        default_factory=dict, repr=False, compare=False
+    )
+    # PCs the engines stop in front of (set_breakpoint()).
+    breakpoints: set[int] = field(default_factory=set, repr=False, compare=False)
+    size: int = field(init=False, repr=False, compare=False)
+    # Last address; also the CALL target mask.
+    top: int = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self.size = check_size(len(self.data))
+        self.top = self.size - 1
+        if not self.page_flags:
+            self.page_flags = bytearray(self.size >> PAGE_SHIFT)
 
     @classmethod
-    def blank(cls) -> "Memory":
-        return cls(bytearray(MEM_SIZE))
+    def blank(cls, size: int = MEM_SIZE) -> Memory:
+        return cls(bytearray(check_size(size)))
+
+    @property
+    def num_pages(self) -> int:
+        return len(self.page_flags)
 
     def load(self, addr: int, blob: bytes) -> None:
-        if addr < 0 or addr >= MEM_SIZE:
+        if addr < 0 or addr >= self.size:
             raise ValueError("address out of range")
         end = addr + len(blob)
-        if end > MEM_SIZE:
+        if end > self.size:
             raise ValueError("blob does not fit in memory")
         self.data[addr:end] = blob
+        if blob and any(self.page_flags[addr >> PAGE_SHIFT:((end - 1) >> PAGE_SHIFT) + 1]):
+            self.write_barrier(addr, len(blob))
 
     def read_u8(self, addr: int) -> int:
-        if addr < 0 or addr >= MEM_SIZE:
+        if addr < 0 or addr >= self.size:
             raise IndexError("MEM_OOB")
+        if self.page_flags[addr >> PAGE_SHIFT] & PF_MMIO:
+            return self.device_read(addr)
         return self.data[addr]
 
     def write_u8(self, addr: int, val: int) -> None:
-        if addr < 0 or addr >= MEM_SIZE:
+        if addr < 0 or addr >= self.size:
             raise IndexError("MEM_OOB")
         self.data[addr] = val & 0xFF
+        if self.page_flags[addr >> PAGE_SHIFT]:
+            self.write_barrier(addr)
 
     def read_slice(self, addr: int, size: int) -> bytes:
         if size < 0:
             raise ValueError("size must be >= 0")
-        if addr < 0 or addr + size - 1 >= MEM_SIZE:
+        if addr < 0 or addr + size - 1 >= self.size:
             raise IndexError("MEM_OOB")
-        return bytes(self.data[addr:addr + size])
+        # Slice a view, not the bytearray, so the bytes are copied only once.
+        # Raw RAM: device regions show the last bytes written, not read().
+        return bytes(memoryview(self.data)[addr:addr + size])
+
+    def map_device(
+        self,
+        start: int,
+        size: int,
+        read: DeviceRead | None = None,
+        write: DeviceWrite | None = None,
+        name: str = "",
+        flush: Callable[[], None] | None = None,
+    ) -> MMIORegion:
+        """
+        Route guest accesses to [start, start+size) to a device. Writes are
+        stored to RAM as usual and then passed to `write` by the write
+        barrier, so every engine reaches devices through the page flags it
+        already checks; data reads of the region call `read`. Instruction
+        fetch always reads RAM.
+        """
+        end = start + size
+        if size <= 0 or start < 0 or end > self.size:
+            raise ValueError("device region out of range")
+        for other in self.devices:
+            if start < other.end and other.start < end:
+                raise ValueError(f"device region overlaps {other.name or hex(other.start)}")
+        region = MMIORegion(start, end, read, write, name, flush)
+        self.devices.append(region)
+        for page in range(start >> PAGE_SHIFT, ((end - 1) >> PAGE_SHIFT) + 1):
+            self._page_devices.setdefault(page, []).append(region)
+            self.page_flags[page] |= PF_MMIO
+        self._flush_code()
+        return region
+
+    def unmap_device(self, region: MMIORegion) -> None:
+        self.devices.remove(region)
+        for page in range(region.start >> PAGE_SHIFT, ((region.end - 1) >> PAGE_SHIFT) + 1):
+            regions = self._page_devices[page]
+            regions.remove(region)
+            if not regions:
+                del self._page_devices[page]
+                self.page_flags[page] &= ~PF_MMIO
+        self._flush_code()
+
+    def set_breakpoint(self, pc: int) -> None:
+        """
+        Make run()/run_traced() stop before executing the instruction at `pc`
+        (unless it is the first instruction of that call, so a run can be
+        resumed from a breakpoint). Breakpoint PCs are never predecoded or
+        translated, so only the engines' slow paths look them up.
+        """
+        self.breakpoints.add(pc)
+        self.invalidate_code(pc, 8)
+
+    def clear_breakpoint(self, pc: int) -> None:
+        self.breakpoints.discard(pc)
+
+    def flush_devices(self) -> None:
+        """Flush buffered device output (runner.run() calls this on HALT/fault)."""
+        for region in self.devices:
+            if region.flush is not None:
+                region.flush()
+
+    def device_at(self, addr: int) -> MMIORegion | None:
+        """The device region containing `addr`, or None."""
+        for region in self._page_devices.get(addr >> PAGE_SHIFT, ()):
+            if region.start <= addr < region.end:
+                return region
+        return None
+
+    def device_read(self, addr: int) -> int:
+        """Read `addr` on a PF_MMIO page: from its device, or RAM outside any region."""
+        region = self.device_at(addr)
+        if region is not None and region.read is not None:
+            return region.read(addr - region.start) & 0xFF
+        return self.data[addr]
+
+    def _flush_code(self) -> None:
+        # Cached code may have been predecoded against the old device map
+        # (static LOAD8_ABS addresses); drop all of it.
+        self.icache.clear()
+        self.blocks.clear()
+        self._page_blocks.clear()
+
+    def mark_code(self, addr: int) -> None:
+        """Flag the page holding `addr` so writes to it invalidate cached code."""
+        self.page_flags[addr >> PAGE_SHIFT] |= PF_CODE
+
+    def register_block(self, pc: int, spans: list[tuple[int, int]], block: Any) -> None:
+        """Cache a translated block entered at `pc` covering the [start, end) spans."""
+        self.blocks[pc] = block
+        for start, end in spans:
+            for page in range(start >> PAGE_SHIFT, ((end - 1) >> PAGE_SHIFT) + 1):
+                self._page_blocks.setdefault(page, []).append((pc, start, end))
+                self.page_flags[page] |= PF_CODE
+
+    def write_barrier(self, addr: int, size: int = 1) -> bool:
+        """
+        Bookkeeping for a write to [addr, addr+size) that touches a flagged
+        page; every path that stores into `data` calls this when the page
+        flag is non-zero. Returns True if a translated block was dropped or
+        a device write handler reported a side effect (either may change
+        what runs next).
+        """
+        flags = self.page_flags
+        first, last = addr >> PAGE_SHIFT, (addr + size - 1) >> PAGE_SHIFT
+        seen = 0  # union of the flags of all pages written
+        for page in range(first, last + 1):
+            f = flags[page]
+            seen |= f
+            if f & PF_TRACK:
+                self._dirty.add(page)
+                flags[page] = f & ~PF_TRACK
+        effect = self._device_write(addr, addr + size) if seen & PF_MMIO else False
+        if seen & PF_CODE:
+            effect = self.invalidate_code(addr, size) or effect
+        return effect
+
+    def _device_write(self, addr: int, end: int) -> bool:
+        effect = False
+        if end - addr == 1:  # single-byte stores: the common case
+            region = self.device_at(addr)
+            if region is not None and region.write is not None:
+                effect = bool(region.write(addr - region.start, self.data[addr]))
+            return effect
+        seen: list[MMIORegion] = []
+        for page in range(addr >> PAGE_SHIFT, ((end - 1) >> PAGE_SHIFT) + 1):
+            for region in self._page_devices.get(page, ()):
+                if region in seen or not (region.start < end and addr < region.end):
+                    continue
+                seen.append(region)
+                if region.write is not None:
+                    for a in range(max(addr, region.start), min(end, region.end)):
+                        effect = bool(region.write(a - region.start, self.data[a])) or effect
+        return effect
+
+    def capture_pages(self) -> Pages:
+        """
+        Return immutable images of all pages. Pages not written since the
+        previous capture_pages()/restore_pages() reuse that call's images, so
+        only dirty pages are copied.
+        """
+        view = memoryview(self.data)
+        if self._base is None:
+            pages = self._images()
+            self._track(None)
+        else:
+            out = list(self._base)
+            for page in self._dirty:
+                out[page] = bytes(view[page << PAGE_SHIFT:(page + 1) << PAGE_SHIFT])
+            pages = tuple(out)
+            self._track(self._dirty)
+        self._base = pages
+        self._dirty = set()
+        return pages
+
+    def restore_pages(self, pages: Pages) -> None:
+        """Make memory equal to `pages`, rewriting only pages that differ."""
+        if len(pages) != self.num_pages:
+            raise ValueError("page images do not match this memory's size")
+        base = self._base
+        if base is None:
+            changed: Any = range(self.num_pages)
+        elif base is pages:
+            changed = self._dirty
+        else:
+            changed = self._dirty | {i for i in range(self.num_pages) if base[i] is not pages[i]}
+        for page in changed:
+            self._put_page(page, pages[page])
+        self._track(None if base is None else self._dirty)
+        self._base = pages
+        self._dirty = set()
+
+    @classmethod
+    def from_pages(cls, pages: Pages) -> Memory:
+        """A new Memory holding `pages`, tracking writes relative to them."""
+        mem = cls(bytearray(b"".join(pages)))
+        mem._track(None)
+        mem._base = pages
+        return mem
+
+    def _images(self) -> Pages:
+        view = memoryview(self.data)
+        return tuple(bytes(view[i:i + PAGE_SIZE]) for i in range(0, self.size, PAGE_SIZE))
+
+    def _put_page(self, page: int, image: bytes) -> None:
+        start = page << PAGE_SHIFT
+        self.data[start:start + PAGE_SIZE] = image
+        if self.page_flags[page] & PF_CODE:
+            self.invalidate_code(start, PAGE_SIZE)
+
+    def _track(self, pages: Any) -> None:
+        # pages=None tracks every page.
+        flags = self.page_flags
+        if pages is None:
+            flags[:] = flags.translate(_SET_TRACK)
+            return
+        for page in pages:
+            flags[page] |= PF_TRACK
+
+    def invalidate_code(self, addr: int, size: int = 1) -> bool:
+        """
+        Drop cached code overlapping [addr, addr+size).
+        Predecoded entries are dropped per 8-byte slot (plus the slot before,
+        which may hold a fused pair reaching into it); translated blocks are
+        found through the pages the write touches. Returns True if a
+        translated block was dropped.
+        """
+        end = addr + size
+        if self.icache:
+            for slot in range((addr & ~7) - 8, end, 8):
+                self.icache.pop(slot, None)
+        dropped = False
+        for page in range(addr >> PAGE_SHIFT, ((end - 1) >> PAGE_SHIFT) + 1):
+            spans = self._page_blocks.get(page)
+            if not spans:
+                continue
+            keep = []
+            for span in spans:
+                if span[1] < end and addr < span[2]:
+                    self.blocks.pop(span[0], None)
+                    dropped = True
+                else:
+                    keep.append(span)
+            self._page_blocks[page] = keep
+        return dropped
+
+
+@dataclass(slots=True, eq=False)
+class PagedMemory(Memory):
+    """
+    Sparse Memory: `data` is an anonymous mmap, so the OS backs a page with
+    RAM only once it is first written and untouched pages read as zero. A
+    machine costs roughly the pages it touches instead of its full size
+    (plus one page-flag byte per PAGE_SIZE), which is what makes address
+    spaces of up to MAX_MEM_SIZE practical. The pages written so far
+    (dirty_pages()) bound hashing, diffing and snapshotting. The API and
+    every engine are the same as for Memory.
+    """
+
+    # Pages written since creation; every other page is all zero.
+    _written: set[int] = field(default_factory=set, repr=False, compare=False)
+
+    @classmethod
+    def blank(cls, size: int = MEM_SIZE) -> PagedMemory:
+        flags = mmap.MAP_PRIVATE | mmap.MAP_ANONYMOUS | getattr(mmap, "MAP_NORESERVE", 0)
+        mem = cls(mmap.mmap(-1, check_size(size), flags=flags))  # type: ignore[arg-type]
+        mem.page_flags[:] = bytes([PF_ZERO]) * mem.num_pages
+        return mem
+
+    @classmethod
+    def from_pages(cls, pages: Pages) -> PagedMemory:
+        """A new PagedMemory holding `pages`; all-zero pages stay unallocated."""
+        mem = cls.blank(len(pages) << PAGE_SHIFT)
+        for page, image in enumerate(pages):
+            if image is not ZERO_PAGE:
+                mem._put_page(page, image)
+        mem._track(None)
+        mem._base = pages
+        return mem
+
+    def write_barrier(self, addr: int, size: int = 1) -> bool:
+        flags = self.page_flags
+        for page in range(addr >> PAGE_SHIFT, ((addr + size - 1) >> PAGE_SHIFT) + 1):
+            if flags[page] & PF_ZERO:
+                flags[page] &= ~PF_ZERO
+                self._written.add(page)
+        return Memory.write_barrier(self, addr, size)
+
+    def _put_page(self, page: int, image: bytes) -> None:
+        f = self.page_flags[page]
+        if f & PF_ZERO:
+            if image == ZERO_PAGE:
+                return
+            self.page_flags[page] = f & ~PF_ZERO
+            self._written.add(page)
+        Memory._put_page(self, page, image)
+
+    def _images(self) -> Pages:
+        view = memoryview(self.data)
+        out = [ZERO_PAGE] * self.num_pages
+        for page in self._written:
+            out[page] = bytes(view[page << PAGE_SHIFT:(page + 1) << PAGE_SHIFT])
+        return tuple(out)
+
+    def dirty_pages(self) -> list[int]:
+        """Indices of the pages written since creation, ascending."""
+        return sorted(self._written)
+
+    def digest(self) -> str:
+        """blake2b-128 of the memory contents, hashing only written pages."""
+        h = hashlib.blake2b(digest_size=16)
+        view = memoryview(self.data)
+        for page in self.dirty_pages():
+            image = view[page << PAGE_SHIFT:(page + 1) << PAGE_SHIFT]
+            if image != ZERO_PAGE:
+                h.update(page.to_bytes(4, "little"))
+                h.update(image)
+        return h.hexdigest()
+
+    def diff(self, other: Memory) -> list[int]:
+        """Indices of the pages whose contents differ from `other`, ascending."""
+        if other.size != self.size:
+            raise ValueError("memories differ in size")
+        if isinstance(other, PagedMemory):
+            candidates: Any = sorted(self._written | other._written)
+        else:
+            candidates = range(self.num_pages)
+        a, b = memoryview(self.data), memoryview(other.data)
+        out = []
+        for page in candidates:
+            lo, hi = page << PAGE_SHIFT, (page + 1) << PAGE_SHIFT
+            if a[lo:hi] != b[lo:hi]:
+                out.append(page)
+        return out
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Memory):
+            return NotImplemented
+        return self.size == other.size and not self.diff(other)
+
+
+def new_memory(size: int = MEM_SIZE) -> Memory:
+    """Blank memory of `size` bytes: a flat Memory by default, PagedMemory above it."""
+    return Memory.blank() if size == MEM_SIZE else PagedMemory.blank(size)
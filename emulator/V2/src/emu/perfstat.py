@@ -0,0 +1,194 @@
+# src/emu/perfstat.py
+"""
+Cycle cost model and `perf stat`-style run summary.
+
+    prof = Profile.for_memory(mem)
+    run_profiled(st, mem, max_steps, prof)
+    print(format_perf(perf_stat(prof, CycleModel())))
+
+The counters come from a profiled run (emu.profile): per opcode, how often
+it retired and how often it transferred control, as executed. Everything
+below follows from those without any extra work in the run.
+Host time and MIPS are those of the profiled run unless `seconds` gives the
+time of a plain run of the same program (`emu_cli run --perf` times one on
+the selected engine and takes the counters from a profiled replay).
+
+Estimated cycles per retired instruction:
+
+    opcodes[op]                        base cost (DEFAULT_CYCLES)
+    + taken_branch                     JMP, taken JZ, CALL and RET
+    + mem_access                       LOAD8_ABS, STORE8_ABS, PUSH8, POP8
+    + call_ret                         CALL_ABS, RET (8-byte frame)
+
+Loads are LOAD8_ABS, POP8 and RET (its frame read); stores are STORE8_ABS,
+PUSH8 and CALL_ABS. Fetch faults and opcodes missing from the table
+(illegal ones) cost `unknown` cycles.
+
+The defaults are not measured on any hardware. They describe a nominal
+scalar in-order core: every instruction issues in one cycle, a taken
+transfer refills a short fetch pipeline (2), a data access costs an L1 hit
+(2) and a CALL/RET frame moves 8 bytes (3 on top of that). With them the
+estimate mostly tracks the instruction mix, so it is only useful to compare
+runs under the same model; give a CycleModel (`--cycle-model`) with costs
+for the machine you care about.
+"""
+from __future__ import annotations
+
+import json
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from .executor_v2 import (
+    OPC_CALL_ABS,
+    OPC_JMP_ABS,
+    OPC_JMP_REL,
+    OPC_JZ_ABS,
+    OPC_JZ_REL,
+    OPC_LOAD8_ABS,
+    OPC_POP8,
+    OPC_PUSH8,
+    OPC_RET,
+    OPC_STORE8_ABS,
+    OPCODE_NAMES,
+)
+from .profile import NO_FETCH, Profile
+
+DEFAULT_CYCLES: dict[int, int] = {op: 1 for op in OPCODE_NAMES}
+
+_BRANCHES = {OPC_JMP_ABS, OPC_JMP_REL, OPC_JZ_ABS, OPC_JZ_REL, OPC_CALL_ABS, OPC_RET}
+_DATA = {OPC_LOAD8_ABS, OPC_STORE8_ABS, OPC_PUSH8, OPC_POP8}
+_LOADS = {OPC_LOAD8_ABS, OPC_POP8, OPC_RET}
+_STORES = {OPC_STORE8_ABS, OPC_PUSH8, OPC_CALL_ABS}
+_OPCODES = {name: op for op, name in OPCODE_NAMES.items()}
+
+
+@dataclass(slots=True)
+class CycleModel:
+    opcodes: dict[int, int] = field(default_factory=lambda: dict(DEFAULT_CYCLES))
+    taken_branch: int = 2
+    mem_access: int = 2
+    call_ret: int = 3
+    unknown: int = 1
+
+    @classmethod
+    def from_dict(cls, raw: Mapping[str, Any]) -> CycleModel:
+        """
+        {"opcodes": {"ADD": 1, "0x20": 4, ...}, "taken_branch": 2, ...};
+        opcodes are names or numbers, anything left out keeps its default.
+        """
+        model = cls()
+        for key, value in raw.items():
+            if key == "opcodes":
+                for op, cycles in value.items():
+                    code = _OPCODES.get(op)
+                    model.opcodes[code if code is not None else int(op, 0)] = int(cycles)
+            elif key in ("taken_branch", "mem_access", "call_ret", "unknown"):
+                setattr(model, key, int(value))
+            else:
+                raise ValueError(f"unknown cycle model key {key!r}")
+        return model
+
+    @classmethod
+    def load(cls, path: Path | str) -> CycleModel:
+        raw = json.loads(Path(path).read_text(encoding="utf-8"))
+        if not isinstance(raw, dict):
+            raise ValueError(f"{path}: expected a JSON object")
+        return cls.from_dict(raw)
+
+    def cost(self, op: int, count: int, taken: int) -> int:
+        """Cycles for `count` executions of `op`, `taken` of which branched."""
+        cycles = self.opcodes.get(op, self.unknown) * count
+        if op in _BRANCHES:
+            cycles += self.taken_branch * taken
+        if op in _DATA:
+            cycles += self.mem_access * count
+        elif op in (OPC_CALL_ABS, OPC_RET):
+            cycles += self.call_ret * count
+        return cycles
+
+
+@dataclass(frozen=True, slots=True)
+class PerfStat:
+    instructions: int
+    cycles: int
+    branches: int
+    taken: int
+    loads: int
+    stores: int
+    calls: int
+    seconds: float  # host time
+
+    @property
+    def ipc(self) -> float:
+        return self.instructions / self.cycles if self.cycles else 0.0
+
+    @property
+    def taken_rate(self) -> float:
+        return self.taken / self.branches if self.branches else 0.0
+
+    @property
+    def mips(self) -> float:
+        return self.instructions / self.seconds / 1e6 if self.seconds else 0.0
+
+    def report(self) -> dict[str, Any]:
+        """JSON-serialisable counters plus the derived ratios."""
+        return {
+            "instructions": self.instructions,
+            "cycles": self.cycles,
+            "ipc": round(self.ipc, 6),
+            "branches": self.branches,
+            "taken": self.taken,
+            "taken_rate": round(self.taken_rate, 6),
+            "loads": self.loads,
+            "stores": self.stores,
+            "calls": self.calls,
+            "host_seconds": round(self.seconds, 6),
+            "mips": round(self.mips, 3),
+        }
+
+
+def perf_stat(
+    prof: Profile, model: CycleModel | None = None, seconds: float | None = None
+) -> PerfStat:
+    """
+    Counters of a profiled run, costed with `model` (default CycleModel()).
+    `seconds` is the host time to report (default: the profiled run's).
+    """
+    model = model or CycleModel()
+    count = {op: c for op, c in enumerate(prof.ops[:NO_FETCH]) if c}
+    taken = prof.taken
+    cycles = model.unknown * prof.ops[NO_FETCH] + sum(
+        model.cost(op, c, taken[op]) for op, c in count.items()
+    )
+    return PerfStat(
+        instructions=prof.steps,
+        cycles=cycles,
+        branches=sum(c for op, c in count.items() if op in _BRANCHES),
+        taken=sum(taken[op] for op in count if op in _BRANCHES),
+        loads=sum(c for op, c in count.items() if op in _LOADS),
+        stores=sum(c for op, c in count.items() if op in _STORES),
+        calls=count.get(OPC_CALL_ABS, 0),
+        seconds=prof.seconds if seconds is None else seconds,
+    )
+
+
+def format_perf(stat: PerfStat, label: str = "program") -> str:
+    """The summary laid out like `perf stat`."""
+    rows = [
+        (stat.instructions, "instructions", f"{stat.ipc:.2f}  insn per cycle"),
+        (stat.cycles, "cycles", "estimated"),
+        (stat.branches, "branches", ""),
+        (stat.taken, "branches-taken", f"{100 * stat.taken_rate:.2f}% of all branches"),
+        (stat.loads, "loads", ""),
+        (stat.stores, "stores", ""),
+        (stat.calls, "calls", ""),
+    ]
+    lines = [f" Performance counter stats for '{label}':", ""]
+    for value, name, note in rows:
+        line = f"{value:>18,}      {name:<16}"
+        lines.append(f"{line}  #  {note}" if note else line.rstrip())
+    lines.append("")
+    lines.append(f"{stat.seconds:>18.6f} seconds host time  #  {stat.mips:.2f} MIPS")
+    return "\n".join(lines)
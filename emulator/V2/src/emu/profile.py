@@ -0,0 +1,225 @@
+# src/emu/profile.py
+"""
+Guest execution profiler.
+
+    prof = Profile.for_memory(mem)
+    run_profiled(st, mem, max_steps, prof)
+    print(format_report(prof.report(mem)))
+
+run_profiled() executes like the "step" engine and counts, per 8-byte
+instruction slot (index pc >> 3), how often the instruction there retired
+and how often it transferred control (a JMP, a taken JZ, CALL or RET, even
+one whose target is pc + 8), and per opcode the same two numbers for the
+instruction as it was fetched. The counters are lists preallocated for the
+address space, so the per-instruction cost is a few list updates and
+compares on top of the predecoded dispatch.
+
+Opcode counts are exact. The per-PC JZ taken/not-taken counts and the
+basic blocks are derived after the run from the slot counters and the code
+in memory at the end of the run, so a program that rewrites its own code
+has those attributed to the instructions it left behind; format_report()
+says so in its header.
+"""
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from .cpu_state import CPUState
+from .executor_v2 import (
+    OPC_CALL_ABS,
+    OPC_HALT,
+    OPC_JMP_ABS,
+    OPC_JMP_REL,
+    OPC_JZ_ABS,
+    OPC_JZ_REL,
+    OPC_RET,
+    OPCODE_NAMES,
+    step,
+)
+from .memory import Memory
+
+# Largest address range given per-slot counters (PCs above it are only
+# counted in Profile.outside), so a 2 GiB PagedMemory does not get 512M
+# preallocated counters.
+PROFILE_SPAN = 1 << 24
+
+# Profile.ops / Profile.taken index for instructions that could not be
+# fetched (PC out of range or misaligned).
+NO_FETCH = 256
+
+_CONTROL = {OPC_HALT, OPC_JMP_ABS, OPC_JMP_REL, OPC_JZ_ABS, OPC_JZ_REL, OPC_CALL_ABS, OPC_RET}
+_JUMPS = frozenset({OPC_JMP_ABS, OPC_JMP_REL, OPC_CALL_ABS, OPC_RET})
+# Opcodes that transfer control even when the target is pc + 8, by Z flag.
+_TRANSFERS = (_JUMPS, _JUMPS | {OPC_JZ_ABS, OPC_JZ_REL})
+
+
+def _opname(op: int) -> str:
+    return OPCODE_NAMES.get(op, f"0x{op:02X}")
+
+
+@dataclass(frozen=True, slots=True)
+class BasicBlock:
+    start: int
+    end: int  # exclusive
+    count: int  # times the block ran
+
+    @property
+    def instructions(self) -> int:
+        return (self.end - self.start) >> 3
+
+    @property
+    def retired(self) -> int:
+        return self.count * self.instructions
+
+
+@dataclass(slots=True)
+class Profile:
+    counts: list[int]  # retirements per instruction slot (pc >> 3)
+    jumps: list[int]  # of those, how many transferred control
+    ops: list[int] = field(default_factory=lambda: [0] * (NO_FETCH + 1))  # per opcode
+    taken: list[int] = field(default_factory=lambda: [0] * (NO_FETCH + 1))  # jumps per opcode
+    outside: int = 0  # instructions retired at PCs outside the counters
+    steps: int = 0
+    seconds: float = 0.0  # host time in run_profiled()
+
+    @classmethod
+    def for_memory(cls, mem: Memory) -> Profile:
+        slots = min(mem.size, PROFILE_SPAN) >> 3
+        return cls(counts=[0] * slots, jumps=[0] * slots)
+
+    def hot_pcs(self, n: int = 10) -> list[tuple[int, int]]:
+        """The `n` most executed PCs as (pc, count)."""
+        hot = sorted(((-c, i) for i, c in enumerate(self.counts) if c))[:n]
+        return [(i << 3, -c) for c, i in hot]
+
+    def opcode_counts(self) -> dict[str, int]:
+        """
+        Retired instructions per opcode name, most frequent first. Fetch
+        faults are left out.
+        """
+        out = {_opname(op): c for op, c in enumerate(self.ops[:NO_FETCH]) if c}
+        return dict(sorted(out.items(), key=lambda kv: -kv[1]))
+
+    def branches(self, mem: Memory) -> list[tuple[int, int, int]]:
+        """(pc, taken, not_taken) for every JZ that ran, most executed first."""
+        data = mem.data
+        out = [
+            (i << 3, self.jumps[i], c - self.jumps[i])
+            for i, c in enumerate(self.counts)
+            if c and data[i << 3] in (OPC_JZ_ABS, OPC_JZ_REL)
+        ]
+        return sorted(out, key=lambda b: -(b[1] + b[2]))
+
+    def basic_blocks(self, mem: Memory) -> list[BasicBlock]:
+        """
+        Executed basic blocks, most retired instructions first. A block is a
+        run of consecutive slots with the same count that ends at a control
+        transfer (or where the count changes, i.e. at a branch target).
+        """
+        data = mem.data
+        blocks: list[BasicBlock] = []
+        start = -1
+        prev = 0
+        for i, c in enumerate(self.counts):
+            if start >= 0 and c != prev:
+                blocks.append(BasicBlock(start << 3, i << 3, prev))
+                start = -1
+            if c:
+                if start < 0:
+                    start, prev = i, c
+                if data[i << 3] in _CONTROL or self.jumps[i]:
+                    blocks.append(BasicBlock(start << 3, (i + 1) << 3, c))
+                    start = -1
+        if start >= 0:
+            blocks.append(BasicBlock(start << 3, len(self.counts) << 3, prev))
+        return sorted(blocks, key=lambda b: (-b.retired, b.start))
+
+    def report(self, mem: Memory, top: int = 10) -> dict[str, Any]:
+        """A JSON-serialisable summary of the run."""
+        return {
+            "steps": self.steps,
+            "host_seconds": round(self.seconds, 6),
+            "outside": self.outside,
+            "hot_pcs": [{"pc": pc, "count": c} for pc, c in self.hot_pcs(top)],
+            "hot_blocks": [
+                {"start": b.start, "end": b.end, "count": b.count, "retired": b.retired}
+                for b in self.basic_blocks(mem)[:top]
+            ],
+            "opcodes": self.opcode_counts(),
+            "branches": [
+                {"pc": pc, "taken": t, "not_taken": nt} for pc, t, nt in self.branches(mem)[:top]
+            ],
+        }
+
+
+def format_report(report: dict[str, Any]) -> str:
+    """Human-readable form of Profile.report()."""
+    steps = report["steps"] or 1
+    lines = [
+        f"[PROFILE] steps={report['steps']} host={report['host_seconds']:.3f}s",
+        "  (JZ branches and basic blocks are read from the code in memory after the run)",
+    ]
+    lines.append("  hot PCs:")
+    for h in report["hot_pcs"]:
+        lines.append(f"    0x{h['pc']:04X}  {h['count']:>12}  {100 * h['count'] / steps:5.1f}%")
+    lines.append("  hot basic blocks:")
+    for b in report["hot_blocks"]:
+        lines.append(
+            f"    0x{b['start']:04X}..0x{b['end'] - 8:04X}  x{b['count']:<10} "
+            f"{b['retired']:>12}  {100 * b['retired'] / steps:5.1f}%"
+        )
+    lines.append("  opcodes:")
+    for name, c in report["opcodes"].items():
+        lines.append(f"    {name:<10} {c:>12}  {100 * c / steps:5.1f}%")
+    if report["branches"]:
+        lines.append("  JZ branches (taken / not taken):")
+        for br in report["branches"]:
+            lines.append(f"    0x{br['pc']:04X}  {br['taken']:>10} / {br['not_taken']}")
+    return "\n".join(lines)
+
+
+def run_profiled(state: CPUState, mem: Memory, max_steps: int, prof: Profile) -> int:
+    """
+    Execute up to `max_steps` instructions (same results as the "step"
+    engine), accumulating into `prof`. Returns the number retired.
+    """
+    counts, jumps, ops, taken = prof.counts, prof.jumps, prof.ops, prof.taken
+    span = len(counts) << 3
+    icache = mem.icache
+    data = mem.data
+    size = mem.size
+    outside = 0
+    n = 0
+    t0 = time.perf_counter()
+    while n < max_steps and not state.halted:
+        pc = state.pc
+        z = state.z
+        e = icache.get(pc)
+        if e is not None:
+            op = e[0] & 0xFF  # fused entries carry 0x100 | op
+            e[5](state, mem, e[1], e[2], e[3], e[4])
+        else:
+            op = data[pc] if 0 <= pc <= size - 8 and not pc & 7 else NO_FETCH
+            step(state, mem)
+        n += 1
+        ops[op] += 1
+        # Taken is decided by what executed, not by where it went: a JZ to
+        # pc + 8 with Z set is a taken branch.
+        jumped = not state.halted and (state.pc != pc + 8 or op in _TRANSFERS[z])
+        if jumped:
+            taken[op] += 1
+        if 0 <= pc < span:
+            i = pc >> 3
+            counts[i] += 1
+            if jumped:
+                jumps[i] += 1
+        else:
+            outside += 1
+    prof.seconds += time.perf_counter() - t0
+    prof.steps += n
+    prof.outside += outside
+    if state.halted and mem.devices:
+        mem.flush_devices()
+    return n
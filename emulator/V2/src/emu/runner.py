@@ -0,0 +1,288 @@
+# src/emu/runner.py
+"""
+Batched execution: run(state, mem, max_steps) executes up to N instructions
+in one call instead of one step() call per instruction.
+
+Engines:
+- "translate": translated blocks (emu.translator), fastest for long runs.
+- "interp":    a single loop over the predecoded instruction cache with
+               registers, PC, SP, FP and Z held in locals. Fused pairs
+               (executor_v2.FUSED_PAIRS) run in one dispatch and are
+               counted in RunResult.fusion_hits.
+- "step":      the reference executor_v2.step() once per instruction.
+
+Instrumented runs (run(..., hooks=...)) use emu.hooks instead.
+
+All engines produce the same CPUState/Memory as calling step() the same
+number of times. Faults and untranslatable instructions are always handed to
+step(), so fault reporting is shared.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+from .cpu_state import CPUState, HaltReason
+from .executor_v2 import (
+    FRAME,
+    FUSE_ADD_JZ,
+    FUSE_CMP_JZ,
+    FUSE_SUB_JZ,
+    FUSED_PAIRS,
+    OPC_ADD,
+    OPC_CALL_ABS,
+    OPC_CMP,
+    OPC_JMP_ABS,
+    OPC_JMP_REL,
+    OPC_JZ_ABS,
+    OPC_JZ_REL,
+    OPC_LOAD8_ABS,
+    OPC_MOV_RI,
+    OPC_MOV_RR,
+    OPC_POP8,
+    OPC_PUSH8,
+    OPC_RET,
+    OPC_STORE8_ABS,
+    OPC_SUB,
+    CacheEntry,
+    step,
+)
+from .hooks import Hooks, run_hooked
+from .memory import PAGE_SHIFT, PF_MMIO, Memory
+from .translator import run_translated
+
+ENGINES = ("translate", "interp", "step")
+
+MASK64 = 0xFFFFFFFFFFFFFFFF
+
+
+@dataclass(slots=True)
+class RunResult:
+    steps: int  # instructions retired (a faulting instruction counts)
+    halted: bool
+    halt_reason: HaltReason
+    # Fused-pair name -> times it ran as one dispatch ("interp" engine only).
+    fusion_hits: dict[str, int] = field(default_factory=dict, compare=False)
+
+
+def run(
+    state: CPUState,
+    mem: Memory,
+    max_steps: int,
+    engine: str = "translate",
+    hooks: Hooks | None = None,
+    stop_range: tuple[int, int] | None = None,
+) -> RunResult:
+    """
+    Execute up to `max_steps` instructions, stopping early on HALT or fault
+    (which also flushes buffered device output, Memory.flush_devices()), or
+    in front of a breakpoint (Memory.set_breakpoint()) that is not the
+    first instruction executed.
+
+    With `stop_range` ([lo, hi]) the run also stops in front of any later
+    PC in that range. The fast paths never test it: "translate" does not
+    enter blocks reaching into the range, and "interp" keeps the range's
+    slots out of its instruction cache, so only the reference path checks.
+
+    With `hooks` that have any callback set, the run goes through a loop
+    generated for those callbacks (emu.hooks) instead of `engine`; those
+    loops do not support `stop_range`.
+    """
+    hits: dict[str, int] = {}
+    if engine not in ENGINES:
+        raise ValueError(f"unknown engine {engine!r} (expected one of {', '.join(ENGINES)})")
+    if hooks is not None and hooks.active():
+        if stop_range is not None:
+            raise ValueError("stop_range is not supported with hooks")
+        steps = run_hooked(state, mem, max_steps, hooks)
+    elif engine == "translate":
+        steps = run_translated(state, mem, max_steps, stop_range)
+    elif engine == "interp":
+        steps = _run_interp(state, mem, max_steps, hits, stop_range)
+    else:
+        steps = _run_step(state, mem, max_steps, stop_range)
+    if state.halted and mem.devices:
+        mem.flush_devices()
+    return RunResult(
+        steps=steps, halted=state.halted, halt_reason=state.halt_reason, fusion_hits=hits
+    )
+
+
+def _run_step(
+    state: CPUState, mem: Memory, max_steps: int, stop_range: tuple[int, int] | None = None
+) -> int:
+    steps = 0
+    bps = mem.breakpoints
+    if stop_range is not None:
+        lo, hi = stop_range
+        while steps < max_steps and not state.halted:
+            if steps and (state.pc in bps or lo <= state.pc <= hi):
+                break
+            step(state, mem)
+            steps += 1
+        return steps
+    if bps:
+        while steps < max_steps and not state.halted and not (steps and state.pc in bps):
+            step(state, mem)
+            steps += 1
+        return steps
+    while steps < max_steps and not state.halted:
+        step(state, mem)
+        steps += 1
+    return steps
+
+
+def _keep_out(icache: dict[int, CacheEntry], slot: int, lo: int) -> None:
+    # Drop the entry at `slot` if it is at or past `lo`, else unfuse it.
+    e = icache.get(slot)
+    if e is None:
+        return
+    if slot >= lo:
+        del icache[slot]
+    elif e[0] & 0x100:
+        icache[slot] = (e[0] & 0xFF, e[1], e[2], e[3], e[4], e[5])
+
+
+def _run_interp(
+    state: CPUState,
+    mem: Memory,
+    max_steps: int,
+    hits: dict[str, int],
+    stop_range: tuple[int, int] | None = None,
+) -> int:
+    if state.halted:
+        return 0
+    icache = mem.icache
+    # PCs in `stop_range` are dropped from the cache so they only reach the
+    # reference path, which stops in front of them; a fused pair in the slot
+    # below would run into the range, so it is split. step() re-caches what
+    # it runs, so its entries in [below, hi] get the same treatment.
+    lo, hi = (1, 0) if stop_range is None else stop_range
+    below = lo
+    if lo <= hi:
+        below = ((lo + 7) & ~7) - 8
+        for slot in range(below, hi + 1, 8):
+            _keep_out(icache, slot, lo)
+    data = mem.data
+    pflags = mem.page_flags
+    top = mem.top
+    bps = mem.breakpoints
+    regs = state.regs
+    pc, sp, fp = state.pc, state.sp, state.fp
+    # Lazy Z: `zr` holds the last flag-producing result, Z is `zr == 0`.
+    zr = 0 if state.z else 1
+    n = 0
+    n_add = n_sub = n_cmp = 0
+    while n < max_steps:
+        e = icache.get(pc)
+        if e is not None:
+            # Hottest opcodes first. Anything whose run-time checks do not
+            # pass falls through to the reference path at the end. A fused
+            # pair retires two instructions, so it needs two steps of budget.
+            op = e[0]
+            if op == OPC_ADD:
+                regs[e[1]] = zr = (regs[e[2]] + regs[e[3]]) & MASK64
+                pc += 8
+            elif op == OPC_SUB:
+                regs[e[1]] = zr = (regs[e[2]] - regs[e[3]]) & MASK64
+                pc += 8
+            elif op == FUSE_SUB_JZ and n + 1 < max_steps:
+                regs[e[1]] = zr = (regs[e[2]] - regs[e[3]]) & MASK64
+                pc = pc + 16 if zr else e[6]
+                n += 2
+                n_sub += 1
+                continue
+            elif op == FUSE_CMP_JZ and n + 1 < max_steps:
+                zr = regs[e[2]] - regs[e[3]]
+                pc = pc + 16 if zr else e[6]
+                n += 2
+                n_cmp += 1
+                continue
+            elif op == OPC_JZ_REL:
+                pc = pc + 8 if zr else pc + e[4]
+            elif op == OPC_JMP_ABS:
+                pc = e[4]
+            elif op == OPC_CMP:
+                zr = regs[e[2]] - regs[e[3]]
+                pc += 8
+            elif op == FUSE_ADD_JZ and n + 1 < max_steps:
+                regs[e[1]] = zr = (regs[e[2]] + regs[e[3]]) & MASK64
+                pc = pc + 16 if zr else e[6]
+                n += 2
+                n_add += 1
+                continue
+            elif op == OPC_MOV_RI and e[1] < 16:
+                regs[e[1]] = e[4] & MASK64
+                pc += 8
+            elif op == OPC_JZ_ABS:
+                pc = pc + 8 if zr else e[4]
+            elif op == OPC_JMP_REL:
+                pc += e[4]
+            elif op == OPC_LOAD8_ABS:
+                regs[e[1]] = data[e[4]]
+                pc += 8
+            elif op == OPC_STORE8_ABS:
+                a = e[4]
+                data[a] = regs[e[2]] & 0xFF
+                if pflags[a >> PAGE_SHIFT]:
+                    mem.write_barrier(a)
+                pc += 8
+            elif op == OPC_MOV_RR and e[1] < 16 and e[2] < 16:
+                regs[e[1]] = regs[e[2]]
+                pc += 8
+            elif op == OPC_PUSH8 and 0 < sp <= top:
+                data[sp] = regs[e[2]] & 0xFF
+                if pflags[sp >> PAGE_SHIFT]:
+                    mem.write_barrier(sp)
+                sp -= 1
+                pc += 8
+            elif op == OPC_POP8 and -1 <= sp < top and not pflags[(sp + 1) >> PAGE_SHIFT] & PF_MMIO:
+                sp += 1
+                regs[e[1]] = data[sp]
+                pc += 8
+            elif op == OPC_CALL_ABS and (sp - 7) % 8 == 0 and 7 <= sp <= top:
+                FRAME.pack_into(data, sp - 7, pc + 8)
+                if pflags[(sp - 7) >> PAGE_SHIFT]:
+                    mem.write_barrier(sp - 7, 8)
+                sp -= 8
+                pc = e[4] & top
+            elif (
+                op == OPC_RET and (sp + 1) % 8 == 0 and -1 <= sp <= top - 8
+                and not pflags[(sp + 1) >> PAGE_SHIFT] & PF_MMIO
+            ):
+                pc = FRAME.unpack_from(data, sp + 1)[0]
+                sp += 8
+            else:
+                # HALT, SP/FP operands, a failed stack check, a stack read
+                # from a device page or a fused pair without budget for both
+                # halves: reference path.
+                state.pc, state.sp, state.fp, state.z = pc, sp, fp, zr == 0
+                step(state, mem)
+                n += 1
+                if state.halted:
+                    break
+                pc, sp, fp = state.pc, state.sp, state.fp
+                zr = 0 if state.z else 1
+                continue
+            n += 1
+            continue
+
+        # Not predecoded yet (step() fills the cache), would fault, a
+        # breakpoint (never cached) or in `stop_range`.
+        state.pc, state.sp, state.fp, state.z = pc, sp, fp, zr == 0
+        if n and (pc in bps or lo <= pc <= hi):
+            break
+        step(state, mem)
+        if below <= pc <= hi:
+            _keep_out(icache, pc, lo)
+        n += 1
+        if state.halted:
+            break
+        pc, sp, fp = state.pc, state.sp, state.fp
+        zr = 0 if state.z else 1
+    else:
+        state.pc, state.sp, state.fp, state.z = pc, sp, fp, zr == 0
+
+    for fused, count in ((FUSE_ADD_JZ, n_add), (FUSE_SUB_JZ, n_sub), (FUSE_CMP_JZ, n_cmp)):
+        if count:
+            hits[FUSED_PAIRS[fused]] = count
+    return n
@@ -0,0 +1,58 @@
+# src/emu/snapshot.py
+"""
+Copy-on-write checkpoints of a running machine.
+
+    snap = snapshot(st, mem)        # after warming up
+    for case in cases:
+        restore(snap, st, mem)      # rewinds only the pages written since
+        ...
+        run(st, mem, budget)
+    st2, mem2 = fork(snap)          # an independent machine from the same point
+
+Snapshots hold memory as immutable per-page images (Memory.capture_pages).
+Taking a snapshot copies only the pages written since the previous
+snapshot/restore of that Memory and shares every other page with it, and
+restore() rewrites only pages that differ. Page writes are detected through
+the same page-flag write barrier the code caches use, so untouched pages cost
+nothing on either side. A PagedMemory forks into a PagedMemory whose all-zero
+pages stay unallocated.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from .cpu_state import CPUState
+from .memory import Memory, Pages
+
+
+@dataclass(frozen=True, slots=True)
+class Snapshot:
+    state: CPUState  # private copy; never handed out directly
+    pages: Pages
+    memory_type: type[Memory] = Memory
+
+
+def _copy_state(src: CPUState, dst: CPUState | None = None) -> CPUState:
+    if dst is None:
+        dst = CPUState()
+    dst.regs[:] = src.regs
+    dst.pc, dst.sp, dst.fp, dst.z = src.pc, src.sp, src.fp, src.z
+    dst.halted, dst.halt_reason = src.halted, src.halt_reason
+    dst.fault_info = src.fault_info
+    return dst
+
+
+def snapshot(state: CPUState, mem: Memory) -> Snapshot:
+    """Checkpoint `state` and `mem`."""
+    return Snapshot(state=_copy_state(state), pages=mem.capture_pages(), memory_type=type(mem))
+
+
+def restore(snap: Snapshot, state: CPUState, mem: Memory) -> None:
+    """Rewind `state` and `mem` in place to `snap`."""
+    _copy_state(snap.state, state)
+    mem.restore_pages(snap.pages)
+
+
+def fork(snap: Snapshot) -> tuple[CPUState, Memory]:
+    """A new, independent machine starting from `snap`."""
+    return _copy_state(snap.state), snap.memory_type.from_pages(snap.pages)
@@ -0,0 +1,361 @@
+# src/emu/trace.py
+"""
+Binary execution traces.
+
+    with open("run.trace", "wb") as f:
+        run_traced(st, mem, max_steps, TraceFile(f))          # every step
+    ring = TraceRing(10_000)
+    run_traced(st, mem, max_steps, ring)                      # last 10k steps
+    for rec in ring.records():
+        print(format_record(rec))
+
+A trace is a 12-byte header (MAGIC, VERSION, record size) followed by
+fixed-width 32-byte records, one per retired instruction:
+
+    u64  step     index of the instruction in the run (0-based)
+    u32  pc       address it was fetched from
+    8s   instr    the raw instruction word
+    u8   flags    TF_Z (Z after the instruction), TF_HALT (it halted or
+                  faulted), TF_REG (reg/value hold a register delta)
+    u8   reg      register it wrote: 0..15, 16 = SP, 17 = FP
+    u64  value    that register's new value
+
+The traced loop packs records into a preallocated chunk and hands full
+chunks to the sink, so the per-step cost is one step() call plus one
+struct.pack_into; nothing is decoded or formatted while the guest runs.
+Decoding and filtering happen offline (read_trace(), `emu_cli trace-view`).
+"""
+from __future__ import annotations
+
+import struct
+from collections.abc import Iterator
+from dataclasses import dataclass
+from typing import BinaryIO, TextIO
+
+from .cpu_state import CPUState
+from .decoder import decode_at
+from .executor_v2 import (
+    OPC_ADD,
+    OPC_CALL_ABS,
+    OPC_LOAD8_ABS,
+    OPC_MOV_RI,
+    OPC_MOV_RR,
+    OPC_POP8,
+    OPC_PUSH8,
+    OPC_RET,
+    OPC_SUB,
+    step,
+)
+from .memory import Memory
+from .runner import run
+
+MAGIC = b"EMUTRACE"
+VERSION = 1
+HEADER = struct.Struct("<8sHH")
+RECORD = struct.Struct("<QI8sBBxxQ")
+RECORD_SIZE = RECORD.size
+
+TF_Z = 0x01
+TF_HALT = 0x02
+TF_REG = 0x04
+
+CHUNK_RECORDS = 4096
+
+# Opcode -> which register delta to record: _RD for instructions that write
+# rd, 16 (SP) for the ones that only move the stack pointer.
+_RD = -1
+_DELTA: dict[int, int] = {
+    OPC_MOV_RI: _RD,
+    OPC_MOV_RR: _RD,
+    OPC_ADD: _RD,
+    OPC_SUB: _RD,
+    OPC_LOAD8_ABS: _RD,
+    OPC_POP8: _RD,
+    OPC_PUSH8: 16,
+    OPC_CALL_ABS: 16,
+    OPC_RET: 16,
+}
+
+
+@dataclass(frozen=True, slots=True)
+class TraceRecord:
+    step: int
+    pc: int
+    instr: bytes
+    z: bool
+    halted: bool
+    reg: int | None  # None when the record carries no register delta
+    value: int
+
+
+def _unpack(step_: int, pc: int, instr: bytes, flags: int, reg: int, value: int) -> TraceRecord:
+    has_reg = bool(flags & TF_REG)
+    return TraceRecord(
+        step_,
+        pc,
+        instr,
+        bool(flags & TF_Z),
+        bool(flags & TF_HALT),
+        reg if has_reg else None,
+        value if has_reg else 0,
+    )
+
+
+def iter_records(blob: bytes | bytearray | memoryview) -> Iterator[TraceRecord]:
+    """Decode a run of packed records (no header)."""
+    for fields in RECORD.iter_unpack(blob):
+        yield _unpack(*fields)
+
+
+def _header() -> bytes:
+    return HEADER.pack(MAGIC, VERSION, RECORD_SIZE)
+
+
+def read_trace(f: BinaryIO) -> Iterator[TraceRecord]:
+    """Records of a trace file written by TraceFile or TraceRing.save()."""
+    head = f.read(HEADER.size)
+    if len(head) != HEADER.size:
+        raise ValueError("not a trace file (truncated header)")
+    magic, version, size = HEADER.unpack(head)
+    if magic != MAGIC:
+        raise ValueError("not a trace file (bad magic)")
+    if version != VERSION or size != RECORD_SIZE:
+        raise ValueError(f"unsupported trace version {version} (record size {size})")
+    while True:
+        blob = f.read(CHUNK_RECORDS * RECORD_SIZE)
+        if not blob:
+            return
+        whole = len(blob) - len(blob) % RECORD_SIZE  # ignore a torn final record
+        yield from iter_records(memoryview(blob)[:whole])
+        if whole != len(blob):
+            return
+
+
+def format_record(rec: TraceRecord) -> str:
+    """One human-readable line per record."""
+    opc, rd, ra, rb, imm32 = decode_at(rec.instr)
+    raw_hex = " ".join(f"{b:02X}" for b in rec.instr)
+    line = (
+        f"{rec.step:06d} PC={rec.pc:04X}  {raw_hex}   "
+        f"opc=0x{opc:02X} rd={rd} ra={ra} rb={rb} imm32={imm32}  Z={int(rec.z)}"
+    )
+    if rec.reg is not None:
+        name = {16: "SP", 17: "FP"}.get(rec.reg, f"R{rec.reg:02d}")
+        line += f"  {name}={rec.value:016X}"
+    if rec.halted:
+        line += "  [HALT]"
+    return line
+
+
+class TraceFile:
+    """Streams every record to a binary file."""
+
+    def __init__(self, out: BinaryIO) -> None:
+        self.out = out
+        self.count = 0
+        out.write(_header())
+
+    def write(self, records: memoryview) -> None:
+        self.out.write(records)
+        self.count += len(records) // RECORD_SIZE
+
+
+class TraceText:
+    """Formats records as text lines as they arrive (the classic --trace)."""
+
+    def __init__(self, out: TextIO) -> None:
+        self.out = out
+        self.count = 0
+
+    def write(self, records: memoryview) -> None:
+        self.out.write("".join(format_record(r) + "\n" for r in iter_records(records)))
+        self.out.flush()
+        self.count += len(records) // RECORD_SIZE
+
+
+class TraceRing:
+    """Keeps only the last `capacity` records, in a fixed-size buffer."""
+
+    def __init__(self, capacity: int) -> None:
+        if capacity <= 0:
+            raise ValueError("ring capacity must be > 0")
+        self.capacity = capacity
+        self.buf = bytearray(capacity * RECORD_SIZE)
+        self.pos = 0  # next slot to overwrite
+        self.count = 0  # records ever written
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def write(self, records: memoryview) -> None:
+        n = len(records) // RECORD_SIZE
+        self.count += n
+        cap = self.capacity
+        if n >= cap:
+            self.buf[:] = records[(n - cap) * RECORD_SIZE :]
+            self.pos = 0
+            return
+        first = min(n, cap - self.pos)
+        at = self.pos * RECORD_SIZE
+        self.buf[at : at + first * RECORD_SIZE] = records[: first * RECORD_SIZE]
+        if first < n:
+            self.buf[: (n - first) * RECORD_SIZE] = records[first * RECORD_SIZE :]
+        self.pos = (self.pos + n) % cap
+
+    def tobytes(self) -> bytes:
+        """The retained records, oldest first."""
+        if self.count < self.capacity:
+            return bytes(self.buf[: self.pos * RECORD_SIZE])
+        at = self.pos * RECORD_SIZE
+        return bytes(self.buf[at:] + self.buf[:at])
+
+    def records(self) -> Iterator[TraceRecord]:
+        return iter_records(self.tobytes())
+
+    def save(self, out: BinaryIO) -> None:
+        """Write the retained records as a trace file."""
+        out.write(_header())
+        out.write(self.tobytes())
+
+
+TraceSink = TraceFile | TraceText | TraceRing
+
+
+def run_traced(
+    state: CPUState,
+    mem: Memory,
+    max_steps: int,
+    sink: TraceSink,
+    regs: bool = False,
+    chunk: int = CHUNK_RECORDS,
+    first_step: int = 0,
+    pc_range: tuple[int, int] | None = None,
+) -> int:
+    """
+    Execute up to `max_steps` instructions with step(), recording each one
+    into `sink`. With `regs`, records also carry the register the
+    instruction wrote. Records are numbered from `first_step`.
+
+    Like run(), stops in front of a breakpoint other than the first
+    instruction, and also before any PC outside `pc_range` ([lo, hi]).
+    Returns the number of instructions retired.
+    """
+    if chunk <= 0:
+        raise ValueError("chunk must be > 0")
+    buf = bytearray(chunk * RECORD_SIZE)
+    view = memoryview(buf)
+    pack = RECORD.pack_into
+    data = mem.data
+    r = state.regs
+    delta = _DELTA if regs else {}
+    bps = mem.breakpoints
+    lo, hi = (0, mem.top) if pc_range is None else pc_range
+    check = bool(bps) or pc_range is not None
+    off = 0
+    end = len(buf)
+    n = 0
+    while n < max_steps and not state.halted:
+        pc = state.pc
+        if check and n and (pc in bps or not lo <= pc <= hi):
+            break
+        raw = data[pc : pc + 8] if pc >= 0 else b""
+        step(state, mem)
+        flags = TF_Z if state.z else 0
+        reg = value = 0
+        if state.halted:
+            flags |= TF_HALT
+        elif raw and delta:
+            d = delta.get(raw[0])
+            if d is not None:
+                reg = raw[1] if d == _RD else d
+                value = r[reg] if reg < 16 else state.sp if reg == 16 else state.fp
+                flags |= TF_REG
+        pack(buf, off, first_step + n, pc & 0xFFFFFFFF, raw, flags, reg, value)
+        n += 1
+        off += RECORD_SIZE
+        if off == end:
+            sink.write(view)
+            off = 0
+    if off:
+        sink.write(view[:off])
+    if state.halted and mem.devices:
+        mem.flush_devices()
+    return n
+
+
+def _run_to(state: CPUState, mem: Memory, max_steps: int, pc: int, engine: str) -> int:
+    # Untraced run with a temporary breakpoint on `pc`.
+    added = pc not in mem.breakpoints
+    if added:
+        mem.set_breakpoint(pc)
+    try:
+        return run(state, mem, max_steps, engine=engine).steps
+    finally:
+        if added:
+            mem.clear_breakpoint(pc)
+
+
+def run_window(
+    state: CPUState,
+    mem: Memory,
+    max_steps: int,
+    sink: TraceSink,
+    engine: str = "translate",
+    from_step: int = 0,
+    from_pc: int | None = None,
+    until_pc: int | None = None,
+    pc_range: tuple[int, int] | None = None,
+    regs: bool = False,
+    chunk: int = CHUNK_RECORDS,
+) -> int:
+    """
+    Like run_traced(), but record only a window of the run:
+
+    - nothing before step `from_step` or before PC first reaches `from_pc`;
+    - nothing from the time PC reaches `until_pc`;
+    - only instructions whose PC lies in `pc_range` ([lo, hi]).
+
+    The program itself always runs until it halts or `max_steps` retire;
+    everything outside the window runs untraced on `engine` at full speed.
+    The PC triggers are breakpoints (Memory.set_breakpoint()), which are
+    never translated or predecoded, so the fast path performs no trigger
+    checks. Outside `pc_range` the run uses run(stop_range=pc_range), which
+    keeps the range check off the fast paths as well. Returns the number of
+    instructions retired.
+    """
+    n = 0
+    if from_step > 0:
+        n += run(state, mem, min(from_step, max_steps), engine=engine).steps
+    if from_pc is not None and not state.halted and state.pc != from_pc:
+        n += _run_to(state, mem, max_steps - n, from_pc, engine)
+        if state.pc != from_pc:
+            return n  # halted or out of budget before the trigger
+    if pc_range is not None:
+        lo, hi = pc_range
+    stop = until_pc if until_pc is not None and until_pc not in mem.breakpoints else None
+    if stop is not None:
+        mem.set_breakpoint(stop)
+    try:
+        # Checked before anything is traced, so from_pc == until_pc records nothing.
+        while n < max_steps and not state.halted and state.pc != until_pc:
+            if pc_range is None or lo <= state.pc <= hi:
+                n += run_traced(
+                    state,
+                    mem,
+                    max_steps - n,
+                    sink,
+                    regs=regs,
+                    chunk=chunk,
+                    first_step=n,
+                    pc_range=pc_range,
+                )
+            else:
+                # Untraced until PC enters the range (or reaches a breakpoint).
+                n += run(state, mem, max_steps - n, engine=engine, stop_range=pc_range).steps
+    finally:
+        if stop is not None:
+            mem.clear_breakpoint(stop)
+    # Past `until_pc` the window is closed: finish the run untraced.
+    while n < max_steps and not state.halted:
+        n += run(state, mem, max_steps - n, engine=engine).steps
+    return n
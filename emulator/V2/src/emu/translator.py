@@ -0,0 +1,393 @@
+# src/emu/translator.py
+"""
+Basic-block translation engine.
+
+A block is the straight-line run of instructions starting at some PC and
+ending at CALL/RET/HALT (or at MAX_BLOCK_INSTRS). JMP_ABS/JMP_REL have static
+targets, so translation follows them instead of stopping, and a taken JZ is
+a side exit; a jump back to the entry PC loops inside the generated function.
+This keeps whole guest loops in one Python frame instead of bouncing through
+the driver every two or three instructions.
+
+Each block is translated once into a specialised Python function in which
+register indices, immediates and branch targets are literal constants, and
+cached in Memory.blocks under its entry PC. Guest writes that land on a page
+holding translated code drop the blocks they overlap (Memory.write_barrier).
+
+Only instructions whose static checks pass (executor_v2.predecode) are
+translated. Every run-time condition that could fault (SP/FP range, stack
+alignment, ...) and HALT leave the block with the PC of that instruction
+still unexecuted, and the driver runs it through the reference step(). The
+fault state is therefore produced by executor_v2 itself, which keeps
+results bit-identical to step()-only execution.
+
+The Z flag is carried lazily as the last flag-producing result and only
+compared against zero by JZ or when the state is written back, and flag
+writes that nothing can observe before the next one are not emitted.
+"""
+from __future__ import annotations
+
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+from .cpu_state import CPUState
+from .decoder import decode_at
+from .executor_v2 import (
+    FRAME,
+    OPC_ADD,
+    OPC_CALL_ABS,
+    OPC_CMP,
+    OPC_HALT,
+    OPC_JMP_ABS,
+    OPC_JMP_REL,
+    OPC_JZ_ABS,
+    OPC_JZ_REL,
+    OPC_LOAD8_ABS,
+    OPC_MOV_RI,
+    OPC_MOV_RR,
+    OPC_POP8,
+    OPC_PUSH8,
+    OPC_RET,
+    OPC_STORE8_ABS,
+    OPC_SUB,
+    predecode,
+    step,
+)
+from .memory import PAGE_SHIFT, PF_MMIO, Memory
+
+MAX_BLOCK_INSTRS = 64
+
+# fn(regs, sp, fp, zr, budget) -> (pc, sp, fp, zr, retired, slow)
+# `slow` means the instruction at `pc` must be run by step().
+# Z is evaluated lazily: `zr` is the last flag-producing result (or any
+# stand-in with the right truth value) and Z is `zr == 0`.
+BlockFn = Callable[[list[int], int, int, int, int], tuple[int, int, int, int, int, bool]]
+
+_TERMINATORS = {OPC_HALT, OPC_CALL_ABS, OPC_RET}
+_FLAG_WRITERS = {OPC_ADD, OPC_SUB, OPC_CMP}
+
+
+@dataclass(slots=True)
+class Block:
+    pc: int
+    spans: list[tuple[int, int]]  # [start, end) byte ranges of the translated instructions
+    count: int  # most instructions retired in one pass through the block
+    fn: BlockFn
+    source: str
+
+
+class _Emitter:
+    """Accumulates the Python source of one block."""
+
+    def __init__(self, entry: int, mem: Memory) -> None:
+        self.entry = entry
+        self.mem = mem
+        self.top = mem.top  # emitted as a literal in bounds checks
+        self.lines: list[str] = []
+        self.loops = False
+        self.names: dict[str, Any] = {}  # extra globals of the block function
+
+    def device_writer(self, addr: int) -> tuple[str, int] | None:
+        """(name bound to its write handler, offset) for a device register at `addr`."""
+        if not self.mem.page_flags[addr >> PAGE_SHIFT] & PF_MMIO:
+            return None
+        region = self.mem.device_at(addr)
+        if region is None or region.write is None:
+            return None
+        name = f"dev_{region.start:x}"
+        self.names[name] = region.write
+        return name, addr - region.start
+
+    def emit(self, text: str) -> None:
+        self.lines.extend(text.split("\n"))
+
+    # Exit helpers. `idx` is the index of the instruction inside the block,
+    # i.e. the number of instructions already retired in this pass.
+    def slow(self, pc: int, idx: int) -> str:
+        return f"return ({pc}, sp, fp, zr, n + {idx}, True)"
+
+    def goto(self, target: int, retired: int) -> str:
+        if target == self.entry:
+            self.loops = True
+            # Loop back without leaving the function while budget remains.
+            # `PASS` is the longest pass through the block, bound at compile time.
+            return (
+                f"n += {retired}\nif n + PASS <= budget:\n    continue\n"
+                f"return ({target}, sp, fp, zr, n, False)"
+            )
+        return f"return ({target}, sp, fp, zr, n + {retired}, False)"
+
+
+def _indent(text: str, prefix: str) -> str:
+    return "\n".join(prefix + line for line in text.split("\n"))
+
+
+def _sel_checks(em: _Emitter, pc: int, idx: int, sels: tuple[int, ...]) -> None:
+    # Same order as _op_mov_rr / _op_mov_ri: each SP/FP operand is range checked.
+    for sel in sels:
+        if sel == 16:
+            em.emit(f"if not (0 <= sp <= {em.top}):\n    {em.slow(pc, idx)}")
+        elif sel == 17:
+            em.emit(f"if not (0 <= fp <= {em.top}):\n    {em.slow(pc, idx)}")
+
+
+def _operand(sel: int) -> str:
+    return "sp" if sel == 16 else "fp" if sel == 17 else f"regs[{sel}]"
+
+
+def _translate_one(
+    em: _Emitter, pc: int, idx: int, flags: bool, op: int, rd: int, ra: int, rb: int, imm32: int
+) -> None:
+    # `flags` is False when no branch or exit can observe this instruction's
+    # Z before the next flag-producing instruction overwrites it.
+    nxt = pc + 8
+    done = idx + 1
+    em.emit(f"# {pc:#06x}: opc={op:#04x} rd={rd} ra={ra} rb={rb} imm32={imm32}")
+
+    if op == OPC_HALT:
+        em.emit(em.slow(pc, idx))
+    elif op == OPC_MOV_RI:
+        _sel_checks(em, pc, idx, (rd,))
+        em.emit(f"{_operand(rd)} = {imm32 & 0xFFFFFFFFFFFFFFFF}")
+    elif op == OPC_MOV_RR:
+        _sel_checks(em, pc, idx, (rd, ra))
+        em.emit(f"{_operand(rd)} = {_operand(ra)}")
+    elif op == OPC_ADD:
+        set_z = "zr = " if flags else ""
+        em.emit(f"regs[{rd}] = {set_z}(regs[{ra}] + regs[{rb}]) & 0xFFFFFFFFFFFFFFFF")
+    elif op == OPC_SUB:
+        set_z = "zr = " if flags else ""
+        em.emit(f"regs[{rd}] = {set_z}(regs[{ra}] - regs[{rb}]) & 0xFFFFFFFFFFFFFFFF")
+    elif op == OPC_CMP:
+        if flags:
+            em.emit(f"zr = regs[{ra}] - regs[{rb}]")
+    elif op == OPC_LOAD8_ABS:
+        em.emit(f"regs[{rd}] = data[{imm32}]")
+    elif op == OPC_STORE8_ABS:
+        em.emit(f"data[{imm32}] = regs[{ra}] & 0xFF")
+        # Writing over translated code ends the block: the rest of it may be stale.
+        page = imm32 >> PAGE_SHIFT
+        writer = em.device_writer(imm32)
+        if writer is None:
+            em.emit(f"if pflags[{page}] and inv({imm32}):\n{_indent(em.goto(nxt, done), '    ')}")
+        else:
+            # Device register: call its handler directly unless the page
+            # also has RAM bookkeeping pending (then the barrier does both).
+            dev, off = writer
+            em.emit(
+                f"if pflags[{page}] != {PF_MMIO}:\n    t = inv({imm32})\n"
+                f"else:\n    t = {dev}({off}, data[{imm32}])\n"
+                f"if t:\n{_indent(em.goto(nxt, done), '    ')}"
+            )
+    elif op == OPC_PUSH8:
+        em.emit(f"if not (0 < sp <= {em.top}):\n    {em.slow(pc, idx)}")
+        em.emit(f"data[sp] = regs[{ra}] & 0xFF\nsp -= 1")
+        em.emit(
+            f"if pflags[(sp + 1) >> {PAGE_SHIFT}] and inv(sp + 1):\n"
+            f"{_indent(em.goto(nxt, done), '    ')}"
+        )
+    elif op == OPC_POP8:
+        em.emit(
+            f"if not (-1 <= sp < {em.top}) or pflags[(sp + 1) >> {PAGE_SHIFT}] & {PF_MMIO}:\n"
+            f"    {em.slow(pc, idx)}"
+        )
+        em.emit(f"sp += 1\nregs[{rd}] = data[sp]")
+    elif op in (OPC_JZ_ABS, OPC_JZ_REL):
+        # Side exit when taken; the fall-through path stays in the block.
+        target = imm32 if op == OPC_JZ_ABS else pc + imm32
+        em.emit(f"if not zr:\n{_indent(em.goto(target, done), '    ')}")
+    elif op == OPC_CALL_ABS:
+        frame = (pc + 8).to_bytes(8, "big")
+        em.emit(f"if (sp - 7) % 8 or not (7 <= sp <= {em.top}):\n    {em.slow(pc, idx)}")
+        em.emit(f"data[sp - 7:sp + 1] = {frame!r}")
+        em.emit(f"if pflags[(sp - 7) >> {PAGE_SHIFT}]:\n    inv(sp - 7, 8)")
+        em.emit("sp -= 8")
+        em.emit(em.goto(imm32 & em.top, done))
+    elif op == OPC_RET:
+        em.emit(
+            f"if (sp + 1) % 8 or not (-1 <= sp <= {em.top - 8})"
+            f" or pflags[(sp + 1) >> {PAGE_SHIFT}] & {PF_MMIO}:\n"
+            f"    {em.slow(pc, idx)}"
+        )
+        em.emit("t = unpack_frame(data, sp + 1)[0]\nsp += 8")
+        em.emit(f"return (t, sp, fp, zr, n + {done}, False)")
+    else:  # pragma: no cover - predecode only accepts the opcodes above
+        raise AssertionError(f"untranslatable opcode {op:#04x}")
+
+
+def _flag_transparent(op: int, rd: int, ra: int, rb: int, imm32: int) -> bool:
+    # True if the translated instruction neither reads Z nor can exit the
+    # block (no run-time checks, no invalidation exit, not a branch).
+    if op in _FLAG_WRITERS or op == OPC_LOAD8_ABS:
+        return True
+    if op == OPC_MOV_RI:
+        return rd < 16
+    if op == OPC_MOV_RR:
+        return rd < 16 and ra < 16
+    return False
+
+
+def translate_block(mem: Memory, pc: int) -> Block | None:
+    """
+    Translate the block starting at `pc` and cache it in mem.blocks.
+    Returns None when the first instruction cannot be translated (it would
+    fault in step(), which then reports it).
+    """
+    # Pass 1: walk the guest code. `items` holds ("ins", pc, fields) for
+    # instructions to emit, ("jmp", pc, fields) for followed jumps and a
+    # final ("goto", target, retired) when the block falls off its end.
+    items: list[tuple[str, int, tuple[int, ...]]] = []
+    top = mem.top
+    cur = pc
+    count = 0
+    visited: list[int] = []
+    while True:
+        if count == MAX_BLOCK_INSTRS or cur in visited:
+            items.append(("goto", cur, (count,)))
+            break
+        if cur < 0 or cur + 7 > top or cur % 8 != 0:
+            if count == 0:
+                return None
+            items.append(("goto", cur, (count,)))
+            break
+        fields = decode_at(mem.data, cur)
+        if predecode(mem, cur, *fields) is None:
+            if count == 0:
+                return None
+            items.append(("goto", cur, (count,)))
+            break
+        visited.append(cur)
+        op, imm32 = fields[0], fields[4]
+        if op in (OPC_JMP_ABS, OPC_JMP_REL):
+            # Static target: keep translating there instead of returning to
+            # the driver (the jump itself still retires).
+            items.append(("jmp", cur, fields))
+            count += 1
+            cur = imm32 if op == OPC_JMP_ABS else cur + imm32
+            if cur == pc:
+                items.append(("goto", cur, (count,)))
+                break
+            continue
+        items.append(("ins", cur, fields))
+        count += 1
+        cur += 8
+        if op in _TERMINATORS:
+            break
+
+    # Pass 2 (backwards): a flag write is dead if the next flag write comes
+    # before anything that reads Z or can leave the block.
+    live = [True] * len(items)
+    z_read = True
+    for i in range(len(items) - 1, -1, -1):
+        kind, _, fields = items[i]
+        if kind == "jmp":
+            continue
+        if kind == "goto" or not _flag_transparent(*fields):
+            z_read = True
+        elif fields[0] in _FLAG_WRITERS:
+            live[i] = z_read
+            z_read = False
+
+    # Pass 3: emit.
+    em = _Emitter(pc, mem)
+    idx = 0
+    for (kind, at, fields), flags in zip(items, live, strict=True):
+        if kind == "goto":
+            em.emit(em.goto(at, fields[0]))
+        elif kind == "jmp":
+            em.emit(f"# {at:#06x}: opc={fields[0]:#04x} imm32={fields[4]}")
+            idx += 1
+        else:
+            _translate_one(em, at, idx, flags, *fields)
+            idx += 1
+
+    body = "\n".join(em.lines)
+    if em.loops:
+        body = "while True:\n" + _indent(body, "    ")
+    source = (
+        f"def _block_{pc:04x}(regs, sp, fp, zr, budget, data=data, pflags=pflags, inv=inv,\n"
+        f"        unpack_frame=unpack_frame, PASS={count}):\n"
+        f"    n = 0\n{_indent(body, '    ')}\n"
+    )
+    namespace = {
+        "data": mem.data,
+        "pflags": mem.page_flags,
+        "inv": mem.write_barrier,
+        "unpack_frame": FRAME.unpack_from,
+        **em.names,
+    }
+    exec(compile(source, f"<block {pc:#06x}>", "exec"), namespace)
+    fn = namespace[f"_block_{pc:04x}"]
+    block = Block(pc=pc, spans=_spans(visited), count=count, fn=fn, source=source)
+    mem.register_block(pc, block.spans, block)
+    return block
+
+
+def _spans(pcs: list[int]) -> list[tuple[int, int]]:
+    # Merge the 8-byte instruction slots of a block into contiguous ranges.
+    out: list[tuple[int, int]] = []
+    for p in sorted(pcs):
+        if out and out[-1][1] == p:
+            out[-1] = (out[-1][0], p + 8)
+        else:
+            out.append((p, p + 8))
+    return out
+
+
+def run_translated(
+    state: CPUState, mem: Memory, max_steps: int, stop_range: tuple[int, int] | None = None
+) -> int:
+    """
+    Execute up to `max_steps` instructions with translated blocks.
+    Stops early on HALT or fault, or before a breakpoint (Memory.breakpoints)
+    other than the first instruction. Returns the number of instructions
+    retired (a faulting instruction counts, like one step() call).
+
+    With `stop_range` ([lo, hi]) it also stops before any later PC in that
+    range. A block whose spans reach into the range is not entered; its
+    instructions go through step() one at a time, so the check costs two
+    comparisons per block.
+    """
+    if state.halted or max_steps <= 0:
+        return 0
+    blocks = mem.blocks
+    bps = mem.breakpoints
+    lo, hi = (1, 0) if stop_range is None else stop_range  # (1, 0): empty
+    regs = state.regs
+    pc, sp, fp = state.pc, state.sp, state.fp
+    zr = 0 if state.z else 1
+    done = 0
+    while done < max_steps:
+        blk = blocks.get(pc)
+        if blk is None:
+            blk = translate_block(mem, pc)
+        if blk is not None and (
+            stop_range is None or blk.spans[0][0] > hi or blk.spans[-1][1] <= lo
+        ):
+            if blk.count > max_steps - done:
+                break
+            pc, sp, fp, zr, n, slow = blk.fn(regs, sp, fp, zr, max_steps - done)
+            done += n
+            if not slow or done >= max_steps:
+                continue
+        # Untranslatable (it faults, or is a breakpoint), HALT, a run-time
+        # check failed, or the block reaches into `stop_range`: this one
+        # instruction goes through the reference path.
+        state.pc, state.sp, state.fp, state.z = pc, sp, fp, zr == 0
+        if done and (pc in bps or lo <= pc <= hi):
+            return done
+        step(state, mem)
+        done += 1
+        if state.halted:
+            return done
+        pc, sp, fp = state.pc, state.sp, state.fp
+        zr = 0 if state.z else 1
+    state.pc, state.sp, state.fp, state.z = pc, sp, fp, zr == 0
+    # Less budget left than the next block needs: finish instruction by instruction.
+    while done < max_steps and not state.halted:
+        if done and (state.pc in bps or lo <= state.pc <= hi):
+            break
+        step(state, mem)
+        done += 1
+    return done
@@ -0,0 +1,110 @@
+import random
+
+import pytest
+
+from emu import run
+from emu.cpu_state import reset_state
+from emu.faults import FaultCode
+from emu.memory import MAX_MEM_SIZE, MEM_SIZE, Memory, PagedMemory, new_memory
+from emu.runner import ENGINES
+
+from .test_helpers import instr
+from .test_translator import _random_program, _snapshot
+
+MOV_RI     = 0x01
+MOV_RR     = 0x02
+SUB        = 0x11
+LOAD8_ABS  = 0x20
+STORE8_ABS = 0x21
+JMP_ABS    = 0x30
+JZ_REL     = 0x33
+PUSH8      = 0x40
+CALL_ABS   = 0x42
+RET        = 0x43
+HALT       = 0x00
+SP_SEL     = 0x10
+
+
+def _high_program(base, stack):
+    """Runs above 64 KiB: a call with its frame at `stack`, then a store and a push."""
+    sub = base + 0x40
+    return b"".join([
+        instr(MOV_RI, 1, 0, 0, stack),            # base+0x00
+        instr(MOV_RR, SP_SEL, 1, 0, 0),
+        instr(MOV_RI, 2, 0, 0, 3),
+        instr(CALL_ABS, 0, 0, 0, sub),
+        instr(STORE8_ABS, 0, 2, 0, base + 0x1000),  # base+0x20
+        instr(PUSH8, 0, 2, 0, 0),
+        instr(HALT),
+        instr(HALT),
+        instr(MOV_RI, 3, 0, 0, 1),                # sub: r2 -= 1 until zero
+        instr(SUB, 2, 2, 3),
+        instr(JZ_REL, 0, 0, 0, 16),
+        instr(JMP_ABS, 0, 0, 0, sub + 8),
+        instr(RET),
+    ])
+
+
+@pytest.mark.parametrize("size", [MEM_SIZE - 1, MEM_SIZE // 2, 3 * MEM_SIZE, 2 * MAX_MEM_SIZE])
+def test_rejects_unsupported_sizes(size):
+    with pytest.raises(ValueError):
+        Memory.blank(size)
+    with pytest.raises(ValueError):
+        PagedMemory.blank(size)
+
+
+def test_bounds_follow_size():
+    mem = new_memory(2 * MEM_SIZE)
+    assert isinstance(mem, PagedMemory) and (mem.size, mem.top) == (0x20000, 0x1FFFF)
+    mem.write_u8(0x1FFFF, 1)
+    with pytest.raises(IndexError):
+        mem.write_u8(0x20000, 1)
+    assert type(new_memory()) is Memory
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_store_past_64k_faults_only_in_small_memory(engine):
+    prog = instr(MOV_RI, 1, 0, 0, 7) + instr(STORE8_ABS, 0, 1, 0, 0x12345) + instr(HALT)
+    for size, fault in ((MEM_SIZE, FaultCode.MEM_OOB), (2 * MEM_SIZE, None)):
+        mem, st = new_memory(size), reset_state()
+        mem.load(0, prog)
+        run(st, mem, 10, engine=engine)
+        assert st.halted and st.fault_code is fault
+        if fault is None:
+            assert mem.read_u8(0x12345) == 7
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("size", [1 << 20, MAX_MEM_SIZE])
+def test_program_runs_high_in_large_space(engine, size):
+    base = 0x7FFF0000 if size == MAX_MEM_SIZE else 0x80000
+    mem, st = PagedMemory.blank(size), reset_state()
+    stack = min(mem.top, 0x7FFFFFFF)  # highest SP an imm32 reaches, 7 mod 8 for CALL
+    mem.load(base, _high_program(base, stack))
+    st.pc = base
+    res = run(st, mem, 1000, engine=engine)
+    assert res.halt_reason.value == "NORMAL" and st.fault_code is None
+    assert st.pc == base + 0x30
+    assert mem.read_u8(base + 0x1000) == 0
+    assert st.sp == stack - 1 and mem.read_u8(stack) == 0
+    # Code, data and the stack page.
+    assert len(mem.dirty_pages()) == 3
+
+
+@pytest.mark.parametrize("engine", ["translate", "interp"])
+def test_engines_match_step_in_larger_space(engine):
+    rng = random.Random(14)
+    for _ in range(100):
+        prog = _random_program(rng, 24, 0x200)
+        results = []
+        for eng in ("step", engine):
+            mem, st = new_memory(4 * MEM_SIZE), reset_state()
+            mem.load(0x200, prog)
+            st.pc = 0x200
+            try:
+                res = run(st, mem, 300, engine=eng)
+            except IndexError as exc:
+                results.append(repr(exc))
+                continue
+            results.append((res.steps, _snapshot(st, mem)))
+        assert results[0] == results[1]
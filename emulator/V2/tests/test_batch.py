@@ -0,0 +1,67 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from emu import run_batch
+from emu.batch import BatchJob, reg_hash, run_job
+from emu.cli import main
+
+from .test_helpers import instr
+
+HALT   = 0x00
+MOV_RI = 0x01
+JMP_ABS= 0x30
+
+PROGRAMS = {
+    "ok.bin": instr(MOV_RI, 3, 0, 0, 7) + instr(HALT),
+    "fault.bin": instr(0x7F),
+    "loop.bin": instr(JMP_ABS, 0, 0, 0, 0),
+    "empty.bin": b"",
+}
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    for name, blob in PROGRAMS.items():
+        (tmp_path / name).write_bytes(blob)
+    (tmp_path / "notes.txt").write_text("not a program")
+    return tmp_path
+
+
+def _by_name(results):
+    return {Path(r.path).name: r for r in results}
+
+
+def test_run_job_reports_halt_fault_steps_pc_and_reg_hash(corpus):
+    res = run_job(BatchJob(str(corpus / "ok.bin")))
+    assert (res.halt_reason, res.fault_code, res.steps, res.pc) == ("NORMAL", None, 2, 8)
+    assert res.reg_hash == reg_hash([0, 0, 0, 7] + [0] * 12)
+    res = run_job(BatchJob(str(corpus / "fault.bin")))
+    assert (res.halt_reason, res.fault_code, res.steps) == ("FAULT", "ILLEGAL_OPCODE", 1)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_batch_covers_every_program(corpus, workers):
+    paths = [corpus / name for name in PROGRAMS]
+    got = _by_name(run_batch(paths, max_steps=50, workers=workers))
+    assert got.keys() == PROGRAMS.keys()
+    assert got["loop.bin"].halt_reason == "NONE" and got["loop.bin"].steps == 50
+    assert got["empty.bin"].halt_reason == "ERROR"
+    assert "empty" in got["empty.bin"].error
+
+
+def test_cli_batch_streams_ndjson(corpus, capsys):
+    code = main(["batch", str(corpus), "--workers", "2", "--max-steps", "20"])
+    lines = capsys.readouterr().out.splitlines()
+    rows = {Path(json.loads(line)["path"]).name: json.loads(line) for line in lines}
+    assert sorted(rows) == sorted(PROGRAMS)
+    assert rows["ok.bin"]["halt_reason"] == "NORMAL"
+    assert rows["fault.bin"]["fault_code"] == "ILLEGAL_OPCODE"
+    assert code == 1
+
+
+def test_cli_batch_all_normal_exit_code(corpus, tmp_path):
+    out = tmp_path / "out.ndjson"
+    assert main(["batch", str(corpus / "ok.bin"), "--workers", "1", "--output", str(out)]) == 0
+    assert json.loads(out.read_text())["steps"] == 2
@@ -0,0 +1,80 @@
+import importlib.util
+import json
+
+import pytest
+
+from emu.bench import INSTRUMENTED, WORKLOADS, BenchResult, compare, main, run_suite
+from emu.runner import ENGINES
+
+
+def test_workloads_agree_across_engines():
+    results = run_suite(list(WORKLOADS), list(ENGINES), 5_000, repeat=1, isolate=False)
+    assert len(results) == len(WORKLOADS) * len(ENGINES)
+    for res in results:
+        assert 4_000 < res.instructions <= 5_010 and res.seconds > 0 and res.ips > 0
+
+
+def test_instrumented_runs_retire_the_same_instructions():
+    modes = [m for m in INSTRUMENTED if m != "cachesim" or importlib.util.find_spec("numpy")]
+    results = run_suite(["mixed", "console"], ["step", *modes], 2_000, repeat=1, isolate=False)
+    assert [r.engine for r in results[: len(modes) + 1]] == ["step", *modes]
+    assert {r.instructions for r in results if r.workload == "mixed"} == {9 * (2_000 // 9) + 2}
+
+
+def test_isolated_measurement():
+    (res,) = run_suite(["countdown"], ["translate"], 3_000, repeat=1)
+    assert res.instructions == 3_002
+    assert res.peak_rss_kib is None or res.peak_rss_kib > 0
+
+
+def test_compare_threshold():
+    results = [BenchResult("alu", "step", 1000, 1.0, None), BenchResult("stack", "step", 1000, 1.0, None)]
+    baseline = {"results": [
+        {"workload": "alu", "engine": "step", "ips": 1100.0},
+        {"workload": "stack", "engine": "step", "ips": 1050.0},
+        {"workload": "memcopy", "engine": "step", "ips": 1.0},
+    ]}
+    rows = compare(results, baseline, threshold=0.07)
+    assert [(r.workload, round(ratio, 3), bad) for r, ratio, bad in rows] == [
+        ("alu", 0.909, True), ("stack", 0.952, False),
+    ]
+
+
+@pytest.mark.parametrize("base_ips, code", [(1.0, 0), (1e12, 1)])
+def test_cli_out_and_baseline(tmp_path, capsys, base_ips, code):
+    out = tmp_path / "bench.json"
+    argv = ["--workload", "alu", "--engine", "translate", "--steps", "2000", "--repeat", "1", "--in-process"]
+    assert main(argv + ["--out", str(out)]) == 0
+    saved = json.loads(out.read_text())
+    (row,) = saved["results"]
+    assert row["workload"] == "alu" and row["instructions"] > 0 and {"ips", "ns_per_instr"} <= set(row)
+
+    row["ips"] = base_ips
+    out.write_text(json.dumps(saved))
+    assert main(argv + ["--baseline", str(out)]) == code
+    text = capsys.readouterr().out
+    assert ("REGRESSION" in text) == bool(code)
+
+
+def test_default_baseline(tmp_path, monkeypatch, capsys):
+    import emu.bench
+
+    base = tmp_path / "baseline.json"
+    rows = [{"workload": "countdown", "engine": "step", "ips": 1e12}]
+    base.write_text(json.dumps({"steps": 1500, "results": rows}))
+    monkeypatch.setattr(emu.bench, "DEFAULT_BASELINE", base)
+    argv = ["--workload", "countdown", "--engine", "step", "--repeat", "1", "--in-process"]
+    assert main(argv + ["--steps", "1500"]) == 1
+    assert main(argv + ["--steps", "1500", "--no-baseline"]) == 0
+    assert main(argv + ["--steps", "3000"]) == 0  # recorded with other --steps: not compared
+    assert "REGRESSION" in capsys.readouterr().out
+    with pytest.raises(SystemExit):
+        main(argv + ["--steps", "3000", "--baseline", str(base)])
+
+
+def test_committed_baseline_covers_the_suite():
+    from emu.bench import DEFAULT_BASELINE, DEFAULT_STEPS
+
+    doc = json.loads(DEFAULT_BASELINE.read_text())
+    assert doc["steps"] == DEFAULT_STEPS
+    assert {(r["workload"], r["engine"]) for r in doc["results"]} == {(w, e) for w in WORKLOADS for e in ENGINES}
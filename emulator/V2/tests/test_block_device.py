@@ -0,0 +1,146 @@
+import pytest
+
+from emu import BlockDevice, run
+from emu.cpu_state import reset_state
+from emu.devices import BLOCK_BASE, SECTOR_SIZE
+from emu.memory import PagedMemory
+from emu.runner import ENGINES
+
+from .test_helpers import instr, make_mem
+
+MOV_RI     = 0x01
+LOAD8_ABS  = 0x20
+STORE8_ABS = 0x21
+HALT       = 0x00
+
+
+def _image(tmp_path, sectors=8):
+    path = tmp_path / "disk.img"
+    path.write_bytes(b"".join(bytes([i]) * SECTOR_SIZE for i in range(sectors)))
+    return path
+
+
+def _set_reg(off, value, width):
+    """Guest code storing `value` little-endian into a device register."""
+    out = []
+    for i in range(width):
+        out += [instr(MOV_RI, 1, 0, 0, (value >> (8 * i)) & 0xFF), instr(STORE8_ABS, 0, 1, 0, BLOCK_BASE + off + i)]
+    return b"".join(out)
+
+
+def _command(cmd, sector, addr, count):
+    return b"".join([
+        _set_reg(BlockDevice.SECTOR, sector, 4),
+        _set_reg(BlockDevice.ADDR, addr, 4),
+        _set_reg(BlockDevice.COUNT, count, 1),
+        _set_reg(BlockDevice.CMD, cmd, 1),
+        instr(LOAD8_ABS, 7, 0, 0, BLOCK_BASE + BlockDevice.STATUS),
+    ])
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_guest_reads_sectors_and_runs_them(engine, tmp_path):
+    path = tmp_path / "boot.img"
+    payload = instr(MOV_RI, 4, 0, 0, 0x1234) + instr(HALT)
+    path.write_bytes(bytes(SECTOR_SIZE) + payload.ljust(SECTOR_SIZE, b"\0"))
+    disk = BlockDevice(path)
+    # Load sector 1 over the HALT after the command, then run it.
+    target = len(_command(BlockDevice.CMD_READ, 0, 0, 0)) + 8
+    prog = _command(BlockDevice.CMD_READ, 1, target, 1) + instr(MOV_RI, 4, 0, 0, 1) + instr(HALT)
+    mem, st = make_mem(prog), reset_state()
+    disk.attach(mem)
+    run(st, mem, 1000, engine=engine)
+    assert st.halted and st.fault_code is None
+    assert st.regs[7] == BlockDevice.STATUS_OK
+    assert st.regs[4] == 0x1234
+    disk.close()
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_guest_writes_sectors(engine, tmp_path):
+    path = _image(tmp_path)
+    disk = BlockDevice(path, writable=True)
+    prog = _command(BlockDevice.CMD_READ, 2, 0x4000, 3) + _command(BlockDevice.CMD_WRITE, 5, 0x4000, 3) + instr(HALT)
+    mem, st = make_mem(prog), reset_state()
+    disk.attach(mem)
+    run(st, mem, 1000, engine=engine)
+    assert st.halted and st.regs[7] == BlockDevice.STATUS_OK
+    assert mem.read_slice(0x4000, 3 * SECTOR_SIZE) == bytes([2] * 512 + [3] * 512 + [4] * 512)
+    disk.close()
+    data = path.read_bytes()
+    assert data[5 * SECTOR_SIZE:] == bytes([2] * 512 + [3] * 512 + [4] * 512)
+
+
+def test_invalid_commands_set_error_status(tmp_path):
+    disk = BlockDevice(_image(tmp_path, sectors=4))
+    mem = PagedMemory.blank()
+    disk.attach(mem)
+    before = mem.dirty_pages()
+    assert mem.read_u8(BLOCK_BASE + BlockDevice.CAPACITY) == 4
+    for cmd, sector, addr, count in [
+        (BlockDevice.CMD_READ, 3, 0x1000, 2),       # past the end of the image
+        (BlockDevice.CMD_READ, 0, 0xFF01, 1),        # past the end of memory
+        (BlockDevice.CMD_WRITE, 0, 0x1000, 1),      # read-only image
+        (7, 0, 0x1000, 1),                          # unknown command
+    ]:
+        assert not disk.transfer(cmd, sector, addr, count)
+    mem.write_u8(BLOCK_BASE + BlockDevice.COUNT, 9)
+    mem.write_u8(BLOCK_BASE + BlockDevice.CMD, BlockDevice.CMD_READ)
+    assert mem.read_u8(BLOCK_BASE + BlockDevice.STATUS) == BlockDevice.STATUS_ERROR
+    assert mem.dirty_pages() == before + [0xFF]  # only the register page
+    disk.close()
+    assert not mem.devices
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_read_over_device_registers_is_rejected(engine, tmp_path):
+    # A READ landing on the register window would store to CMD again and
+    # recurse; it must fail without touching memory instead.
+    path = tmp_path / "regs.img"
+    path.write_bytes(bytes([BlockDevice.CMD_READ]) * SECTOR_SIZE)
+    disk = BlockDevice(path)
+    prog = _command(BlockDevice.CMD_READ, 0, 0xFD00, 1) + _command(BlockDevice.CMD_READ, 0, 0xFE00, 1) + instr(HALT)
+    mem, st = make_mem(prog), reset_state()
+    disk.attach(mem)
+    run(st, mem, 1000, engine=engine)
+    assert st.halted and st.fault_code is None
+    assert st.regs[7] == BlockDevice.STATUS_ERROR
+    assert mem.read_slice(0xFD00, SECTOR_SIZE) == bytes([BlockDevice.CMD_READ]) * SECTOR_SIZE
+    assert mem.data[0xFF20:0x10000] == bytes(0xE0)  # the second READ moved nothing
+    disk.close()
+
+
+def test_rejects_tiny_images(tmp_path):
+    path = tmp_path / "tiny.img"
+    path.write_bytes(b"x" * 100)
+    with pytest.raises(ValueError):
+        BlockDevice(path)
+
+
+def test_large_image_is_mapped_not_read(tmp_path):
+    path = tmp_path / "big.img"
+    with open(path, "wb") as f:
+        f.truncate(256 << 20)  # sparse: nothing to read up front
+        f.seek((256 << 20) - SECTOR_SIZE)
+        f.write(b"tail")
+    disk = BlockDevice(path)
+    assert disk.sectors == (256 << 20) // SECTOR_SIZE
+    mem = make_mem(b"")
+    disk.attach(mem)
+    assert disk.transfer(BlockDevice.CMD_READ, disk.sectors - 1, 0x2000, 1)
+    assert mem.read_slice(0x2000, 4) == b"tail"
+    disk.close()
+
+
+def test_cli_attaches_disk(tmp_path, capsys):
+    from emu.cli import main
+
+    path = _image(tmp_path)
+    prog = tmp_path / "copy.bin"
+    prog.write_bytes(
+        _command(BlockDevice.CMD_READ, 6, 0x4000, 1) + _command(BlockDevice.CMD_WRITE, 0, 0x4000, 1) + instr(HALT)
+    )
+    assert main(["run", "--bin", str(prog), "--disk", str(path), "--disk-writable"]) == 0
+    assert path.read_bytes()[:SECTOR_SIZE] == bytes([6]) * SECTOR_SIZE
+    assert main(["run", "--bin", str(prog), "--disk", str(path), "--dump-regs"]) == 0
+    assert "R07=0000000000000001" in capsys.readouterr().out  # read-only: write fails
@@ -0,0 +1,115 @@
+import json
+import random
+from collections import OrderedDict
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from emu import run
+from emu.cachesim import Cache, CacheConfig, CacheSim, heatmap, parse_levels
+from emu.cli import main
+from emu.cpu_state import reset_state
+
+from .test_helpers import make_mem
+from .test_hooks import FRAME, PROG
+
+
+def _reference(cfg, addrs):
+    """Per-access LRU, one OrderedDict per set."""
+    sets = [OrderedDict() for _ in range(cfg.sets)]
+    out = []
+    for a in addrs:
+        line = a // cfg.line
+        s = sets[line % cfg.sets]
+        out.append(line not in s)
+        if line in s:
+            s.move_to_end(line)
+        else:
+            s[line] = None
+            if len(s) > cfg.ways:
+                s.popitem(last=False)
+    return out
+
+
+@pytest.mark.parametrize("seed", range(6))
+@pytest.mark.parametrize("geometry", [(1024, 16, 4), (256, 8, 1), (512, 64, 8), (4096, 32, 2)])
+def test_matches_reference_lru(seed, geometry):
+    rng = random.Random(seed)
+    cfg = CacheConfig("X", *geometry)
+    hot = [rng.randrange(1 << 16) for _ in range(12)]
+    addrs = [rng.choice([rng.randrange(1 << 14), rng.choice(hot), rng.randrange(512)]) for _ in range(4000)]
+    addrs[1000:1400] = [hot[i % 3] for i in range(400)]  # long stretch of few lines
+    cache = Cache(cfg)
+    cuts = sorted(rng.sample(range(1, len(addrs)), 3))
+    got = np.concatenate([
+        cache.access(np.array(addrs[a:b], dtype=np.int64)) for a, b in zip([0] + cuts, cuts + [len(addrs)])
+    ])
+    assert got.tolist() == _reference(cfg, addrs)
+    assert cache.misses == sum(got) and cache.accesses == len(addrs)
+
+
+def test_hierarchy_feeds_l2_with_l1_misses():
+    small = CacheConfig("L1I", 128, 16, 2), CacheConfig("L1D", 128, 16, 2), CacheConfig("L2", 1024, 16, 4)
+    sim = CacheSim(*small)
+    rng = random.Random(7)
+    addrs = np.array([rng.randrange(4096) for _ in range(3000)], dtype=np.int64)
+    kinds = np.array([rng.randrange(3) for _ in range(3000)], dtype=np.int8)
+    sim.record(addrs, kinds)
+    assert sim.l2.accesses == sim.l1i.misses + sim.l1d.misses
+    assert sim.l1i.accesses == int((kinds == 0).sum())
+
+    # L2 sees the L1 misses in program order.
+    l1i, l1d, l2 = (Cache(c) for c in small)
+    imiss = l1i.access(addrs[kinds == 0])
+    dmiss = l1d.access(addrs[kinds != 0])
+    order = np.sort(np.concatenate([np.flatnonzero(kinds == 0)[imiss], np.flatnonzero(kinds != 0)[dmiss]]))
+    l2.access(addrs[order])
+    assert l2.misses == sim.l2.misses
+
+
+@pytest.mark.parametrize("batch", [1, 5, 1 << 20])
+def test_guest_run(batch):
+    sim = CacheSim(batch=batch)
+    res = run(reset_state(), make_mem(PROG), 1000, hooks=sim.hooks())
+    sim.flush()
+    assert res.halted
+    rep = sim.report()
+    assert rep["levels"]["L1I"]["accesses"] == res.steps
+    # Per loop pass: CALL frame write, STORE8, PUSH8 / LOAD8, POP8, RET frame read.
+    assert rep["levels"]["L1D"]["accesses"] == 2 * 6
+    assert rep["pages"] == {
+        "0": {"fetch": res.steps, "read": 0, "write": 0},
+        "8": {"fetch": 0, "read": 2, "write": 2},
+        str(FRAME >> 8): {"fetch": 0, "read": 4, "write": 4},
+    }
+    # Cold misses only: 2 code lines, the data line and the stack line.
+    assert rep["levels"]["L1I"]["misses"] == 2 and rep["levels"]["L1D"]["misses"] == 2
+    assert rep["levels"]["L2"]["accesses"] == 4
+
+
+def test_config_parsing():
+    assert CacheConfig.parse("L1D", "16K:32:4") == CacheConfig("L1D", 16384, 32, 4)
+    assert CacheConfig.parse("L2", "1M").size == 1 << 20
+    l1i, l1d, l2 = parse_levels(l1d="8K:64:2", l2="none")
+    assert l1i.size == 32 << 10 and l1d.ways == 2 and l2 is None
+    for bad in ("3K:64:8", "32K:4:8", "32K:48:8", "1:2:3:4"):
+        with pytest.raises(ValueError):
+            Cache(CacheConfig.parse("X", bad))
+
+
+def test_heatmap_rows():
+    rows = heatmap({0: [100, 0, 0], 3: [0, 1, 0], 0x21: [0, 0, 10]})
+    assert rows == ["    0x00000000 |@  .            |", "    0x00002000 | +              |"]
+
+
+def test_cli_cache_sim(tmp_path, capsys):
+    prog = tmp_path / "p.bin"
+    prog.write_bytes(PROG)
+    out = tmp_path / "cache.json"
+    argv = ["run", "--bin", str(prog), "--cache-l1d", "1K:16:2", "--cache-l2", "none", "--cache-out", str(out)]
+    assert main(argv) == 0
+    rep = json.loads(out.read_text())
+    assert list(rep["levels"]) == ["L1I", "L1D"] and rep["levels"]["L1D"]["line"] == 16
+    text = capsys.readouterr().out
+    assert "[CACHE]" in text and "L1D  1K/16B/2-way" in text and "heatmap" in text
@@ -0,0 +1,39 @@
+import pytest
+
+from emu.cpu_state import reset_state
+from emu.executor_v2 import step
+from emu.faults import FaultCode
+
+from .test_helpers import instr, make_mem
+
+CALL_ABS = 0x42
+RET = 0x43
+
+
+def test_call_writes_return_pc_lsb_at_sp_and_ret_reads_it_back():
+    mem = make_mem(instr(CALL_ABS, 0, 0, 0, 0x1238), start=0x1230)
+    mem.load(0x1238, instr(RET))
+    st = reset_state()
+    st.pc = 0x1230
+    step(st, mem)
+    assert st.sp == 0xFDFF - 8
+    assert bytes(mem.data[0xFDF8:0xFE00]) == bytes([0, 0, 0, 0, 0, 0, 0x12, 0x38])
+    assert st.pc == 0x1238
+    step(st, mem)
+    assert (st.pc, st.sp) == (0x1238, 0xFDFF)
+
+
+@pytest.mark.parametrize("op,sp,code", [
+    (CALL_ABS, 0xFDFE, FaultCode.MISALIGNED),
+    (CALL_ABS, 0x0006, FaultCode.MISALIGNED),
+    (CALL_ABS, -1, FaultCode.MEM_OOB),
+    (RET, 0xFDFE, FaultCode.MISALIGNED),
+    (RET, 0xFFFF, FaultCode.MEM_OOB),
+])
+def test_frame_bounds_and_alignment_faults(op, sp, code):
+    mem = make_mem(instr(op, 0, 0, 0, 0x100 if op == CALL_ABS else 0))
+    st = reset_state()
+    st.sp = sp
+    step(st, mem)
+    assert st.fault_code == code
+    assert st.sp == sp
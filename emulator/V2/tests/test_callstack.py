@@ -0,0 +1,110 @@
+import json
+
+import pytest
+
+from emu import run
+from emu.callstack import CallStackProfiler, SymbolTable, load_symbols
+from emu.cli import main
+from emu.cpu_state import reset_state
+
+from .test_helpers import instr, make_mem
+
+HALT     = 0x00
+MOV_RI   = 0x01
+ADD      = 0x10
+CALL_ABS = 0x42
+RET      = 0x43
+
+# main (0x00) calls f (0x40) twice; f calls g (0x80) once.
+PROG = b"".join([
+    instr(CALL_ABS, 0, 0, 0, 0x40),  # 0x00
+    instr(CALL_ABS, 0, 0, 0, 0x40),  # 0x08
+    instr(HALT),                     # 0x10
+]).ljust(0x40, b"\0") + b"".join([
+    instr(ADD, 1, 1, 1),             # 0x40 f
+    instr(CALL_ABS, 0, 0, 0, 0x80),  # 0x48
+    instr(RET),                      # 0x50
+]).ljust(0x40, b"\0") + b"".join([
+    instr(ADD, 2, 2, 2),             # 0x80 g
+    instr(ADD, 2, 2, 2),             # 0x88
+    instr(RET),                      # 0x90
+])
+
+SYMBOLS = {"main": 0x00, "f": 0x40, "g": 0x80, "g_tail": 0x88}
+
+
+def _profile(program, symbols=None, engine="translate"):
+    prof = CallStackProfiler(entry=0, symbols=symbols)
+    res = run(reset_state(), make_mem(program), 10_000, engine=engine, hooks=prof.hooks())
+    prof.finish()
+    return prof, res
+
+
+def test_collapsed_stacks():
+    prof, res = _profile(PROG)
+    assert res.halted and sum(prof.counts.values()) == res.steps == 3 + 2 * (3 + 3)
+    assert prof.collapsed() == "0x0000 3\n0x0000;0x0040 6\n0x0000;0x0040;0x0080 6\n"
+    assert prof.frames == [(0, -1)]
+
+
+def test_symbols_and_functions():
+    prof, _ = _profile(PROG, SYMBOLS)
+    assert prof.collapsed().splitlines() == ["main 3", "main;f 6", "main;f;g 6"]
+    assert prof.functions() == [("main", 3, 15), ("f", 6, 12), ("g", 6, 6)]
+
+
+def test_symbol_resolution():
+    table = SymbolTable({"b": 0x10, "a": 0x10, "c": 0x40})
+    assert [table.resolve(x) for x in (0x08, 0x10, 0x18, 0x40, 0x48)] == [
+        "0x0008", "a", "a+0x8", "c", "c+0x8",
+    ]
+
+
+def test_recursion_counts_total_once():
+    # r1 = 3; rec: r1 -= 1; if r1 == 0 return; call rec
+    prog = b"".join([
+        instr(MOV_RI, 1, 0, 0, 3),       # 0x00
+        instr(MOV_RI, 2, 0, 0, -1),      # 0x08
+        instr(CALL_ABS, 0, 0, 0, 0x20),  # 0x10
+        instr(HALT),                     # 0x18
+        instr(ADD, 1, 1, 2),             # 0x20 rec
+        instr(0x32, 0, 0, 0, 0x38),      # 0x28 JZ_ABS -> RET
+        instr(CALL_ABS, 0, 0, 0, 0x20),  # 0x30
+        instr(RET),                      # 0x38
+    ])
+    prof, res = _profile(prog, {"main": 0, "rec": 0x20})
+    assert res.halted
+    lines = prof.collapsed().splitlines()
+    assert lines == ["main 4", "main;rec 4", "main;rec;rec 4", "main;rec;rec;rec 3"]
+    assert ("rec", 11, 11) in prof.functions()
+
+
+def test_ret_to_unknown_address_keeps_stack():
+    prof = CallStackProfiler(entry=0)
+    prof._on_call(0x00, 0x40)
+    prof._on_call(0x48, 0x80)
+    prof._on_ret(0x90, 0x1234)  # not a return address on the shadow stack
+    assert [f for f, _ in prof.frames] == [0, 0x40, 0x80]
+    prof._on_ret(0x90, 0x08)  # unwinds both frames at once
+    assert prof.frames == [(0, -1)]
+
+
+@pytest.mark.parametrize("engine", ["translate", "interp"])
+def test_cli_callstack(tmp_path, capsys, engine):
+    prog = tmp_path / "p.bin"
+    prog.write_bytes(PROG)
+    syms = tmp_path / "p.sym.json"
+    syms.write_text(json.dumps(SYMBOLS))
+    out = tmp_path / "p.folded"
+    argv = ["run", "--bin", str(prog), "--engine", engine, "--callstack-out", str(out), "--symbols", str(syms)]
+    assert main(argv) == 0
+    assert out.read_text() == "main 3\nmain;f 6\nmain;f;g 6\n"
+    text = capsys.readouterr().out
+    assert "[CALLSTACK] 3 stacks" in text and "self=6" in text
+
+
+def test_load_symbols_rejects_bad_files(tmp_path):
+    bad = tmp_path / "bad.json"
+    bad.write_text("[1, 2]")
+    with pytest.raises(ValueError):
+        load_symbols(bad)
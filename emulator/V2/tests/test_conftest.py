@@ -1,3 +1,4 @@
+import functools
 import inspect
 import pytest
 # We try to adapt to small API differences in the student's emulator implementation.
@@ -21,9 +22,14 @@ def _import_step():
     raise ImportError(f"Could not import step() from any executor module {candidates}. Last error: {last_err}")
 
 
-@pytest.fixture(scope="session")
-def step_fn():
-    return _import_step()
+@pytest.fixture(scope="session", params=["run", "step"])
+def step_fn(request):
+    # "run": run_steps() batches through emu.run(); "step": a wrapper, so
+    # run_steps() calls step() once per instruction, as the original harness did.
+    step = _import_step()
+    if request.param == "step":
+        return functools.wraps(step)(lambda *args: step(*args))
+    return step
 
 @pytest.fixture(scope="function")
 def state():
@@ -45,6 +51,14 @@ def run_steps(step_fn, state, mem, max_steps=10_000):
     Works with step(mem), step(state, mem), or step(mem, state) call signatures.
     Returns the final state.
     """
+    batched = _batched_run(step_fn)
+    if batched is not None:
+        # One run() call instead of a Python-level step() per instruction.
+        batched(state, mem, max_steps)
+        if _is_halted_or_faulted(state):
+            return state
+        raise RuntimeError("Program did not halt/fault within max_steps")
+
     sig = inspect.signature(step_fn)
     params = list(sig.parameters)
     def call_step():
@@ -69,6 +83,16 @@ def run_steps(step_fn, state, mem, max_steps=10_000):
             return state
     raise RuntimeError("Program did not halt/fault within max_steps")
 
+def _batched_run(step_fn):
+    # The emu package's step() has a batched counterpart, emu.run().
+    try:
+        import emu
+    except Exception:
+        return None
+    if step_fn is getattr(emu, "step", None) and hasattr(emu, "run"):
+        return emu.run
+    return None
+
 def _is_halted_or_faulted(state, step_result=None):
     # Prefer step_result if it looks like an enum with names.
     # Otherwise check common state attributes.
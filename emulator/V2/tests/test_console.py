@@ -0,0 +1,75 @@
+import io
+
+import pytest
+
+from emu import Console, run
+from emu.cli import main
+from emu.cpu_state import reset_state
+from emu.devices import CONSOLE_BASE
+from emu.memory import Memory
+from emu.runner import ENGINES
+
+from .test_helpers import instr, make_mem
+
+MOV_RI     = 0x01
+STORE8_ABS = 0x21
+HALT       = 0x00
+
+
+def _print(text, port=CONSOLE_BASE, halt=True):
+    out = []
+    for ch in text:
+        out += [instr(MOV_RI, 1, 0, 0, ch), instr(STORE8_ABS, 0, 1, 0, port)]
+    return b"".join(out + ([instr(HALT)] if halt else []))
+
+
+class Sink(io.BytesIO):
+    """Records the size of every host write."""
+
+    def __init__(self):
+        super().__init__()
+        self.writes = []
+
+    def write(self, b):
+        self.writes.append(bytes(b))
+        return super().write(b)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_flushes_per_line_and_on_halt(engine):
+    sink = Sink()
+    mem, st = make_mem(_print(b"hello\nworld\nbye")), reset_state()
+    Console(sink).attach(mem)
+    run(st, mem, 24, engine=engine)  # through the second newline
+    assert sink.writes == [b"hello\n", b"world\n"]  # still running
+    run(st, mem, 1000, engine=engine)
+    assert st.halted and sink.writes == [b"hello\n", b"world\n", b"bye"]
+
+
+def test_flushes_when_full_and_on_register_write():
+    sink = Sink()
+    prog = _print(b"abcdefg", halt=False) + _print(b"\x00", port=CONSOLE_BASE + Console.FLUSH)
+    mem, st = make_mem(prog), reset_state()
+    Console(sink, bufsize=3).attach(mem)
+    run(st, mem, 1000)
+    assert sink.writes == [b"abc", b"def", b"g"]
+    assert mem.read_u8(CONSOLE_BASE) == 0  # registers read as zero
+
+
+def test_no_console_leaves_ram_stores():
+    mem, st = make_mem(_print(b"A")), reset_state()
+    run(st, mem, 10)
+    assert isinstance(mem, Memory) and mem.read_u8(CONSOLE_BASE) == ord("A")
+
+
+def test_cli_console_to_stdout_and_file(tmp_path, capsys):
+    prog = tmp_path / "hello.bin"
+    prog.write_bytes(_print(b"hi there\n"))
+    assert main(["run", "--bin", str(prog), "--console", "-"]) == 0
+    out = capsys.readouterr().out
+    assert out.startswith("hi there\n[HALT] Normal.")
+
+    target = tmp_path / "console.txt"
+    assert main(["run", "--bin", str(prog), "--console", str(target), "--engine", "interp"]) == 0
+    assert target.read_bytes() == b"hi there\n"
+    assert "hi there" not in capsys.readouterr().out
@@ -0,0 +1,37 @@
+import pytest
+
+from emu.decoder import DecodedInstr, decode_at, decode_instruction, encode_instruction
+from emu.memory import Memory
+
+from .test_helpers import instr, make_mem
+
+
+def test_decode_at_reads_fields_in_place():
+    mem = make_mem(instr(0x01, 3, 0, 0, 0x1234) + instr(0x33, 0, 0, 0, -16), start=0x0100)
+    assert decode_at(mem.data, 0x0100) == (0x01, 3, 0, 0, 0x1234)
+    assert decode_at(mem.data, 0x0108) == (0x33, 0, 0, 0, -16)
+    assert decode_at(memoryview(mem.data), 0x0108) == (0x33, 0, 0, 0, -16)
+
+
+def test_decode_instruction_wraps_decode_at():
+    raw = instr(0x10, 1, 2, 3, -1)
+    assert decode_instruction(raw) == DecodedInstr(opcode=0x10, rd=1, ra=2, rb=3, imm32=-1)
+    assert decode_instruction(bytearray(raw)) == DecodedInstr(*decode_at(raw))
+
+
+def test_encode_instruction_matches_the_test_encoder():
+    for args in [(0x01, 3, 0, 0, 0x1234), (0x33, 0, 0, 0, -16), (0x21, 0, 1, 0, 0xFFFFFFFF), (0x43,)]:
+        assert encode_instruction(*args) == instr(*args)
+    assert decode_instruction(encode_instruction(0x31, imm32=0x80000000)).imm32 == -(1 << 31)
+
+
+def test_decode_instruction_requires_eight_bytes():
+    with pytest.raises(ValueError):
+        decode_instruction(b"\x00" * 7)
+
+
+def test_read_slice_still_returns_bytes():
+    mem = Memory.blank()
+    mem.load(0x10, b"\x01\x02\x03")
+    blob = mem.read_slice(0x10, 3)
+    assert type(blob) is bytes and blob == b"\x01\x02\x03"
@@ -0,0 +1,28 @@
+import pytest
+
+from emu.cpu_state import reset_state, HaltReason
+from emu.faults import FaultCode
+from emu.executor_v2 import _DISPATCH, _op_illegal, step
+
+from .test_helpers import instr, make_mem
+
+DEFINED = {0x00, 0x01, 0x02, 0x10, 0x11, 0x12, 0x20, 0x21, 0x30, 0x31, 0x32, 0x33, 0x40, 0x41, 0x42, 0x43}
+
+
+def test_table_covers_every_opcode_byte():
+    assert len(_DISPATCH) == 256
+    for op in range(256):
+        assert (_DISPATCH[op] is _op_illegal) == (op not in DEFINED)
+
+
+@pytest.mark.parametrize("op", [0x03, 0x13, 0x44, 0x7F, 0xFF])
+def test_reserved_opcode_faults_illegal_opcode(op):
+    mem = make_mem(instr(op, 1, 2, 3, 4))
+    st = reset_state()
+
+    step(st, mem)
+    assert st.halted is True
+    assert st.halt_reason == HaltReason.FAULT
+    fi = st.fault_info
+    assert fi.code == FaultCode.ILLEGAL_OPCODE
+    assert (fi.pc, fi.opcode, fi.rd, fi.ra, fi.rb, fi.imm32) == (0, op, 1, 2, 3, 4)
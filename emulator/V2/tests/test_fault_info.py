@@ -0,0 +1,62 @@
+import pytest
+
+from emu import run
+from emu.cpu_state import reset_state
+from emu.executor_v2 import step
+from emu.faults import FaultCode, FaultInfo
+from emu.runner import ENGINES
+
+from .test_helpers import instr, make_mem
+
+
+def test_fault_records_code_and_pc_and_builds_info_on_read():
+    mem = make_mem(instr(0x01, 0, 0, 0, 1) + instr(0x10, 1, 2, 3, 5))
+    st = reset_state()
+    step(st, mem)
+    step(st, mem)
+    assert st.fault_code == FaultCode.ILLEGAL_ENCODING
+    assert st.fault_pc == 0x08
+    assert st._fault_info is None
+    fi = st.fault_info
+    assert fi == FaultInfo(FaultCode.ILLEGAL_ENCODING, 0x08, 0x10, 1, 2, 3, 5, "ADD requires imm32=0")
+    assert st.fault_info is fi
+
+
+def test_fetch_fault_reports_zero_operands():
+    mem = make_mem(instr(0x10, 1, 2, 3, 0))
+    st = reset_state()
+    st.pc = 0x04
+    step(st, mem)
+    assert st.fault_info == FaultInfo(FaultCode.MISALIGNED, 0x04, 0, 0, 0, 0, 0, "PC not 8-byte aligned")
+
+
+def test_no_fault_reads_none():
+    st = reset_state()
+    step(st, make_mem(instr(0x00)))
+    assert st.fault_code is None
+    assert st.fault_info is None
+
+
+def test_assigning_fault_info_updates_code_and_pc():
+    st = reset_state()
+    info = FaultInfo(FaultCode.MEM_OOB, 0x40, 0x40, 0, 1, 0, 0, "SP underflow")
+    st.fault_info = info
+    assert (st.fault_code, st.fault_pc, st.fault_info) == (FaultCode.MEM_OOB, 0x40, info)
+    st.fault_info = None
+    assert st.fault_code is None and st.fault_info is None
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_fault_info_reports_the_executed_instruction(engine):
+    # The faulting STORE8_ABS overwrites its own opcode byte before the
+    # PC-out-of-range fault; fault_info must still describe the STORE.
+    store = instr(0x21, 0, 1, 0, 0xFFF8)
+    mem = make_mem(instr(0x01, 1, 0, 0, 0x77) + instr(0x30, 0, 0, 0, 0xFFF8))
+    mem.load(0xFFF8, store)
+    st = reset_state()
+    run(st, mem, 10, engine=engine)
+    assert st.fault_code is not None and st.fault_pc == 0xFFF8
+    assert mem.data[0xFFF8] == 0x77
+    mem.data[0xFFF9] = 0x55  # nor may later host writes
+    assert st.fault_info.opcode == 0x21
+    assert (st.fault_info.ra, st.fault_info.imm32) == (1, 0xFFF8)
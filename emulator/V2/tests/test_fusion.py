@@ -0,0 +1,87 @@
+import pytest
+
+from emu import run
+from emu.cpu_state import reset_state
+from emu.executor_v2 import FUSE_CMP_JZ, FUSE_SUB_JZ, step
+from emu.faults import FaultCode
+
+from .test_helpers import instr, make_mem
+from .test_translator import _countdown, _run_step, _snapshot
+
+HALT       = 0x00
+MOV_RI     = 0x01
+SUB        = 0x11
+CMP        = 0x12
+JMP_ABS    = 0x30
+JZ_ABS     = 0x32
+JZ_REL     = 0x33
+
+
+def _interp(prog, max_steps, start=0):
+    mem = make_mem(prog, start=start)
+    st = reset_state()
+    st.pc = start
+    res = run(st, mem, max_steps, engine="interp")
+    return res, (res.steps, _snapshot(st, mem))
+
+
+def test_sub_jz_is_cached_as_one_fused_entry():
+    mem = make_mem(_countdown(3))
+    st = reset_state()
+    for _ in range(3):
+        step(st, mem)
+    assert mem.icache[0x10][0] == FUSE_SUB_JZ
+    assert mem.icache[0x10][6] == 0x28
+    # step() still retires a single instruction per call.
+    assert st.pc == 0x18
+
+
+def test_fused_loop_matches_step_and_counts_hits():
+    prog = _countdown(100)
+    res, got = _interp(prog, 10_000)
+    assert got == _run_step(prog, 0, 10_000)
+    # The first pass goes through step(), which builds the fused entry.
+    assert res.fusion_hits == {"SUB+JZ": 99}
+
+
+@pytest.mark.parametrize("budget", range(1, 12))
+def test_budget_can_stop_between_the_fused_halves(budget):
+    prog = _countdown(3)
+    assert _interp(prog, budget)[1] == _run_step(prog, 0, budget)
+
+
+def test_jump_onto_the_second_half_runs_the_jz_alone():
+    prog = b"".join([
+        instr(MOV_RI, 1, 0, 0, 3),         # 0x00
+        instr(MOV_RI, 2, 0, 0, 1),         # 0x08
+        instr(JMP_ABS, 0, 0, 0, 0x20),     # 0x10 enter the loop at the JZ
+        instr(SUB, 1, 1, 2),               # 0x18
+        instr(JZ_ABS, 0, 0, 0, 0x30),      # 0x20
+        instr(JMP_ABS, 0, 0, 0, 0x18),     # 0x28
+        instr(HALT),                       # 0x30
+    ])
+    res, got = _interp(prog, 100)
+    assert got == _run_step(prog, 0, 100)
+    assert res.fusion_hits == {"SUB+JZ": 2}
+
+
+def test_jz_that_would_fault_is_not_fused():
+    prog = b"".join([instr(CMP, 0, 1, 1), instr(JZ_REL, 0, 0, 0, 0x10000)])
+    mem = make_mem(prog)
+    st = reset_state()
+    step(st, mem)
+    assert mem.icache[0][0] == CMP
+    step(st, mem)
+    assert (st.fault_code, st.fault_pc) == (FaultCode.PC_OOB, 0x08)
+
+
+@pytest.mark.parametrize("start", [0x0100, 0x01F8])
+def test_rewriting_the_jz_drops_the_fused_entry(start):
+    # 0x01F8: the JZ half sits on the next page.
+    mem = make_mem(instr(CMP, 0, 1, 1) + instr(JZ_ABS, 0, 0, 0, 0x40), start=start)
+    st = reset_state()
+    st.pc = start
+    step(st, mem)
+    assert mem.icache[start][0] == FUSE_CMP_JZ
+    mem.write_u8(start + 8, HALT)
+    assert start not in mem.icache
@@ -0,0 +1,126 @@
+import random
+
+import pytest
+
+from emu import Hooks, run
+from emu.cpu_state import reset_state
+from emu.faults import FaultCode
+from emu.hooks import hooked_loop
+
+from .test_helpers import instr, make_mem
+from .test_translator import _random_program, _snapshot
+
+HALT       = 0x00
+MOV_RI     = 0x01
+SUB        = 0x11
+LOAD8_ABS  = 0x20
+STORE8_ABS = 0x21
+JMP_ABS    = 0x30
+JZ_REL     = 0x33
+PUSH8      = 0x40
+POP8       = 0x41
+CALL_ABS   = 0x42
+RET        = 0x43
+
+PROG = b"".join([
+    instr(MOV_RI, 1, 0, 0, 2),         # 0x00
+    instr(MOV_RI, 2, 0, 0, 1),         # 0x08
+    instr(CALL_ABS, 0, 0, 0, 0x50),    # 0x10
+    instr(SUB, 1, 1, 2),               # 0x18
+    instr(JZ_REL, 0, 0, 0, 16),        # 0x20 -> 0x30
+    instr(JMP_ABS, 0, 0, 0, 0x10),     # 0x28
+    instr(HALT),                       # 0x30
+    instr(HALT),                       # 0x38
+    instr(HALT),                       # 0x40
+    instr(HALT),                       # 0x48
+    instr(STORE8_ABS, 0, 1, 0, 0x800), # 0x50
+    instr(LOAD8_ABS, 3, 0, 0, 0x800),  # 0x58
+    instr(PUSH8, 0, 3),                # 0x60
+    instr(POP8, 4),                    # 0x68
+    instr(RET),                        # 0x70
+])
+
+FRAME = 0xFDFF - 7  # lowest byte of the first CALL frame
+
+
+def _recorder():
+    log = []
+    hooks = Hooks(
+        on_step=lambda st, pc: log.append(("step", pc)),
+        on_mem_read=lambda pc, a, n: log.append(("read", pc, a, n)),
+        on_mem_write=lambda pc, a, n: log.append(("write", pc, a, n)),
+        on_branch=lambda pc, t: log.append(("branch", pc, t)),
+        on_call=lambda pc, t: log.append(("call", pc, t)),
+        on_ret=lambda pc, t: log.append(("ret", pc, t)),
+        on_fault=lambda st: log.append(("fault", st.fault_info.code)),
+    )
+    return hooks, log
+
+
+@pytest.mark.parametrize("engine", ["translate", "step"])
+def test_events(engine):
+    hooks, log = _recorder()
+    st = reset_state()
+    res = run(st, make_mem(PROG), 1000, engine=engine, hooks=hooks)
+    assert res.halted and res.steps == sum(1 for e in log if e[0] == "step")
+    events = [e for e in log if e[0] != "step"]
+    one_call = [
+        ("write", 0x10, FRAME, 8), ("call", 0x10, 0x50),
+        ("write", 0x50, 0x800, 1),
+        ("read", 0x58, 0x800, 1),
+        ("write", 0x60, FRAME - 1, 1),
+        ("read", 0x68, FRAME - 1, 1),
+        ("read", 0x70, FRAME, 8), ("ret", 0x70, 0x18),
+    ]
+    assert events == one_call + [("branch", 0x28, 0x10)] + one_call + [("branch", 0x20, 0x30)]
+
+
+def test_fault_and_step_hooks():
+    hooks, log = _recorder()
+    st = reset_state()
+    res = run(st, make_mem(instr(MOV_RI, 1, 0, 0, 1) + instr(0xEE)), 10, hooks=hooks)
+    assert res.steps == 2 and log == [("step", 0x00), ("step", 0x08), ("fault", FaultCode.ILLEGAL_OPCODE)]
+
+
+def test_no_callbacks_uses_engine():
+    st = reset_state()
+    res = run(st, make_mem(PROG), 1000, engine="interp", hooks=Hooks())
+    assert res.fusion_hits  # only the interp engine fuses
+    with pytest.raises(ValueError):
+        run(reset_state(), make_mem(PROG), 1, engine="jit", hooks=Hooks(on_step=print))
+
+
+def test_loops_specialised_and_cached():
+    mem = make_mem(PROG)
+    calls = hooked_loop(Hooks(on_call=print), mem)
+    assert hooked_loop(Hooks(on_call=len), mem) is calls
+    assert hooked_loop(Hooks(on_ret=print), mem) is not calls
+    code = calls.__code__
+    assert "on_call" in code.co_varnames and "on_step" not in code.co_varnames
+    assert "on_mem_read" not in code.co_names + code.co_varnames
+
+
+def test_breakpoints_honoured():
+    mem = make_mem(PROG)
+    mem.set_breakpoint(0x58)
+    st = reset_state()
+    seen = []
+    res = run(st, mem, 1000, hooks=Hooks(on_step=lambda s, pc: seen.append(pc)))
+    assert st.pc == 0x58 and not res.halted and seen[-1] == 0x50
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_same_state_as_step(seed):
+    prog = _random_program(random.Random(seed), 24, 0x200)
+    results = []
+    for hooks in (None, _recorder()[0], Hooks(on_call=lambda pc, t: None)):
+        mem = make_mem(prog, start=0x200)
+        st = reset_state()
+        st.pc = 0x200
+        try:
+            res = run(st, mem, 300, engine="step", hooks=hooks)
+        except IndexError:
+            results.append("IndexError")
+            continue
+        results.append((res, _snapshot(st, mem)))
+    assert results.count(results[0]) == len(results)
@@ -0,0 +1,154 @@
+import pytest
+
+from emu.cpu_state import reset_state, HaltReason
+from emu.faults import FaultCode
+from emu.executor_v2 import step
+
+from .test_helpers import instr, make_mem
+
+HALT      = 0x00
+MOV_RI    = 0x01
+MOV_RR    = 0x02
+ADD       = 0x10
+SUB       = 0x11
+CMP       = 0x12
+LOAD8_ABS = 0x20
+STORE8_ABS= 0x21
+JMP_ABS   = 0x30
+JZ_ABS    = 0x32
+JZ_REL    = 0x33
+PUSH8     = 0x40
+POP8      = 0x41
+CALL_ABS  = 0x42
+RET       = 0x43
+
+SP_SEL = 0x10
+
+
+def _run(mem, start, uncached=False, max_steps=10_000):
+    st = reset_state()
+    st.pc = start
+    for _ in range(max_steps):
+        if st.halted:
+            return st
+        if uncached:
+            mem.icache.clear()
+        step(st, mem)
+    raise RuntimeError("Program did not halt/fault within max_steps")
+
+
+def _snapshot(st):
+    fi = st.fault_info
+    fault = None if fi is None else (fi.code, fi.pc, fi.opcode, fi.rd, fi.ra, fi.rb, fi.imm32, fi.message)
+    return (list(st.regs), st.pc, st.sp, st.fp, st.z, st.halted, st.halt_reason, fault)
+
+
+def test_loop_body_is_cached_and_matches_uncached_run():
+    # R1 = 10; loop: R1 -= R2(1) until zero; store R1 low byte
+    prog = b"".join([
+        instr(MOV_RI, 1, 0, 0, 10),
+        instr(MOV_RI, 2, 0, 0, 1),
+        instr(SUB, 1, 1, 2),          # 0x10
+        instr(JZ_REL, 0, 0, 0, 16),   # 0x18 -> 0x28
+        instr(JMP_ABS, 0, 0, 0, 0x10),
+        instr(STORE8_ABS, 0, 1, 0, 0x0400),
+        instr(HALT),
+    ])
+    mem = make_mem(prog)
+    st = _run(mem, 0)
+    assert st.halt_reason == HaltReason.NORMAL
+    assert set(mem.icache) == {0x00, 0x08, 0x10, 0x18, 0x20, 0x28, 0x30}
+
+    ref = _run(make_mem(prog), 0, uncached=True)
+    assert _snapshot(st) == _snapshot(ref)
+
+
+def test_store8_into_cached_instruction_is_seen():
+    prog = b"".join([
+        instr(MOV_RI, 1, 0, 0, 0),          # 0x00
+        instr(MOV_RI, 2, 0, 0, 5),          # 0x08  imm patched below
+        instr(MOV_RI, 3, 0, 0, 1),          # 0x10
+        instr(ADD, 1, 1, 3),                # 0x18
+        instr(MOV_RI, 4, 0, 0, 9),          # 0x20
+        instr(STORE8_ABS, 0, 4, 0, 0x0C),   # 0x28  patch imm of 0x08
+        instr(MOV_RI, 5, 0, 0, 2),          # 0x30
+        instr(CMP, 0, 1, 5),                # 0x38
+        instr(JZ_ABS, 0, 0, 0, 0x50),       # 0x40
+        instr(JMP_ABS, 0, 0, 0, 0x08),      # 0x48
+        instr(HALT),                        # 0x50
+    ])
+    mem = make_mem(prog)
+    st = _run(mem, 0)
+    assert st.halt_reason == HaltReason.NORMAL
+    assert st.regs[2] == 9
+
+
+def test_push8_into_cached_instruction_is_seen():
+    prog = b"".join([
+        instr(MOV_RI, 2, 0, 0, 5),           # 0x100  imm byte at 0x104 overwritten
+        instr(MOV_RI, SP_SEL, 0, 0, 0x104),  # 0x108
+        instr(MOV_RI, 4, 0, 0, 7),           # 0x110
+        instr(PUSH8, 0, 4, 0, 0),            # 0x118
+        instr(CMP, 0, 2, 4),                 # 0x120
+        instr(JZ_ABS, 0, 0, 0, 0x138),       # 0x128
+        instr(JMP_ABS, 0, 0, 0, 0x100),      # 0x130
+        instr(HALT),                         # 0x138
+    ])
+    mem = make_mem(prog, start=0x100)
+    st = _run(mem, 0x100)
+    assert st.halt_reason == HaltReason.NORMAL
+    assert st.regs[2] == 7
+
+
+def test_call_frame_over_cached_instruction_is_seen():
+    mem = make_mem(b"".join([
+        instr(MOV_RI, 2, 0, 0, 5),           # 0x200  overwritten by the frame
+        instr(MOV_RI, SP_SEL, 0, 0, 0x207),  # 0x208
+        instr(CALL_ABS, 0, 0, 0, 0x300),     # 0x210
+    ]), start=0x200)
+    mem.load(0x300, instr(JMP_ABS, 0, 0, 0, 0x200))
+
+    st = _run(mem, 0x200)
+    # 0x200 now holds the return address 0x218 (big-endian), i.e. a HALT
+    # with a non-zero imm32.
+    assert st.halt_reason == HaltReason.FAULT
+    assert st.fault_info.code == FaultCode.ILLEGAL_ENCODING
+    assert st.fault_info.pc == 0x200
+
+
+def test_host_load_invalidates_cached_slots():
+    mem = make_mem(b"".join([instr(MOV_RI, 1, 0, 0, 1), instr(HALT)]))
+    _run(mem, 0)
+    assert 0x00 in mem.icache
+    mem.load(0, instr(MOV_RI, 1, 0, 0, 2))
+    assert 0x00 not in mem.icache
+    assert _run(mem, 0).regs[1] == 2
+
+
+@pytest.mark.parametrize("prog,setup", [
+    (instr(MOV_RR, SP_SEL, 20, 0, 0), {"sp": -1}),   # SP check precedes ra REG_OOB
+    (instr(POP8, 1, 0, 0, 0), {"sp": 0xFFFF}),
+    (instr(PUSH8, 0, 1, 0, 0), {"sp": 0}),
+    (instr(RET), {"sp": 0xFDFE}),
+    (instr(CALL_ABS, 0, 0, 0, 0x200), {"sp": 0xFDFA}),
+    (instr(MOV_RI, 1, 0, 0, 1), {"pc": 0xFFF8}),      # next PC out of range
+])
+def test_faults_identical_with_and_without_cache(prog, setup):
+    results = []
+    for uncached in (False, True):
+        start = setup.get("pc", 0x100)
+        mem = make_mem(prog, start=start)
+        st = reset_state()
+        st.pc = start
+        st.sp = setup.get("sp", st.sp)
+        # Run twice over the same slot so the cached path is exercised too.
+        for _ in range(2):
+            if uncached:
+                mem.icache.clear()
+            st.halted = False
+            st.halt_reason = HaltReason.NONE
+            st.fault_info = None
+            st.pc = start
+            step(st, mem)
+        results.append(_snapshot(st))
+    assert results[0] == results[1]
@@ -0,0 +1,115 @@
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from emu.cpu_state import reset_state, HaltReason
+from emu.executor_v2 import step
+from emu.faults import FaultCode
+from emu.lockstep import LockstepBatch
+
+from .test_helpers import instr, make_mem
+from .test_translator import _random_program, _snapshot
+
+MOV_RI = 0x01
+SUB    = 0x11
+JZ_REL = 0x33
+JMP_ABS= 0x30
+PUSH8  = 0x40
+HALT   = 0x00
+SP_SEL = 0x10
+
+COUNTDOWN = b"".join([
+    instr(MOV_RI, 2, 0, 0, 1),
+    instr(SUB, 1, 1, 2),          # 0x08
+    instr(JZ_REL, 0, 0, 0, 16),   # 0x10 -> 0x20
+    instr(JMP_ABS, 0, 0, 0, 0x08),
+    instr(HALT),                  # 0x20
+])
+
+
+def _reference(st, mem, max_steps):
+    n = 0
+    err = None
+    try:
+        while n < max_steps and not st.halted:
+            n += 1
+            step(st, mem)
+    except IndexError:
+        err = "IndexError"
+    return n, err, _snapshot(st, mem)
+
+
+def test_lanes_with_different_seeds_run_independently():
+    batch = LockstepBatch(4)
+    batch.load(0, COUNTDOWN)
+    batch.regs[:, 1] = [1, 5, 20, 3]
+    batch.run(1000)
+    assert batch.halted.all()
+    assert batch.retired.tolist() == [2 + 3 * k - 1 for k in (1, 5, 20, 3)]
+    st = batch.state(2)
+    assert (st.pc, st.halt_reason, st.regs[1]) == (0x20, HaltReason.NORMAL, 0)
+
+
+def test_faulting_lane_is_masked_out_with_scalar_fault_info():
+    prog = b"".join([instr(MOV_RI, SP_SEL, 0, 0, 0), instr(PUSH8, 0, 1, 0, 0), instr(HALT)])
+    batch = LockstepBatch(3)
+    batch.load(0, prog)
+    batch.load(0, instr(MOV_RI, SP_SEL, 0, 0, 0x100))
+    batch.mem[1, 0:8] = np.frombuffer(instr(MOV_RI, SP_SEL, 0, 0, 0), dtype=np.uint8)
+    assert batch.run(10) == 3
+    assert batch.halt_reason.tolist() == [1, 2, 1]
+    fi = batch.state(1).fault_info
+    assert (fi.code, fi.pc, fi.message) == (FaultCode.MEM_OOB, 0x08, "SP underflow")
+    assert batch.memory(0).data[0x100] == 0 and batch.state(0).sp == 0xFF
+
+
+@pytest.mark.parametrize("seed", range(25))
+def test_matches_scalar_step_on_random_programs(seed):
+    rng = random.Random(seed)
+    prog = _random_program(rng, 24, 0x200)
+    machines = []
+    for _ in range(12):
+        st = reset_state()
+        st.pc = 0x200
+        st.regs[1] = rng.randrange(4)
+        st.regs[2] = rng.choice([0, 1, 2**64 - 1])
+        st.sp = rng.choice([0xFDFF, 0xFDFE, 0, 0xFFFF, 7, -1])
+        machines.append((st, make_mem(prog, start=0x200)))
+    batch = LockstepBatch.from_machines(machines)
+    batch.run(300)
+    for lane, (st, mem) in enumerate(machines):
+        ref = _reference(st, mem, 300)
+        got = (
+            int(batch.retired[lane]),
+            "IndexError" if lane in batch.errors else None,
+            _snapshot(batch.state(lane), batch.memory(lane)),
+        )
+        assert got == ref
+
+
+@pytest.mark.parametrize("rd, ra", [(1, 16), (1, 17), (16, 2), (17, 2), (16, 17), (17, 16), (16, 16)])
+def test_sp_fp_moves_run_vectorised(rd, ra, monkeypatch):
+    prog = b"".join([instr(0x02, rd, ra), instr(HALT)])
+    values = [0x1234, 0xFDFF, 2**64 - 1, 0]
+    pointers = [0x8000, -1, 0xFFFF, 0x10000]
+    machines = []
+    for v, ptr in zip(values, pointers):
+        st = reset_state()
+        st.regs[2], st.sp, st.fp = v, ptr, ptr ^ 0x10
+        machines.append((st, make_mem(prog)))
+    batch = LockstepBatch.from_machines(machines)
+    scalar = []
+    monkeypatch.setattr(batch, "_scalar_step", lambda lane, *a: scalar.append(lane))
+    batch.step()
+    # Lane 0 is in range for every operand; lanes 1-3 need step() for some moves.
+    assert 0 not in scalar
+    monkeypatch.undo()
+
+    batch = LockstepBatch.from_machines(machines)
+    batch.run(5)
+    for lane, (st, mem) in enumerate(machines):
+        ref = _reference(st, mem, 5)
+        got = (int(batch.retired[lane]), None, _snapshot(batch.state(lane), batch.memory(lane)))
+        assert got == ref
@@ -0,0 +1,165 @@
+import pytest
+
+from emu import run
+from emu.cpu_state import reset_state
+from emu.memory import PF_MMIO, Memory
+from emu.runner import ENGINES
+
+from .test_helpers import instr, make_mem
+
+MOV_RI     = 0x01
+MOV_RR     = 0x02
+SUB        = 0x11
+LOAD8_ABS  = 0x20
+STORE8_ABS = 0x21
+JMP_ABS    = 0x30
+JZ_REL     = 0x33
+PUSH8      = 0x40
+POP8       = 0x41
+CALL_ABS   = 0x42
+RET        = 0x43
+HALT       = 0x00
+SP_SEL     = 0x10
+
+PORT = 0xF000
+
+
+class Port:
+    """Records writes; reads return a counter so repeated loads differ."""
+
+    def __init__(self):
+        self.writes = []
+        self.reads = 0
+
+    def read(self, off):
+        self.reads += 1
+        return 0x40 + off + self.reads
+
+    def write(self, off, val):
+        self.writes.append((off, val))
+
+
+# Writes 5, 4, ..., 1 to PORT, then loads PORT+1 and a RAM byte.
+COUNTDOWN = b"".join([
+    instr(MOV_RI, 1, 0, 0, 5),
+    instr(MOV_RI, 2, 0, 0, 1),
+    instr(STORE8_ABS, 0, 1, 0, PORT),      # 0x10
+    instr(SUB, 1, 1, 2),
+    instr(JZ_REL, 0, 0, 0, 16),
+    instr(JMP_ABS, 0, 0, 0, 0x10),
+    instr(LOAD8_ABS, 3, 0, 0, PORT + 1),   # 0x30
+    instr(LOAD8_ABS, 4, 0, 0, PORT + 0x10),  # same page, outside the region
+    instr(HALT),
+])
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_stores_and_loads_reach_the_device(engine):
+    mem, st, port = make_mem(COUNTDOWN), reset_state(), Port()
+    mem.data[PORT + 0x10] = 0x99
+    mem.map_device(PORT, 4, port.read, port.write, name="port")
+    run(st, mem, 100, engine=engine)
+    assert st.halted and st.fault_code is None
+    assert port.writes == [(0, v) for v in (5, 4, 3, 2, 1)]
+    assert st.regs[3] == 0x42 and port.reads == 1
+    assert st.regs[4] == 0x99
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_stack_on_a_device_page(engine):
+    backing = bytearray(16)
+    prog = b"".join([
+        instr(MOV_RI, 1, 0, 0, PORT + 15),
+        instr(MOV_RR, SP_SEL, 1, 0, 0),
+        instr(MOV_RI, 2, 0, 0, 0x5A),
+        instr(CALL_ABS, 0, 0, 0, 0x40),    # frame at PORT+8..PORT+15
+        instr(PUSH8, 0, 2, 0, 0),          # 0x20
+        instr(POP8, 5, 0, 0, 0),
+        instr(HALT),
+        instr(HALT),
+        instr(RET),                        # 0x40
+    ])
+    mem, st = make_mem(prog), reset_state()
+
+    reads = []
+
+    def read(off):
+        reads.append(off)
+        return backing[off]
+
+    def write(off, val):
+        backing[off] = val
+
+    mem.map_device(PORT, 16, read, write)
+    run(st, mem, 100, engine=engine)
+    assert st.halted and st.fault_code is None
+    assert st.pc == 0x30 and st.regs[5] == 0x5A
+    assert reads == list(range(8, 16)) + [15]  # RET's frame, then POP8
+    # The return frame, with its low byte overwritten by the PUSH8.
+    assert backing[8:16] == bytes(7) + b"\x5a"
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_mapping_drops_code_cached_against_ram(engine):
+    mem, st = make_mem(COUNTDOWN), reset_state()
+    run(st, mem, 100, engine=engine)
+    assert st.regs[3] == 0
+    port = Port()
+    mem.map_device(PORT, 4, port.read, port.write)
+    st = reset_state()
+    run(st, mem, 100, engine=engine)
+    assert st.regs[3] == 0x42 and len(port.writes) == 5
+
+
+def test_map_and_unmap():
+    mem = Memory.blank()
+    a = mem.map_device(0x1080, 0x100, name="a")  # straddles two pages
+    assert mem.page_flags[0x10] & PF_MMIO and mem.page_flags[0x11] & PF_MMIO
+    with pytest.raises(ValueError, match="overlaps a"):
+        mem.map_device(0x1100, 4)
+    with pytest.raises(ValueError):
+        mem.map_device(0xFFFE, 4)
+    b = mem.map_device(0x1180, 4, read=lambda off: 7)
+    mem.write_u8(0x1180, 1)
+    assert mem.read_u8(0x1180) == 7
+    mem.write_u8(0x1081, 3)
+    assert mem.read_u8(0x1081) == 3  # no read handler: last byte written
+    mem.unmap_device(a)
+    assert mem.page_flags[0x10] & PF_MMIO == 0 and mem.page_flags[0x11] & PF_MMIO
+    mem.unmap_device(b)
+    assert mem.read_u8(0x1180) == 1 and not mem.devices
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_device_side_effect_ends_translated_block(engine):
+    # The device patches the instruction after the store into HALT and says so.
+    prog = b"".join([
+        instr(MOV_RI, 1, 0, 0, 1),
+        instr(STORE8_ABS, 0, 1, 0, PORT),
+        instr(MOV_RI, 5, 0, 0, 9),     # 0x10: replaced by HALT
+        instr(HALT),
+    ])
+    mem, st = make_mem(prog), reset_state()
+
+    def write(off, val):
+        mem.load(0x10, instr(HALT))
+        return True
+
+    mem.map_device(PORT, 1, write=write)
+    run(st, mem, 100, engine=engine)
+    assert st.halted and st.pc == 0x10 and st.regs[5] == 0
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_device_store_on_tracked_page(engine):
+    from emu.snapshot import restore, snapshot
+
+    port = Port()
+    mem, st = make_mem(COUNTDOWN), reset_state()
+    mem.map_device(PORT, 4, port.read, port.write)
+    snap = snapshot(st, mem)  # tracks every page, including the device page
+    run(st, mem, 100, engine=engine)
+    assert [v for _, v in port.writes] == [5, 4, 3, 2, 1]
+    restore(snap, st, mem)
+    run(st, mem, 100, engine=engine)
+    assert [v for _, v in port.writes] == [5, 4, 3, 2, 1] * 2
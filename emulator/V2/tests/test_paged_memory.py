@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+from emu import run
+from emu.cpu_state import reset_state
+from emu.memory import PAGE_SIZE, Memory, PagedMemory
+from emu.runner import ENGINES
+from emu.snapshot import fork, restore, snapshot
+
+from .test_snapshot import LOOP
+from .test_translator import _random_program, _snapshot
+
+
+def _load(cls, prog, start=0):
+    mem = cls.blank()
+    mem.load(start, prog)
+    return mem
+
+
+def test_blank_reads_zero_and_tracks_writes():
+    mem = PagedMemory.blank()
+    assert mem.read_slice(0, 4096) == bytes(4096)
+    assert mem.dirty_pages() == []
+    mem.write_u8(0x1234, 0xAB)
+    mem.load(0x8000, b"\x01" * (PAGE_SIZE + 1))
+    assert mem.read_u8(0x1234) == 0xAB
+    assert mem.dirty_pages() == [0x12, 0x80, 0x81]
+    with pytest.raises(IndexError):
+        mem.read_u8(0x10000)
+
+
+def test_digest_and_diff_follow_contents():
+    a, b = PagedMemory.blank(), PagedMemory.blank()
+    assert a.digest() == b.digest() and a == b
+    a.write_u8(0x300, 7)
+    assert a.diff(b) == [3] and a != b
+    b.write_u8(0x300, 7)
+    b.write_u8(0x900, 1)
+    b.write_u8(0x900, 0)  # written back to zero: same contents
+    assert a.digest() == b.digest() and a.diff(b) == [] and a == b
+    flat = Memory.blank()
+    flat.write_u8(0x300, 7)
+    assert a == flat and flat == a
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_engines_match_flat_memory(engine):
+    rng = random.Random(13)
+    for _ in range(150):
+        prog = _random_program(rng, 24, 0x200)
+        results = []
+        for cls in (Memory, PagedMemory):
+            st, mem = reset_state(), _load(cls, prog, 0x200)
+            st.pc = 0x200
+            try:
+                res = run(st, mem, 300, engine=engine)
+            except IndexError as exc:  # POP8 past the top of memory
+                results.append(repr(exc))
+                continue
+            results.append((res.steps, _snapshot(st, mem)))
+        assert results[0] == results[1]
+
+
+def test_snapshot_restore_and_fork_stay_sparse():
+    mem, st = _load(PagedMemory, LOOP), reset_state()
+    run(st, mem, 7)
+    snap = snapshot(st, mem)
+    at_snap = _snapshot(st, mem)
+    assert sum(page != bytes(PAGE_SIZE) for page in snap.pages) == len(mem.dirty_pages())
+    run(st, mem, 1000)
+    restore(snap, st, mem)
+    assert _snapshot(st, mem) == at_snap
+
+    st2, mem2 = fork(snap)
+    assert isinstance(mem2, PagedMemory)
+    assert mem2.dirty_pages() == mem.dirty_pages()
+    assert _snapshot(st2, mem2) == at_snap
+    run(st2, mem2, 1000)
+    assert st2.halted and _snapshot(st, mem) == at_snap
@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+from emu.cli import main
+from emu.perfstat import CycleModel, PerfStat, format_perf, perf_stat
+
+from .test_helpers import instr, make_mem
+from .test_profile import CALLS, _profiled
+
+LOAD8_ABS  = 0x20
+STORE8_ABS = 0x21
+PUSH8      = 0x40
+POP8       = 0x41
+
+
+def test_counters_and_default_cycles():
+    _, mem, prof, n = _profiled(CALLS)
+    stat = perf_stat(prof)
+    # 2 MOV, 5 x (CALL ADD RET SUB JZ), 4 JMP, HALT
+    assert stat.instructions == n == 32
+    assert (stat.branches, stat.taken) == (19, 15)  # JZ taken once, JMP/CALL/RET always
+    assert (stat.loads, stat.stores, stat.calls) == (5, 5, 5)
+    # base 1 each + 2 per taken branch + 3 per CALL/RET
+    assert stat.cycles == 32 + 2 * 15 + 3 * 10
+    assert stat.ipc == pytest.approx(32 / 92) and stat.taken_rate == pytest.approx(15 / 19)
+
+
+def test_memory_costs():
+    prog = b"".join([
+        instr(STORE8_ABS, 0, 1, 0, 0x800),
+        instr(LOAD8_ABS, 2, 0, 0, 0x800),
+        instr(PUSH8, 0, 2),
+        instr(POP8, 3),
+        instr(0x00),
+    ])
+    _, mem, prof, _ = _profiled(prog)
+    stat = perf_stat(prof, CycleModel(mem_access=10))
+    assert (stat.loads, stat.stores, stat.branches) == (2, 2, 0)
+    assert stat.cycles == 5 + 4 * 10
+
+
+def test_model_from_dict():
+    model = CycleModel.from_dict(
+        {"opcodes": {"ADD": 4, "0x11": 3}, "taken_branch": 0, "mem_access": 0, "call_ret": 0}
+    )
+    _, mem, prof, _ = _profiled(CALLS)
+    assert perf_stat(prof, model).cycles == 32 + 3 * 5 + 2 * 5
+    with pytest.raises(ValueError):
+        CycleModel.from_dict({"branch": 1})
+
+
+def test_format():
+    stat = PerfStat(1_000_000, 2_000_000, 10, 4, 1, 2, 3, seconds=0.5)
+    text = format_perf(stat, "p.bin")
+    assert "Performance counter stats for 'p.bin'" in text
+    assert "1,000,000      instructions      #  0.50  insn per cycle" in text
+    assert "40.00% of all branches" in text and "2.00 MIPS" in text
+
+
+def test_cli_perf_with_profile(tmp_path, capsys):
+    prog = tmp_path / "p.bin"
+    prog.write_bytes(CALLS)
+    model = tmp_path / "model.json"
+    model.write_text(json.dumps({"taken_branch": 0, "call_ret": 0}))
+    out = tmp_path / "perf.json"
+    argv = ["run", "--bin", str(prog), "--profile", "--cycle-model", str(model), "--perf-out", str(out)]
+    assert main(argv) == 0
+    text = capsys.readouterr().out
+    assert "[PROFILE] steps=32" in text and "insn per cycle" in text
+    saved = json.loads(out.read_text())
+    assert saved["instructions"] == saved["cycles"] == 32 and saved["ipc"] == 1.0
+
+
+def test_cli_perf_times_the_selected_engine(tmp_path, monkeypatch, capsys):
+    import emu.cli
+
+    prog = tmp_path / "p.bin"
+    prog.write_bytes(CALLS)
+    engines = []
+    real_run = emu.cli.run
+
+    def spy(*args, engine, **kw):
+        engines.append(engine)
+        return real_run(*args, engine=engine, **kw)
+
+    monkeypatch.setattr(emu.cli, "run", spy)
+    out = tmp_path / "perf.json"
+    assert main(["run", "--bin", str(prog), "--perf", "--engine", "interp", "--perf-out", str(out)]) == 0
+    assert engines == ["interp"]  # the timed run; the counters come from a profiled replay
+    saved = json.loads(out.read_text())
+    assert (saved["instructions"], saved["branches"], saved["cycles"]) == (32, 19, 92)
+
+    # With --profile the profiled run is the real one and the timed run the replay.
+    assert main(["run", "--bin", str(prog), "--perf", "--profile", "--engine", "step"]) == 0
+    assert engines == ["interp", "step"]
+    assert "[PROFILE] steps=32" in capsys.readouterr().out
+
+
+def test_cli_perf_replay_keeps_devices_quiet(tmp_path):
+    from .test_console import _print
+
+    prog = tmp_path / "hello.bin"
+    prog.write_bytes(_print(b"hi\n"))
+    target = tmp_path / "console.txt"
+    assert main(["run", "--bin", str(prog), "--console", str(target), "--perf"]) == 0
+    assert target.read_bytes() == b"hi\n"
+
+    disk = tmp_path / "disk.img"
+    disk.write_bytes(bytes(512))
+    with pytest.raises(ValueError, match="--disk-writable"):
+        main(["run", "--bin", str(prog), "--disk", str(disk), "--disk-writable", "--perf"])
@@ -0,0 +1,125 @@
+import json
+
+from emu.cli import main
+from emu.cpu_state import reset_state
+from emu.memory import PagedMemory
+from emu.profile import BasicBlock, Profile, format_report, run_profiled
+from emu.runner import run
+
+from .test_helpers import instr, make_mem
+
+HALT       = 0x00
+MOV_RI     = 0x01
+ADD        = 0x10
+SUB        = 0x11
+STORE8_ABS = 0x21
+JZ_ABS     = 0x32
+JZ_REL     = 0x33
+JMP_ABS    = 0x30
+CALL_ABS   = 0x42
+RET        = 0x43
+
+# r1 counts down from 5, calling a two-instruction function each pass.
+CALLS = b"".join([
+    instr(MOV_RI, 1, 0, 0, 5),      # 0x00
+    instr(MOV_RI, 2, 0, 0, 1),      # 0x08
+    instr(CALL_ABS, 0, 0, 0, 0x40), # 0x10
+    instr(SUB, 1, 1, 2),            # 0x18
+    instr(JZ_ABS, 0, 0, 0, 0x30),   # 0x20
+    instr(JMP_ABS, 0, 0, 0, 0x10),  # 0x28
+    instr(HALT),                    # 0x30
+    instr(HALT),                    # 0x38
+    instr(ADD, 3, 3, 2),            # 0x40
+    instr(RET),                     # 0x48
+])
+
+
+def _profiled(program):
+    st, mem = reset_state(), make_mem(program)
+    prof = Profile.for_memory(mem)
+    n = run_profiled(st, mem, 10_000, prof)
+    return st, mem, prof, n
+
+
+def test_matches_plain_run_and_counts():
+    st, mem, prof, n = _profiled(CALLS)
+    ref, ref_mem = reset_state(), make_mem(CALLS)
+    assert n == prof.steps == run(ref, ref_mem, 10_000, engine="step").steps
+    assert st == ref and mem == ref_mem
+    assert len(prof.counts) == 65536 // 8 and sum(prof.counts) == n
+    assert prof.hot_pcs(3) == [(0x10, 5), (0x18, 5), (0x20, 5)]
+    assert prof.counts[0x28 >> 3] == 4 and prof.counts[0x38 >> 3] == 0
+
+
+def test_opcodes_branches_and_blocks():
+    _, mem, prof, _ = _profiled(CALLS)
+    assert prof.opcode_counts() == {
+        "CALL_ABS": 5, "SUB": 5, "JZ_ABS": 5, "ADD": 5, "RET": 5, "JMP_ABS": 4, "MOV_RI": 2, "HALT": 1,
+    }
+    assert prof.branches(mem) == [(0x20, 1, 4)]
+    blocks = prof.basic_blocks(mem)
+    assert blocks[:3] == [BasicBlock(0x18, 0x28, 5), BasicBlock(0x40, 0x50, 5), BasicBlock(0x10, 0x18, 5)]
+    # The loop head at 0x10 is a branch target: its count differs from the MOVs before it.
+    assert BasicBlock(0x00, 0x10, 1) in blocks and BasicBlock(0x28, 0x30, 4) in blocks
+
+
+def test_pcs_beyond_span_counted_outside():
+    mem = PagedMemory.blank(1 << 28)
+    top = (1 << 28) - 16
+    mem.load(0, instr(JMP_ABS, 0, 0, 0, top))
+    mem.load(top, instr(HALT))
+    prof = Profile.for_memory(mem)
+    prof.counts, prof.jumps = prof.counts[:16], prof.jumps[:16]  # a small span keeps the test fast
+    st = reset_state()
+    assert run_profiled(st, mem, 10, prof) == 2 and st.halted
+    assert prof.outside == 1 and prof.counts[0] == 1 and prof.jumps[0] == 1
+
+
+def test_report_roundtrip_and_cli(tmp_path, capsys):
+    _, mem, prof, _ = _profiled(CALLS)
+    report = prof.report(mem, top=2)
+    assert json.loads(json.dumps(report)) == report
+    assert len(report["hot_pcs"]) == 2 and report["branches"] == [{"pc": 0x20, "taken": 1, "not_taken": 4}]
+    assert "[PROFILE] steps=" in format_report(report)
+
+    prog = tmp_path / "p.bin"
+    prog.write_bytes(CALLS)
+    out = tmp_path / "profile.json"
+    assert main(["run", "--bin", str(prog), "--profile-out", str(out), "--profile-top", "3"]) == 0
+    text = capsys.readouterr().out
+    assert "hot basic blocks:" in text and "0x0020           1 / 4" in text
+    saved = json.loads(out.read_text())
+    assert saved["steps"] == prof.steps and saved["hot_blocks"][0] == {
+        "start": 0x18, "end": 0x28, "count": 5, "retired": 10,
+    }
+
+
+def test_jz_to_the_next_pc_counts_as_taken():
+    prog = b"".join([
+        instr(SUB, 1, 1, 1),            # 0x00 Z=1
+        instr(JZ_REL, 0, 0, 0, 8),      # 0x08 taken, lands on 0x10 anyway
+        instr(MOV_RI, 2, 0, 0, 1),      # 0x10
+        instr(SUB, 1, 2, 0),            # 0x18 Z=0
+        instr(JZ_REL, 0, 0, 0, 8),      # 0x20 not taken
+        instr(HALT),                    # 0x28
+    ])
+    _, mem, prof, _ = _profiled(prog)
+    assert prof.branches(mem) == [(0x08, 1, 0), (0x20, 0, 1)]
+    assert prof.taken[JZ_REL] == 1 and prof.ops[JZ_REL] == 2
+
+
+def test_opcode_counts_follow_rewritten_code():
+    prog = b"".join([
+        instr(MOV_RI, 1, 0, 0, SUB),      # 0x00
+        instr(MOV_RI, 3, 0, 0, 1),        # 0x08
+        instr(ADD, 3, 3, 3),              # 0x10 becomes SUB 3,3,3 after one pass
+        instr(STORE8_ABS, 0, 1, 0, 0x10), # 0x18
+        instr(JZ_ABS, 0, 0, 0, 0x30),     # 0x20
+        instr(JMP_ABS, 0, 0, 0, 0x10),    # 0x28
+        instr(HALT),                      # 0x30
+    ])
+    _, mem, prof, _ = _profiled(prog)
+    assert mem.data[0x10] == SUB
+    assert prof.opcode_counts() == {
+        "MOV_RI": 2, "STORE8_ABS": 2, "JZ_ABS": 2, "ADD": 1, "SUB": 1, "JMP_ABS": 1, "HALT": 1,
+    }
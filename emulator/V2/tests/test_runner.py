@@ -0,0 +1,160 @@
+import random
+
+import pytest
+
+from emu import run, RunResult
+from emu.cli import RunOptions, run_program
+from emu.cpu_state import reset_state, HaltReason
+from emu.faults import FaultCode
+from emu.runner import ENGINES
+
+from .test_helpers import instr, make_mem
+from .test_translator import _random_program, _snapshot
+
+HALT      = 0x00
+MOV_RI    = 0x01
+SUB       = 0x11
+JZ_REL    = 0x33
+JMP_ABS   = 0x30
+PUSH8     = 0x40
+SP_SEL    = 0x10
+
+COUNTDOWN = b"".join([
+    instr(MOV_RI, 1, 0, 0, 50),
+    instr(MOV_RI, 2, 0, 0, 1),
+    instr(SUB, 1, 1, 2),          # 0x10
+    instr(JZ_REL, 0, 0, 0, 16),   # 0x18 -> 0x28
+    instr(JMP_ABS, 0, 0, 0, 0x10),
+    instr(HALT),                  # 0x28
+])
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_run_to_halt_reports_steps(engine):
+    mem = make_mem(COUNTDOWN)
+    st = reset_state()
+    res = run(st, mem, 10_000, engine=engine)
+    assert res == RunResult(steps=2 + 50 * 3 - 1 + 1, halted=True, halt_reason=HaltReason.NORMAL)
+    assert st.pc == 0x28
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_run_stops_at_budget_and_resumes(engine):
+    mem = make_mem(COUNTDOWN)
+    st = reset_state()
+    first = run(st, mem, 100, engine=engine)
+    assert first == RunResult(steps=100, halted=False, halt_reason=HaltReason.NONE)
+    second = run(st, mem, 10_000, engine=engine)
+    assert first.steps + second.steps == 2 + 50 * 3
+    assert second.halt_reason == HaltReason.NORMAL
+    assert run(st, mem, 10, engine=engine).steps == 0
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_fault_counts_as_a_step(engine):
+    mem = make_mem(b"".join([instr(MOV_RI, SP_SEL, 0, 0, 0), instr(PUSH8, 0, 1, 0, 0)]))
+    st = reset_state()
+    res = run(st, mem, 10, engine=engine)
+    assert res.steps == 2
+    assert res.halt_reason == HaltReason.FAULT
+    assert st.fault_info.code == FaultCode.MEM_OOB
+    assert st.fault_info.pc == 0x08
+
+
+def test_unknown_engine_rejected():
+    with pytest.raises(ValueError):
+        run(reset_state(), make_mem(COUNTDOWN), 1, engine="jit")
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_engines_agree_on_random_programs(seed):
+    prog = _random_program(random.Random(seed), 24, 0x200)
+    results = []
+    for engine in ENGINES:
+        mem = make_mem(prog, start=0x200)
+        st = reset_state()
+        st.pc = 0x200
+        try:
+            res = run(st, mem, 300, engine=engine)
+        except IndexError:
+            results.append("IndexError")
+            continue
+        results.append((res, _snapshot(st, mem)))
+    assert results.count(results[0]) == len(results)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_cli_run_program_exit_codes(engine, capsys):
+    opts = RunOptions(engine=engine)
+    kw = dict(start=0, trace=False, dump_regs_end=False, dump_mem=None, opts=opts)
+    assert run_program(COUNTDOWN, max_steps=10_000, **kw) == 0
+    assert "steps=152" in capsys.readouterr().out
+    assert run_program(COUNTDOWN, max_steps=10, **kw) == 2
+    assert run_program(instr(0x7F), max_steps=10, **kw) == 1
+
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_breakpoint_stops_before_and_resumes(engine):
+    mem, st = make_mem(COUNTDOWN), reset_state()
+    run(st, mem, 20, engine=engine)  # code caches warm, fused SUB/JZ in place
+    mem.set_breakpoint(0x18)  # the JZ half of that pair
+    stops = 0
+    while True:
+        res = run(st, mem, 10_000, engine=engine)
+        if res.halted:
+            break
+        assert st.pc == 0x18
+        stops += 1
+    assert stops == 50 - 6 and st.regs[1] == 0
+    assert res.steps == 1 + 1  # the JZ resumed from, then HALT
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_breakpoint_step_counts(engine):
+    mem, st = make_mem(COUNTDOWN), reset_state()
+    mem.set_breakpoint(0x10)
+    steps = [run(st, mem, 10_000, engine=engine).steps for _ in range(9)]
+    assert steps == [2] + [3] * 8 and st.pc == 0x10
+    assert st.regs[1] == 50 - 8
+    mem.clear_breakpoint(0x10)
+    assert run(st, mem, 10_000, engine=engine).halted
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_stop_range_stops_before_and_resumes(engine):
+    mem, st = make_mem(COUNTDOWN), reset_state()
+    run(st, mem, 20, engine=engine)  # code caches warm, fused SUB/JZ in place
+    stops = 0
+    while True:
+        res = run(st, mem, 10_000, engine=engine, stop_range=(0x18, 0x1F))
+        if res.halted:
+            break
+        assert st.pc == 0x18
+        stops += 1
+    assert stops == 50 - 6 and st.regs[1] == 0
+    assert not mem.breakpoints
+
+
+def test_interp_stop_range_keeps_the_fast_path(monkeypatch):
+    import emu.runner
+
+    calls = []
+    real_step = emu.runner.step
+
+    def counting_step(state, mem):
+        calls.append(state.pc)
+        real_step(state, mem)
+
+    monkeypatch.setattr(emu.runner, "step", counting_step)
+    mem, st = make_mem(COUNTDOWN), reset_state()
+    res = run(st, mem, 10_000, engine="interp", stop_range=(0x28, 0x28))
+    assert not res.halted and st.pc == 0x28 and res.steps == 2 + 50 * 3 - 1
+    assert len(calls) < 10  # the loop itself ran from the cache
+
+
+def test_stop_range_rejected_with_hooks():
+    from emu.hooks import Hooks
+
+    with pytest.raises(ValueError):
+        run(reset_state(), make_mem(COUNTDOWN), 10, hooks=Hooks(on_step=lambda st: None), stop_range=(0, 8))
@@ -0,0 +1,101 @@
+import pytest
+
+from emu import run
+from emu.cpu_state import reset_state
+from emu.memory import PAGE_SIZE
+from emu.runner import ENGINES
+from emu.snapshot import fork, restore, snapshot
+
+from .test_helpers import instr, make_mem
+from .test_translator import _snapshot
+
+MOV_RI     = 0x01
+SUB        = 0x11
+STORE8_ABS = 0x21
+JZ_REL     = 0x33
+JMP_ABS    = 0x30
+PUSH8      = 0x40
+HALT       = 0x00
+
+# Counts r1 down from 20, storing it at 0x4000 and pushing it each pass.
+LOOP = b"".join([
+    instr(MOV_RI, 1, 0, 0, 20),
+    instr(MOV_RI, 2, 0, 0, 1),
+    instr(STORE8_ABS, 0, 1, 0, 0x4000),   # 0x10
+    instr(PUSH8, 0, 1, 0, 0),
+    instr(SUB, 1, 1, 2),
+    instr(JZ_REL, 0, 0, 0, 16),
+    instr(JMP_ABS, 0, 0, 0, 0x10),
+    instr(HALT),
+])
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_restore_rewinds_state_and_memory(engine):
+    mem = make_mem(LOOP)
+    st = reset_state()
+    run(st, mem, 7, engine=engine)
+    snap = snapshot(st, mem)
+    at_snap = _snapshot(st, mem)
+    for _ in range(3):
+        run(st, mem, 1000, engine=engine)
+        assert st.halted
+        restore(snap, st, mem)
+        assert _snapshot(st, mem) == at_snap
+    run(st, mem, 1000, engine=engine)
+    fresh_mem, fresh = make_mem(LOOP), reset_state()
+    run(fresh, fresh_mem, 1000, engine=engine)
+    assert _snapshot(st, mem) == _snapshot(fresh, fresh_mem)
+
+
+def test_snapshots_share_unwritten_pages():
+    mem = make_mem(LOOP)
+    st = reset_state()
+    first = snapshot(st, mem)
+    run(st, mem, 1000)
+    second = snapshot(st, mem)
+    changed = [i for i in range(len(first.pages)) if first.pages[i] is not second.pages[i]]
+    # The store target and the stack page; code and everything else are shared.
+    assert changed == [0x4000 // PAGE_SIZE, 0xFDFF // PAGE_SIZE]
+    assert snapshot(st, mem).pages is not second.pages
+    assert all(a is b for a, b in zip(snapshot(st, mem).pages, second.pages))
+
+
+def test_restore_to_an_older_snapshot_and_back():
+    mem = make_mem(LOOP)
+    st = reset_state()
+    old = snapshot(st, mem)
+    run(st, mem, 1000)
+    new = snapshot(st, mem)
+    new_view = _snapshot(st, mem)
+    restore(old, st, mem)
+    assert mem.data[0x4000] == 0 and st.pc == 0
+    restore(new, st, mem)
+    assert _snapshot(st, mem) == new_view
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_restore_rewrites_modified_code(engine):
+    mem = make_mem(instr(MOV_RI, 2, 0, 0, 1) + instr(HALT))
+    st = reset_state()
+    snap = snapshot(st, mem)
+    mem.load(0x04, b"\x07")  # patch the imm32, then cache the patched code
+    run(st, mem, 10, engine=engine)
+    assert st.regs[2] == 7
+    restore(snap, st, mem)
+    run(st, mem, 10, engine=engine)
+    assert st.regs[2] == 1
+
+
+def test_fork_is_independent():
+    mem = make_mem(LOOP)
+    st = reset_state()
+    run(st, mem, 7)
+    snap = snapshot(st, mem)
+    st2, mem2 = fork(snap)
+    assert _snapshot(st2, mem2) == _snapshot(st, mem)
+    run(st2, mem2, 1000)
+    assert st2.halted and not st.halted
+    assert mem.data[0x4000] == 20 and mem2.data[0x4000] == 1
+    st3, mem3 = fork(snap)
+    assert _snapshot(st3, mem3) == _snapshot(st, mem)
@@ -0,0 +1,207 @@
+import io
+
+import pytest
+
+from emu.cli import main
+from emu.cpu_state import reset_state
+from emu.executor_v2 import step
+from emu.memory import Memory
+from emu.runner import ENGINES
+from emu.trace import (
+    RECORD_SIZE,
+    TraceFile,
+    TraceRing,
+    format_record,
+    iter_records,
+    read_trace,
+    run_traced,
+    run_window,
+)
+
+from .test_helpers import instr, make_mem
+
+MOV_RI   = 0x01
+SUB      = 0x11
+JZ_REL   = 0x33
+JMP_ABS  = 0x30
+PUSH8    = 0x40
+HALT     = 0x00
+
+
+def _countdown(n):
+    return b"".join([
+        instr(MOV_RI, 1, 0, 0, n),
+        instr(MOV_RI, 2, 0, 0, 1),
+        instr(SUB, 1, 1, 2),          # 0x10
+        instr(JZ_REL, 0, 0, 0, 16),
+        instr(JMP_ABS, 0, 0, 0, 0x10),
+        instr(HALT),                  # 0x28
+    ])
+
+
+def _reference_pcs(program, max_steps):
+    st, mem = reset_state(), make_mem(program)
+    pcs = []
+    while not st.halted and len(pcs) < max_steps:
+        pcs.append(st.pc)
+        step(st, mem)
+    return pcs
+
+
+def _window(program, engine, **kw):
+    st, mem = reset_state(), make_mem(program)
+    ring = TraceRing(10_000)
+    n = run_window(st, mem, 10_000, ring, engine=engine, **kw)
+    assert not mem.breakpoints  # temporary triggers are removed
+    return st, n, [(r.step, r.pc) for r in ring.records()]
+
+
+def test_file_trace_matches_stepping():
+    prog = _countdown(5)
+    out = io.BytesIO()
+    st, mem = reset_state(), make_mem(prog)
+    n = run_traced(st, mem, 1000, TraceFile(out), chunk=3)
+    recs = list(read_trace(io.BytesIO(out.getvalue())))
+    assert st.halted and n == len(recs)
+    assert [r.step for r in recs] == list(range(n))
+    assert [r.pc for r in recs] == _reference_pcs(prog, 1000)
+    assert recs[0].instr == prog[:8]
+    assert recs[-1].halted and not any(r.halted for r in recs[:-1])
+    assert [r.z for r in recs if r.pc == 0x10] == [False] * 4 + [True]
+
+
+def test_register_deltas():
+    prog = instr(MOV_RI, 3, 0, 0, -1) + instr(PUSH8, 0, 3) + instr(HALT)
+    ring = TraceRing(8)
+    run_traced(reset_state(), make_mem(prog), 10, ring, regs=True)
+    mov, push, halt = ring.records()
+    assert (mov.reg, mov.value) == (3, 0xFFFFFFFFFFFFFFFF)
+    assert (push.reg, push.value) == (16, 0xFDFE)
+    assert halt.reg is None
+    assert "R03=FFFFFFFFFFFFFFFF" in format_record(mov)
+    assert "SP=000000000000FDFE" in format_record(push)
+
+
+@pytest.mark.parametrize("chunk", [1, 3, 7, 50])
+def test_ring_keeps_last_records(chunk):
+    prog = _countdown(20)
+    ring = TraceRing(7)
+    n = run_traced(reset_state(), make_mem(prog), 1000, ring, chunk=chunk)
+    recs = list(ring.records())
+    assert len(ring) == 7 and ring.count == n
+    assert [r.step for r in recs] == list(range(n - 7, n))
+    assert [r.pc for r in recs] == _reference_pcs(prog, 1000)[-7:]
+
+
+def test_ring_not_yet_full_and_save():
+    ring = TraceRing(100)
+    run_traced(reset_state(), make_mem(_countdown(2)), 1000, ring)
+    out = io.BytesIO()
+    ring.save(out)
+    assert [r.step for r in read_trace(io.BytesIO(out.getvalue()))] == list(range(ring.count))
+    assert len(out.getvalue()) % RECORD_SIZE == 12
+
+
+def test_bad_trace_file_rejected():
+    with pytest.raises(ValueError, match="bad magic"):
+        list(read_trace(io.BytesIO(b"NOTATRACE..." + bytes(RECORD_SIZE))))
+    assert list(iter_records(b"")) == []
+
+
+def test_fault_record():
+    st = reset_state()
+    ring = TraceRing(4)
+    run_traced(st, make_mem(instr(0xEE)), 10, ring)
+    (rec,) = ring.records()
+    assert st.fault_info is not None and rec.halted and rec.instr[0] == 0xEE
+
+
+def test_cli_trace_out_and_view(tmp_path, capsys):
+    prog = tmp_path / "p.bin"
+    prog.write_bytes(_countdown(3))
+    trace = tmp_path / "p.trace"
+    assert main(["run", "--bin", str(prog), "--trace-out", str(trace), "--trace-regs"]) == 0
+    capsys.readouterr()
+
+    assert main(["trace-view", str(trace), "--count"]) == 0
+    total = int(capsys.readouterr().out)
+    assert total == len(_reference_pcs(_countdown(3), 1000))
+
+    assert main(["trace-view", str(trace), "--pc-range", "0x10", "0x10"]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 3 and all("PC=0010" in ln for ln in lines)
+    assert lines[-1].endswith("R01=0000000000000000")
+
+    assert main(["trace-view", str(trace), "--opcode", "0x30", "--last", "1"]) == 0
+    (line,) = capsys.readouterr().out.splitlines()
+    assert "opc=0x30" in line
+
+    assert main(["trace-view", str(trace), "--steps", "0", "1"]) == 0
+    assert len(capsys.readouterr().out.splitlines()) == 2
+
+
+def test_cli_text_trace_and_ring(tmp_path, capsys):
+    prog = tmp_path / "p.bin"
+    prog.write_bytes(_countdown(3))
+    assert main(["run", "--bin", str(prog), "--trace"]) == 0
+    out = capsys.readouterr().out.splitlines()
+    assert out[0].startswith("000000 PC=0000  01 01 00 00 03 00 00 00")
+    assert out[-1].startswith("[HALT] Normal.")
+
+    assert main(["run", "--bin", str(prog), "--trace-ring", "2"]) == 0
+    out = capsys.readouterr().out.splitlines()
+    assert len(out) == 3 and out[1].endswith("[HALT]")
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_window_from_step_and_pc(engine):
+    prog = _countdown(10)
+    ref = list(enumerate(_reference_pcs(prog, 1000)))
+    st, n, recs = _window(prog, engine, from_step=7)
+    assert st.halted and n == len(ref) and recs == ref[7:]
+    st, n, recs = _window(prog, engine, from_pc=0x20)
+    assert recs == ref[ref.index((4, 0x20)):]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_window_until_pc(engine):
+    prog = _countdown(10)
+    ref = list(enumerate(_reference_pcs(prog, 1000)))
+    st, n, recs = _window(prog, engine, until_pc=0x28)
+    assert st.halted and n == len(ref) and recs == ref[:-1]
+    # Between two addresses: one trip round the loop; the program still runs to the end.
+    st, n, recs = _window(prog, engine, from_pc=0x18, until_pc=0x10)
+    assert [pc for _, pc in recs] == [0x18, 0x20] and st.halted and n == len(ref)
+    # The window closes as it opens: nothing is traced.
+    st, n, recs = _window(prog, engine, from_pc=0x18, until_pc=0x18)
+    assert recs == [] and st.halted and n == len(ref)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_window_pc_range(engine):
+    prog = _countdown(10)
+    ref = list(enumerate(_reference_pcs(prog, 1000)))
+    st, n, recs = _window(prog, engine, pc_range=(0x18, 0x27))
+    assert st.halted and n == len(ref)
+    assert recs == [(i, pc) for i, pc in ref if 0x18 <= pc <= 0x27]
+    st, n, recs = _window(prog, engine, pc_range=(0x0, 0x8), from_step=1)
+    assert recs == [(1, 0x8)]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_window_pc_range_sets_no_breakpoints(engine, monkeypatch):
+    prog = _countdown(10)
+    ref = list(enumerate(_reference_pcs(prog, 1000)))
+    armed = []
+    monkeypatch.setattr(Memory, "set_breakpoint", lambda self, pc: armed.append(pc))
+    st, n, recs = _window(prog, engine, pc_range=(0x20, 0xFFFF))
+    assert armed == [] and st.halted and n == len(ref)
+    assert recs == [(i, pc) for i, pc in ref if pc >= 0x20]
+
+
+def test_cli_trace_until(tmp_path, capsys):
+    prog = tmp_path / "p.bin"
+    prog.write_bytes(_countdown(3))
+    assert main(["run", "--bin", str(prog), "--trace-from-pc", "0x10", "--trace-until-pc", "0x18"]) == 0
+    out = capsys.readouterr().out.splitlines()
+    assert out[0].startswith("000002 PC=0010") and out[1].startswith("[HALT] Normal.")
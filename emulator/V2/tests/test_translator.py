@@ -0,0 +1,248 @@
+import random
+
+import pytest
+
+from emu.cpu_state import reset_state, HaltReason
+from emu.faults import FaultCode
+from emu.executor_v2 import step
+from emu.translator import run_translated, translate_block
+
+from .test_helpers import instr, make_mem
+
+HALT      = 0x00
+MOV_RI    = 0x01
+MOV_RR    = 0x02
+ADD       = 0x10
+SUB       = 0x11
+CMP       = 0x12
+LOAD8_ABS = 0x20
+STORE8_ABS= 0x21
+JMP_ABS   = 0x30
+JMP_REL   = 0x31
+JZ_ABS    = 0x32
+JZ_REL    = 0x33
+PUSH8     = 0x40
+POP8      = 0x41
+CALL_ABS  = 0x42
+RET       = 0x43
+
+SP_SEL = 0x10
+FP_SEL = 0x11
+
+
+def _snapshot(st, mem):
+    fi = st.fault_info
+    fault = None if fi is None else (fi.code, fi.pc, fi.opcode, fi.rd, fi.ra, fi.rb, fi.imm32, fi.message)
+    return (list(st.regs), st.pc, st.sp, st.fp, st.z, st.halted, st.halt_reason, fault, bytes(mem.data))
+
+
+def _run_step(prog, start, max_steps, sp=None):
+    mem = make_mem(prog, start=start)
+    st = reset_state()
+    st.pc = start
+    if sp is not None:
+        st.sp = sp
+    n = 0
+    while n < max_steps and not st.halted:
+        step(st, mem)
+        n += 1
+    return n, _snapshot(st, mem)
+
+
+def _run_translated(prog, start, max_steps, sp=None):
+    mem = make_mem(prog, start=start)
+    st = reset_state()
+    st.pc = start
+    if sp is not None:
+        st.sp = sp
+    n = run_translated(st, mem, max_steps)
+    return n, _snapshot(st, mem)
+
+
+def _countdown(n):
+    return b"".join([
+        instr(MOV_RI, 1, 0, 0, n),
+        instr(MOV_RI, 2, 0, 0, 1),
+        instr(SUB, 1, 1, 2),          # 0x10
+        instr(JZ_REL, 0, 0, 0, 16),   # 0x18 -> 0x28
+        instr(JMP_ABS, 0, 0, 0, 0x10),
+        instr(STORE8_ABS, 0, 1, 0, 0x0400),
+        instr(HALT),
+    ])
+
+
+def test_countdown_loop_matches_step():
+    prog = _countdown(1000)
+    assert _run_translated(prog, 0, 100_000) == _run_step(prog, 0, 100_000)
+
+
+@pytest.mark.parametrize("budget", [1, 2, 3, 4, 5, 7, 10, 29, 30, 31])
+def test_partial_budget_stops_at_same_instruction(budget):
+    prog = _countdown(10)
+    assert _run_translated(prog, 0, budget) == _run_step(prog, 0, budget)
+
+
+def test_loop_back_to_entry_stays_in_one_block():
+    mem = make_mem(_countdown(5))
+    blk = translate_block(mem, 0x10)
+    assert blk is not None
+    assert "while True:" in blk.source
+    assert blk.spans == [(0x10, 0x28)]
+    assert mem.blocks[0x10] is blk
+
+
+def test_nested_calls_match_step():
+    prog = {
+        0x0100: b"".join([
+            instr(MOV_RI, 1, 0, 0, 7),
+            instr(MOV_RI, 2, 0, 0, 3),
+            instr(CALL_ABS, 0, 0, 0, 0x0200),
+            instr(STORE8_ABS, 0, 0, 0, 0x0400),
+            instr(HALT),
+        ]),
+        0x0200: b"".join([
+            instr(PUSH8, 0, 1, 0, 0),
+            instr(POP8, 3, 0, 0, 0),
+            instr(ADD, 0, 1, 2),
+            instr(CALL_ABS, 0, 0, 0, 0x0300),
+            instr(RET),
+        ]),
+        0x0300: b"".join([
+            instr(MOV_RI, 4, 0, 0, 2),
+            instr(ADD, 0, 0, 4),
+            instr(MOV_RR, FP_SEL, SP_SEL, 0, 0),
+            instr(RET),
+        ]),
+    }
+    image = bytearray(0x0300)
+    for addr, blob in prog.items():
+        image[addr - 0x0100:addr - 0x0100 + len(blob)] = blob
+    ref = _run_step(bytes(image), 0x0100, 1000)
+    got = _run_translated(bytes(image), 0x0100, 1000)
+    assert got == ref
+    assert got[1][6] == HaltReason.NORMAL
+    assert got[1][8][0x0400] == 12
+
+
+def test_self_modifying_store_inside_running_block():
+    # The store at 0x08 rewrites the imm32 of the MOV_RI at 0x10, which is
+    # part of the same (already translated) block.
+    prog = b"".join([
+        instr(MOV_RI, 4, 0, 0, 9),          # 0x00
+        instr(STORE8_ABS, 0, 4, 0, 0x14),   # 0x08
+        instr(MOV_RI, 2, 0, 0, 5),          # 0x10
+        instr(HALT),                        # 0x18
+    ])
+    ref = _run_step(prog, 0, 100)
+    got = _run_translated(prog, 0, 100)
+    assert got == ref
+    assert got[1][0][2] == 9
+
+
+@pytest.mark.parametrize("prog,sp", [
+    (instr(MOV_RR, SP_SEL, 20, 0, 0), -1),
+    (instr(POP8, 1, 0, 0, 0), 0xFFFF),
+    (instr(PUSH8, 0, 1, 0, 0), 0),
+    (instr(RET), 0xFDFE),
+    (instr(RET), 0xFFFF),
+    (instr(CALL_ABS, 0, 0, 0, 0x200), 0xFDFA),
+    (b"".join([instr(SUB, 1, 1, 1), instr(JZ_ABS, 0, 0, 0, 0x0103)]), None),
+    (b"".join([instr(CMP, 0, 1, 1), instr(JZ_ABS, 0, 0, 0, 0x0103)]), None),
+    (instr(0x7F, 1, 2, 3, 4), None),
+])
+def test_faults_match_step(prog, sp):
+    ref = _run_step(prog, 0x100, 100, sp=sp)
+    got = _run_translated(prog, 0x100, 100, sp=sp)
+    assert got == ref
+    assert got[1][6] == HaltReason.FAULT
+
+
+def test_fault_pc_inside_block_is_reported_exactly():
+    prog = b"".join([
+        instr(MOV_RI, 1, 0, 0, 1),
+        instr(MOV_RI, SP_SEL, 0, 0, 0),
+        instr(PUSH8, 0, 1, 0, 0),           # SP underflow at 0x0110
+        instr(HALT),
+    ])
+    n, snap = _run_translated(prog, 0x100, 100)
+    assert n == 3
+    assert snap[7][:2] == (FaultCode.MEM_OOB, 0x0110)
+    assert snap[7][-1] == "SP underflow"
+
+
+def _random_program(rng, n_instr, base):
+    ops = [MOV_RI, MOV_RI, MOV_RR, ADD, SUB, CMP, CMP, LOAD8_ABS, STORE8_ABS, JMP_ABS, JMP_REL,
+           JZ_ABS, JZ_REL, JZ_REL, PUSH8, POP8, CALL_ABS, RET, HALT]
+    out = []
+    for i in range(n_instr):
+        op = rng.choice(ops)
+        here = base + 8 * i
+        target = base + 8 * rng.randrange(n_instr)
+        r = lambda: rng.randrange(4)
+        if op == MOV_RI:
+            out.append(instr(op, rng.choice([0, 1, 2, 3, SP_SEL]), 0, 0, rng.choice([0, 1, 2, 0x1F0, -1])))
+        elif op == MOV_RR:
+            out.append(instr(op, rng.choice([0, 1, 2, 3, FP_SEL]), rng.choice([0, 1, 2, SP_SEL]), 0, 0))
+        elif op in (ADD, SUB):
+            out.append(instr(op, r(), r(), r(), 0))
+        elif op == CMP:
+            out.append(instr(op, 0, r(), r(), 0))
+        elif op == LOAD8_ABS:
+            out.append(instr(op, r(), 0, 0, base + rng.randrange(8 * n_instr)))
+        elif op == STORE8_ABS:
+            out.append(instr(op, 0, r(), 0, base + rng.randrange(8 * n_instr + 64)))
+        elif op in (JMP_ABS, JZ_ABS, CALL_ABS):
+            out.append(instr(op, 0, 0, 0, target))
+        elif op in (JMP_REL, JZ_REL):
+            out.append(instr(op, 0, 0, 0, target - here))
+        elif op == PUSH8:
+            out.append(instr(op, 0, r(), 0, 0))
+        elif op == POP8:
+            out.append(instr(op, r(), 0, 0, 0))
+        else:
+            out.append(instr(op))
+    return b"".join(out)
+
+
+@pytest.mark.parametrize("seed", range(60))
+def test_random_programs_match_step(seed):
+    rng = random.Random(seed)
+    prog = _random_program(rng, 24, 0x200)
+    for budget in (400, 37):
+        try:
+            ref = _run_step(prog, 0x200, budget)
+        except IndexError:
+            # POP8 past the top of memory raises in step(); so must the engine.
+            with pytest.raises(IndexError):
+                _run_translated(prog, 0x200, budget)
+            continue
+        assert _run_translated(prog, 0x200, budget) == ref
+
+
+def test_dead_flag_writes_are_not_emitted():
+    prog = b"".join([
+        instr(MOV_RI, 1, 0, 0, 3),
+        instr(ADD, 2, 1, 1),        # Z overwritten by the SUB below: dead
+        instr(CMP, 0, 1, 2),        # dead as well
+        instr(SUB, 3, 2, 1),        # read by the JZ
+        instr(JZ_REL, 0, 0, 0, 16),
+        instr(HALT),
+        instr(HALT),
+    ])
+    mem = make_mem(prog)
+    blk = translate_block(mem, 0)
+    assert blk.source.count("zr =") == 1
+    assert "regs[3] = zr = " in blk.source
+
+
+@pytest.mark.parametrize("budget", range(1, 8))
+def test_lazy_z_written_back_at_every_exit(budget):
+    # Z observed after a budget stop, a slow exit (PUSH8 with a bad SP) and a halt.
+    prog = b"".join([
+        instr(MOV_RI, 1, 0, 0, 5),
+        instr(CMP, 0, 1, 1),
+        instr(ADD, 2, 1, 1),
+        instr(MOV_RI, SP_SEL, 0, 0, 0),
+        instr(PUSH8, 0, 1, 0, 0),
+    ])
+    assert _run_translated(prog, 0, budget) == _run_step(prog, 0, budget)